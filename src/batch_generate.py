@@ -0,0 +1,262 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from build_cache import BuildCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from generate_ieee_format import (
+    PDF_ENGINES, generate_paper, logger, paper_file_cache_key, pdf_path_for, setup_logging,
+)
+from soffice_pool import SofficePool
+
+DEFAULT_OUTPUT_DIR = 'data/output'
+
+
+def _is_glob(pattern):
+    """Return True if the pattern contains shell wildcard characters."""
+    return any(ch in pattern for ch in '*?[')
+
+
+def _default_output(input_file, output_dir):
+    """Map an input markdown path to `<output_dir>/<stem>.docx`."""
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.join(output_dir, f'{stem}.docx')
+
+
+def read_manifest(manifest_file, output_dir):
+    """Read a manifest of `input.md [output.docx]` lines, ignoring blanks and `#` comments."""
+    jobs = []
+    base_dir = os.path.dirname(manifest_file)
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split()
+            if len(parts) > 2:
+                raise ValueError(f"{manifest_file}:{line_no}: expected 'input.md [output.docx]', got {line!r}")
+            input_file = parts[0] if os.path.isabs(parts[0]) else os.path.join(base_dir, parts[0])
+            if len(parts) == 2:
+                output_file = parts[1] if os.path.isabs(parts[1]) else os.path.join(base_dir, parts[1])
+            else:
+                output_file = _default_output(input_file, output_dir)
+            jobs.append((input_file, output_file))
+    return jobs
+
+
+def collect_jobs(inputs, output_dir, manifest=None):
+    """Expand directories, globs and an optional manifest into (input, output) pairs."""
+    jobs = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(glob.glob(os.path.join(item, '*.md')))
+        elif _is_glob(item):
+            matches = sorted(glob.glob(item, recursive=True))
+        else:
+            matches = [item]
+        if not matches:
+            logger.warning(f"No markdown files matched: {item}")
+        jobs.extend((path, _default_output(path, output_dir)) for path in matches)
+    if manifest:
+        jobs.extend(read_manifest(manifest, output_dir))
+    return jobs
+
+
+def render_one(input_file, output_file, convert_pdf=True, cache_options=None, backend='python-docx',
+               pdf_engine='office', max_pages=None, template=None, root=None):
+    """Render a single paper, turning exits and exceptions into a result record.
+
+    `cache_options` holds BuildCache keyword arguments; None disables the cache. With
+    `max_pages`, the record holds the estimated `pages` and whether it is `over_budget`.
+    `template` is an optional `.docx`/`.dotx`; each worker process loads it only once.
+    `root` confines the files the paper may reference (see `generate_paper`). A PDF that
+    was requested but not produced is recorded as `pdf_error`; the DOCX still counts as rendered.
+    """
+    start = time.perf_counter()
+    result = {'input': input_file, 'output': output_file, 'status': 'ok', 'error': None}
+    cache = BuildCache(**cache_options) if cache_options is not None else None
+    try:
+        out_dir = os.path.dirname(output_file)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        estimate = generate_paper(input_file, output_file, convert_pdf=convert_pdf, cache=cache, backend=backend,
+                                  pdf_engine=pdf_engine, max_pages=max_pages, template=template,
+                                  root=root)
+        if estimate is not None:
+            result['pages'] = estimate['pages']
+            result['over_budget'] = estimate['over_budget']
+        if convert_pdf and not result.get('over_budget') and not os.path.exists(pdf_path_for(output_file)):
+            # The converters log their own errors and return; only the missing file tells.
+            result['pdf_error'] = 'no PDF was produced (see the log for the converter errors)'
+        if cache is not None:
+            result['cache'] = 'hit' if cache.hits else 'miss'
+    except SystemExit as e:
+        # Unreadable input and failed saves call sys.exit(1).
+        result['status'] = 'failed'
+        result['error'] = f"generator exited with status {e.code}"
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+        logger.error(f"Failed to render {input_file}: {str(e)}\n{traceback.format_exc()}")
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(jobs, workers=None, pdf_pool=None, cache_options=None, pdf_engine='office', max_pages=None,
+              template=None):
+    """Fan the jobs out over a process pool and return one result per job, in input order.
+
+    With a `pdf_pool`, workers only build the DOCX and this process queues each finished
+    DOCX on the shared LibreOffice pool, so PDF conversion overlaps with rendering.
+    With `pdf_engine='weasyprint'` each worker renders its PDF in-process instead.
+    Papers estimated over `max_pages` get no PDF.
+    """
+    results = {}
+    seen_outputs = {}
+    pending = []
+    for index, (input_file, output_file) in enumerate(jobs):
+        key = os.path.abspath(output_file)
+        if key in seen_outputs:
+            results[index] = {
+                'input': input_file, 'output': output_file, 'status': 'failed', 'seconds': 0.0,
+                'error': f"output collides with {jobs[seen_outputs[key]][0]}",
+            }
+            continue
+        seen_outputs[key] = index
+        pending.append(index)
+
+    pdf_futures = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=setup_logging) as pool:
+        futures = {
+            pool.submit(render_one, *jobs[index], convert_pdf=pdf_pool is None, cache_options=cache_options,
+                        pdf_engine=pdf_engine, max_pages=max_pages, template=template): index
+            for index in pending
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                # A worker process died (e.g. killed by the OS); isolate it to this file.
+                input_file, output_file = jobs[index]
+                results[index] = {'input': input_file, 'output': output_file, 'status': 'failed',
+                                  'seconds': 0.0, 'error': f"worker crashed: {str(e)}"}
+            result = results[index]
+            logger.info(f"[{result['status']}] {result['input']} ({result['seconds']:.2f}s)")
+            if (pdf_pool is not None and result['status'] == 'ok' and not result.get('over_budget')
+                    and not os.path.exists(pdf_path_for(result['output']))):
+                pdf_futures[index] = pdf_pool.submit(result['output'], pdf_path_for(result['output']))
+
+    for index, future in pdf_futures.items():
+        result = results[index]
+        try:
+            conversion = future.result()
+            result['pdf_seconds'] = conversion.seconds
+            logger.info(f"PDF ready for {result['input']} via {conversion.backend} ({conversion.seconds:.2f}s)")
+            if cache_options is not None:
+                cache = BuildCache(**cache_options)
+                cache_key = paper_file_cache_key(cache, result['input'], template=template)
+                cache.store(cache_key, {'pdf': conversion.pdf_path})
+        except Exception as e:
+            result['pdf_error'] = str(e)
+            logger.error(f"Failed to convert {result['output']} to PDF: {str(e)}")
+    return [results[index] for index in range(len(jobs))]
+
+
+def summarize(results, wall_seconds):
+    """Build the summary report and log a per-file timing table.
+
+    `failed` counts papers without a DOCX; `pdf_failed` counts rendered papers whose requested PDF is missing.
+    """
+    failed = [r for r in results if r['status'] != 'ok']
+    summary = {
+        'total': len(results),
+        'succeeded': len(results) - len(failed),
+        'failed': len(failed),
+        'pdf_failed': sum(1 for r in results if r['status'] == 'ok' and r.get('pdf_error')),
+        'wall_seconds': round(wall_seconds, 3),
+        'files_per_second': round(len(results) / wall_seconds, 3) if wall_seconds > 0 else None,
+        'cache_hits': sum(1 for r in results if r.get('cache') == 'hit'),
+        'cache_misses': sum(1 for r in results if r.get('cache') == 'miss'),
+        'over_budget': sum(1 for r in results if r.get('over_budget')),
+        'results': results,
+    }
+    logger.info("Batch summary:")
+    for r in results:
+        line = f"  {r['status']:<6} {r['seconds']:>8.2f}s  {r.get('cache', ''):<4}  {r['input']}"
+        if 'pdf_seconds' in r:
+            line += f"  (pdf {r['pdf_seconds']:.2f}s)"
+        if 'pages' in r:
+            line += f"  ~{r['pages']:.1f} pages{' (over budget, no PDF)' if r['over_budget'] else ''}"
+        if r['error']:
+            line += f"  -- {r['error']}"
+        if r.get('pdf_error'):
+            line += f"  -- PDF conversion failed: {r['pdf_error']}"
+        logger.info(line)
+    logger.info(f"{summary['succeeded']}/{summary['total']} papers rendered in {summary['wall_seconds']:.2f}s "
+                f"({summary['failed']} failed, {summary['pdf_failed']} without PDF, cache hits={summary['cache_hits']}, misses={summary['cache_misses']})")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate IEEE format papers for many Markdown files in parallel.')
+    parser.add_argument('-i', '--input', nargs='*', default=[], help='Markdown files, directories or glob patterns.')
+    parser.add_argument('-m', '--manifest', type=str, help='Text file listing "input.md [output.docx]" per line.')
+    parser.add_argument('-o', '--output-dir', type=str, default=DEFAULT_OUTPUT_DIR, help='Directory for generated papers.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    parser.add_argument('--report', type=str, help='Write the JSON summary report to this path.')
+    parser.add_argument('--soffice-pool', type=int, default=0, metavar='N',
+                        help='Convert PDFs on N warm LibreOffice instances instead of one soffice spawn per paper.')
+    parser.add_argument('--pdf-engine', choices=PDF_ENGINES, default='office',
+                        help='Convert DOCX files with Word/LibreOffice, or render PDFs in-process with weasyprint.')
+    parser.add_argument('--pdf-timeout', type=int, default=120, help='Per-document PDF conversion timeout in seconds.')
+    parser.add_argument('--max-pages', type=float,
+                        help='Estimate each page count first and only produce PDFs for papers that fit.')
+    parser.add_argument('--template', type=str,
+                        help='Word template (.dotx or .docx) whose styles, theme and headers every DOCX is based on.')
+    parser.add_argument('--no-cache', action='store_true', help='Always rebuild, ignoring the build cache.')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='Directory of the build cache.')
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help='Build cache size limit in MiB.')
+
+    args = parser.parse_args()
+    if not args.input and not args.manifest:
+        parser.error('provide at least one --input or a --manifest')
+    if args.soffice_pool > 0 and args.pdf_engine == 'weasyprint':
+        parser.error('--soffice-pool only applies to --pdf-engine office')
+    if args.template is not None and not os.path.isfile(args.template):
+        parser.error(f'--template: {args.template} not found')
+
+    setup_logging()
+    jobs = collect_jobs(args.input, args.output_dir, args.manifest)
+    if not jobs:
+        logger.error("No input files found. Nothing to do.")
+        sys.exit(1)
+
+    logger.info(f"Starting batch of {len(jobs)} papers with {args.jobs} workers")
+    start = time.perf_counter()
+    pdf_pool = None
+    if args.soffice_pool > 0:
+        pdf_pool = SofficePool(size=args.soffice_pool, job_timeout=args.pdf_timeout)
+        pdf_pool.start()
+        if not pdf_pool.running:
+            # No LibreOffice: convert with Word (docx2pdf) per paper instead.
+            pdf_pool = None
+    try:
+        cache_options = None if args.no_cache else {'cache_dir': args.cache_dir, 'max_bytes': args.cache_size_mb * 1024 * 1024}
+        results = run_batch(jobs, workers=args.jobs, pdf_pool=pdf_pool, cache_options=cache_options,
+                            pdf_engine=args.pdf_engine, max_pages=args.max_pages, template=args.template)
+    finally:
+        if pdf_pool is not None:
+            pdf_pool.close()
+    summary = summarize(results, time.perf_counter() - start)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Batch report written to {args.report}")
+
+    sys.exit(1 if summary['failed'] or summary['pdf_failed'] else 0)
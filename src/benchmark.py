@@ -0,0 +1,366 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from PIL import Image, ImageDraw
+
+import html_pdf
+from docx_render import render_paper
+from docx_stream import StreamedDocument
+from generate_ieee_format import (
+    GENERATOR_VERSION, PDF_ENGINES, convert_to_pdf, convert_with_weasyprint, load_paper, open_paper, pdf_path_for,
+    scan_markdown_file,
+)
+from ieee_style import TEXT_WIDTH
+from image_prep import FileImageSource, prepare_images
+
+DEFAULT_BASELINE = 'benchmarks/baseline.json'
+DEFAULT_THRESHOLD = 0.15
+# Differences below this are timer noise, whatever the relative change.
+MIN_DELTA_SECONDS = 0.005
+# Entry-point modules whose cold import time is tracked; batch and service workers import them repeatedly.
+IMPORT_MODULES = ('generate_ieee_format', 'batch_generate')
+DEFAULT_IMPORT_BUDGET_MS = 150
+
+SIZES = {
+    'small': {'paragraphs': 40, 'tables': 2, 'images': 1},
+    'medium': {'paragraphs': 400, 'tables': 10, 'images': 4},
+    'large': {'paragraphs': 4000, 'tables': 40, 'images': 8},
+}
+SECTION_TITLES = ['INTRODUCTION', 'LITERATURE REVIEW', 'PROPOSED METHODOLOGY', 'RESULTS AND DISCUSSION',
+                  'CONCLUSION & FUTURE SCOPE']
+ROMAN = ['I', 'II', 'III', 'IV', 'V']
+WORDS = ('market momentum agent signal portfolio latency model trading volatility risk factor regime '
+         'backtest strategy allocation execution ensemble feature horizon benchmark').split()
+
+
+# --- Synthetic inputs ---
+
+def _sentence(rng, words=18):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def synthesize_image(path, seed, size=(1600, 1000)):
+    """Write a deterministic diagram-like PNG."""
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size[0] - 200), rng.randrange(size[1] - 120)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle([x, y, x + rng.randrange(60, 200), y + rng.randrange(40, 120)], outline=color, width=4)
+        draw.line([x, y, rng.randrange(size[0]), rng.randrange(size[1])], fill=color, width=3)
+    image.save(path)
+
+
+def synthesize_paper(out_dir, paragraphs=40, tables=2, images=1, table_rows=8, table_cols=4, references=20, seed=0):
+    """Write a paper in the frontmatter + `## I. INTRODUCTION` format; returns the markdown path."""
+    rng = random.Random(seed)
+    image_dir = os.path.join(out_dir, 'diagrams')
+    os.makedirs(image_dir, exist_ok=True)
+
+    lines = [
+        '---',
+        'title: "Synthetic Benchmark Paper"',
+        'authors:',
+        '  - name: "First Author"',
+        '    department: "Department of Computer Science"',
+        '    organization: "Benchmark University"',
+        '    email: "first@example.edu"',
+        '  - name: "Second Author"',
+        '    organization: "Benchmark Labs"',
+        f'abstract: "{_sentence(rng, 60)}"',
+        'index_terms: "Benchmarking, Document Generation, IEEE"',
+        '---',
+        '',
+    ]
+    # Spread paragraphs, tables and figures evenly over the five sections.
+    blocks = ['p'] * paragraphs + ['t'] * tables + ['f'] * images
+    rng.shuffle(blocks)
+    per_section = -(-len(blocks) // len(SECTION_TITLES)) if blocks else 0
+    figure = 0
+    for s, title in enumerate(SECTION_TITLES):
+        lines += [f'## {ROMAN[s]}. {title}', '']
+        for i, kind in enumerate(blocks[s * per_section:(s + 1) * per_section]):
+            if i and i % 12 == 0:
+                lines += [f'### {chr(ord("A") + (i // 12 - 1) % 26)}. Subsection {i // 12}', '']
+            if kind == 'p':
+                if rng.random() < 0.15:
+                    lines += [f'- **{rng.choice(WORDS).title()}:** {_sentence(rng, 12)}' for _ in range(3)] + ['']
+                else:
+                    lines += [' '.join(_sentence(rng) for _ in range(rng.randint(2, 5))) + f' [{rng.randint(1, max(1, references))}]', '']
+            elif kind == 't':
+                lines.append('| ' + ' | '.join(f'**Metric {c}**' for c in range(table_cols)) + ' |')
+                lines.append('|' + '---|' * table_cols)
+                for _ in range(table_rows):
+                    lines.append('| ' + ' | '.join(f'{rng.uniform(0, 100):.2f}' for _ in range(table_cols)) + ' |')
+                lines.append('')
+            else:
+                figure += 1
+                image_name = f'figure-{figure}.png'
+                synthesize_image(os.path.join(image_dir, image_name), seed * 1000 + figure)
+                lines += [f'![Fig. {figure}: Synthetic diagram](diagrams/{image_name})',
+                          f'*Fig. {figure}. {_sentence(rng, 8)}*', '']
+        if s == 2:
+            lines += ['```text', 'CCS = 0.4 * momentum + 0.6 * sentiment', '```', '']
+    lines += ['## REFERENCES', '']
+    lines += [f'[{n}] A. Author, "{_sentence(rng, 6)}," _Journal of Benchmarks_, {2000 + n % 25}.'
+              for n in range(1, references + 1)]
+
+    path = os.path.join(out_dir, 'paper.md')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+# --- Measurement ---
+
+def _peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _timed(stages, name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    stages.setdefault(name, []).append(time.perf_counter() - start)
+    return result
+
+
+def run_case(case):
+    """Run one benchmark case in the current (fresh) process and return its measurements.
+
+    Each stage makes the same calls as `generate_paper` (without the build cache), under the
+    same stage names as its profiler, so the timings track what the generator really does.
+    """
+    # The synthetic papers leave some references uncited; those warnings are noise here.
+    logging.disable(logging.WARNING)
+    # Relative caches (e.g. processed images) land in the case's own work directory.
+    os.chdir(case['work_dir'])
+    input_file = case['input']
+    output_file = os.path.join(case['work_dir'], f"paper-{case['backend']}.docx")
+    stages = {}
+    pdf_ok = {}
+    for _ in range(case['repeat']):
+        _, images, _ = _timed(stages, 'read', scan_markdown_file, input_file)
+        _timed(stages, 'images', prepare_images, images, TEXT_WIDTH)
+        image_source = FileImageSource(input_file)
+        if case['backend'] == 'stream':
+            # Parsing and rendering happen while the DOCX is written, as in `generate_paper`.
+            doc = StreamedDocument(open_paper(input_file), image_source)
+        else:
+            paper = _timed(stages, 'parse', load_paper, input_file)
+            doc = _timed(stages, 'render', render_paper, paper, input_file)
+        _timed(stages, 'save', doc.save, output_file)
+        for engine in list(case['pdf_engines']):
+            pdf_file = pdf_path_for(output_file)
+            if os.path.exists(pdf_file):
+                os.remove(pdf_file)
+            if engine == 'weasyprint':
+                try:
+                    html_pdf.load_engine()
+                except (ImportError, OSError) as e:
+                    pdf_ok[engine] = f'unavailable: {e}'
+                    case['pdf_engines'].remove(engine)
+                    continue
+                paper = open_paper(input_file, report=False)
+                _timed(stages, 'pdf_weasyprint', convert_with_weasyprint, paper, image_source, output_file)
+            else:
+                _timed(stages, 'pdf_office', convert_to_pdf, output_file)
+            pdf_ok[engine] = os.path.exists(pdf_file)
+
+    totals = [sum(runs[i] for runs in stages.values()) for i in range(case['repeat'])]
+    total = statistics.median(totals)
+    blocks = sum(1 for _ in open_paper(input_file, report=False).blocks)
+    input_bytes = os.path.getsize(input_file)
+    return {
+        'name': case['name'],
+        'backend': case['backend'],
+        'params': case['params'],
+        'input_bytes': input_bytes,
+        'blocks': blocks,
+        'docx_bytes': os.path.getsize(output_file),
+        'pdf_converted': pdf_ok or None,
+        'stages': {name: {'min': round(min(runs), 5), 'median': round(statistics.median(runs), 5),
+                          'max': round(max(runs), 5)} for name, runs in stages.items()},
+        'total_seconds': round(total, 5),
+        'blocks_per_second': round(blocks / total, 1) if total else None,
+        'kib_per_second': round(input_bytes / 1024 / total, 1) if total else None,
+        'peak_rss_mib': _peak_rss_mib(),
+    }
+
+
+def measure_import_time(module, repeat=5):
+    """Cold-import cost of `module` from `python -X importtime` in fresh interpreters, in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+        # Lines look like "import time:  self [us] | cumulative | imported package".
+        rows = {}
+        for line in proc.stderr.splitlines():
+            fields = line.split(':', 1)[-1].split('|')
+            if len(fields) == 3 and fields[0].strip().isdigit():
+                rows[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+        samples.append(rows[module][1] / 1000)
+    heaviest = sorted(rows.items(), key=lambda item: -item[1][0])[:5]
+    return {
+        'min_ms': round(min(samples), 2),
+        'median_ms': round(statistics.median(samples), 2),
+        'max_ms': round(max(samples), 2),
+        'heaviest_self_ms': {name: round(self_us / 1000, 2) for name, (self_us, _) in heaviest},
+    }
+
+
+def check_import_times(import_times, baseline, threshold=DEFAULT_THRESHOLD, budget_ms=DEFAULT_IMPORT_BUDGET_MS):
+    """Flag modules whose median import time exceeds the budget or regressed against the baseline."""
+    regressions = []
+    previous = baseline.get('import_times', {}) if baseline else {}
+    for module, stats in import_times.items():
+        current = stats['median_ms']
+        if budget_ms and current > budget_ms:
+            regressions.append({'case': 'import', 'backend': module, 'metric': 'budget_ms', 'baseline': budget_ms,
+                                'current': current, 'change': round(current / budget_ms - 1, 3)})
+        before = previous.get(module, {}).get('median_ms')
+        if before and current > before * (1 + threshold) and current - before > MIN_DELTA_SECONDS * 1000:
+            regressions.append({'case': 'import', 'backend': module, 'metric': 'median_ms', 'baseline': before,
+                                'current': current, 'change': round(current / before - 1, 3)})
+    return regressions
+
+
+def run_benchmarks(cases):
+    """Run every case in its own spawned process so peak RSS is per case."""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for case in cases:
+        with context.Pool(1) as pool:
+            results.append(pool.apply(run_case, (case,)))
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """List stage medians, totals and peak RSS that got worse than the baseline by more than `threshold`."""
+    previous = {(c['name'], c['backend']): c for c in baseline.get('cases', [])}
+    regressions = []
+    for case in results:
+        base = previous.get((case['name'], case['backend']))
+        if base is None:
+            continue
+        metrics = [(f"stages.{name}.median", stats['median'], base['stages'].get(name, {}).get('median'))
+                   for name, stats in case['stages'].items()]
+        metrics.append(('total_seconds', case['total_seconds'], base.get('total_seconds')))
+        for metric, current, before in metrics:
+            if before and current > before * (1 + threshold) and current - before > MIN_DELTA_SECONDS:
+                regressions.append({'case': case['name'], 'backend': case['backend'], 'metric': metric,
+                                    'baseline': before, 'current': current,
+                                    'change': round(current / before - 1, 3)})
+        before = base.get('peak_rss_mib')
+        if before and case['peak_rss_mib'] > before * (1 + threshold):
+            regressions.append({'case': case['name'], 'backend': case['backend'], 'metric': 'peak_rss_mib',
+                                'baseline': before, 'current': case['peak_rss_mib'],
+                                'change': round(case['peak_rss_mib'] / before - 1, 3)})
+    return regressions
+
+
+def print_summary(report, stream=sys.stderr):
+    for module, stats in report['import_times'].items():
+        print(f"import   {module:<22} {stats['median_ms']:>8.1f}ms  (min {stats['min_ms']:.1f}, max {stats['max_ms']:.1f})",
+              file=stream)
+    for case in report['cases']:
+        stages = ', '.join(f"{name} {stats['median'] * 1000:.1f}ms" for name, stats in case['stages'].items())
+        print(f"{case['name']:<8} {case['backend']:<11} {case['total_seconds']:>8.3f}s  "
+              f"{case['blocks_per_second'] or 0:>9.0f} blocks/s  {case['peak_rss_mib']:>7.1f} MiB  ({stages})", file=stream)
+    for r in report['regressions']:
+        print(f"REGRESSION {r['case']}/{r['backend']} {r['metric']}: {r['baseline']} -> {r['current']} "
+              f"(+{r['change']:.0%})", file=stream)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the IEEE paper generator on synthetic papers.')
+    parser.add_argument('--sizes', type=str, default='small,medium,large',
+                        help=f"Comma-separated presets ({', '.join(SIZES)}).")
+    parser.add_argument('--paragraphs', type=int, help='Add a "custom" case with this many paragraphs.')
+    parser.add_argument('--tables', type=int, default=0, help='Tables in the custom case.')
+    parser.add_argument('--images', type=int, default=0, help='Figures in the custom case.')
+    parser.add_argument('--backends', type=str, default='python-docx,stream', help='Comma-separated DOCX backends.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; stage timings report min/median/max.')
+    parser.add_argument('--pdf', action='store_true', help='Also time PDF conversion.')
+    parser.add_argument('--pdf-engines', type=str, default=','.join(PDF_ENGINES),
+                        help='Comma-separated PDF engines timed with --pdf (office, weasyprint).')
+    parser.add_argument('-o', '--output', type=str, help='Write the JSON report here (default: stdout).')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline report to compare against.')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative slowdown reported as a regression (0.15 = 15%%).')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on any regression.')
+    parser.add_argument('--import-budget-ms', type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                        help='Median cold-import time per entry-point module reported as a regression (0 disables).')
+    parser.add_argument('--work-dir', type=str, help='Keep synthesized inputs and outputs here instead of a temp dir.')
+
+    args = parser.parse_args()
+    sizes = {name: SIZES[name] for name in filter(None, args.sizes.split(','))}
+    if args.paragraphs is not None:
+        sizes['custom'] = {'paragraphs': args.paragraphs, 'tables': args.tables, 'images': args.images}
+
+    work_root = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix='ieee-bench-'))
+    cases = []
+    for name, params in sizes.items():
+        for backend in filter(None, args.backends.split(',')):
+            work_dir = os.path.join(work_root, f'{name}-{backend}')
+            os.makedirs(work_dir, exist_ok=True)
+            cases.append({'name': name, 'backend': backend, 'params': params, 'repeat': args.repeat,
+                          'pdf_engines': list(filter(None, args.pdf_engines.split(','))) if args.pdf else [],
+                          'work_dir': work_dir, 'input': synthesize_paper(work_dir, **params)})
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'generator_version': GENERATOR_VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'import_times': {module: measure_import_time(module, repeat=max(args.repeat, 5)) for module in IMPORT_MODULES},
+        'cases': run_benchmarks(cases),
+        'baseline': None,
+        'regressions': [],
+    }
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['regressions'] = compare_to_baseline(report['cases'], baseline, args.threshold)
+        report['baseline'] = args.baseline
+    report['regressions'] += check_import_times(report['import_times'], baseline, args.threshold, args.import_budget_ms)
+
+    print_summary(report)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+    if not args.work_dir:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    sys.exit(1 if args.fail_on_regression and report['regressions'] else 0)
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = '.cache/ieee_build'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+ARTIFACT_NAME = 'paper'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """SHA-256 of a file's bytes, or None if it cannot be read."""
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+class BuildCache:
+    """Content-addressed store of rendered papers with size-bounded LRU eviction.
+
+    Each entry is a directory named after the build key holding `paper.docx` and,
+    once converted, `paper.pdf`, plus any JSON metadata such as the page estimate.
+    The entry directory's mtime records its last use. Artifacts are copied into the
+    cache and copied back out on a hit. Word and other editors save in place, so a
+    restored file must not share its bytes with the entry; `link=True` hardlinks
+    instead and is only for outputs nobody edits.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, link=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, content, image_paths, salt=''):
+        """Hash the markdown source, the bytes of every referenced image and the salt."""
+        return self.key_for_digest(hashlib.sha256(content.encode('utf-8')).hexdigest(), image_paths, salt)
+
+    def key_for_digest(self, content_digest, image_paths, salt=''):
+        """Like `key_for`, given the SHA-256 hex digest of the markdown source (e.g. hashed while streaming it)."""
+        h = hashlib.sha256()
+        h.update(salt.encode('utf-8'))
+        h.update(b'\0')
+        h.update(content_digest.encode('ascii'))
+        for path in image_paths:
+            h.update(b'\0')
+            h.update((file_digest(path) or 'missing').encode('ascii'))
+        return h.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _artifact(self, key, role):
+        return os.path.join(self._entry_dir(key), f'{ARTIFACT_NAME}.{role}')
+
+    def _materialize(self, src, dst):
+        dst_dir = os.path.dirname(dst)
+        if dst_dir:
+            os.makedirs(dst_dir, exist_ok=True)
+        if self.link:
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+
+    def restore(self, key, targets):
+        """Place cached artifacts at `targets` ({'docx': path, 'pdf': path or None}).
+
+        Returns False (a miss) unless the entry holds a DOCX. Requested targets that the
+        entry lacks are removed so a stale file is never mistaken for the cached one.
+        """
+        if not os.path.exists(self._artifact(key, 'docx')):
+            self.misses += 1
+            return False
+        try:
+            for role, path in targets.items():
+                if not path:
+                    continue
+                if os.path.lexists(path):
+                    os.unlink(path)
+                src = self._artifact(key, role)
+                if os.path.exists(src):
+                    self._materialize(src, path)
+            os.utime(self._entry_dir(key))
+        except OSError as e:
+            # Most likely evicted concurrently by another process; rebuild instead.
+            logger.warning(f"Could not restore build cache entry {key[:12]}: {str(e)}")
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def release(self, *paths):
+        """Unlink outputs that are hardlinked into the cache so a rebuild cannot overwrite the entry."""
+        for path in paths:
+            try:
+                if os.stat(path).st_nlink > 1:
+                    os.unlink(path)
+            except FileNotFoundError:
+                continue
+
+    def store(self, key, artifacts):
+        """Copy the produced artifacts ({'docx': path, 'pdf': path}) into the entry for `key`."""
+        entry = self._entry_dir(key)
+        try:
+            os.makedirs(entry, exist_ok=True)
+            for role, path in artifacts.items():
+                if not path or not os.path.exists(path):
+                    continue
+                tmp = os.path.join(entry, f'.{ARTIFACT_NAME}.{role}.{os.getpid()}.tmp')
+                shutil.copy2(path, tmp)
+                os.replace(tmp, self._artifact(key, role))
+            os.utime(entry)
+        except OSError as e:
+            logger.warning(f"Could not store build cache entry {key[:12]}: {str(e)}")
+            return
+        self.evict()
+
+    def store_json(self, key, name, data):
+        """Save `data` as `<name>.json` in the existing entry for `key`."""
+        path = os.path.join(self._entry_dir(key), f'{name}.json')
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not store {name} for build cache entry {key[:12]}: {str(e)}")
+
+    def load_json(self, key, name):
+        """The `<name>.json` saved with the entry for `key`, or None."""
+        try:
+            with open(os.path.join(self._entry_dir(key), f'{name}.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_dir():
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                except OSError:
+                    continue
+        return entries
+
+    def evict(self):
+        """Drop least-recently-used entries until the cache fits in `max_bytes`."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+        logger.info(f"Build cache evicted {evicted} entries; {total / (1024 * 1024):.1f} MiB retained")
+
+
+class BlockCache:
+    """In-memory XML of rendered body blocks, kept between rebuilds of one paper (watch mode).
+
+    The renderers key each block by its content and the layout it starts in, and copy the
+    stored XML on a hit instead of rendering the block again. `finish` ends a build: entries
+    that build did not use are dropped, so the cache stays the size of the current paper.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._used = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._used.get(key)
+        if entry is None:
+            entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._used[key] = entry
+        return entry
+
+    def put(self, key, entry):
+        self._used[key] = entry
+
+    def finish(self, prune=True):
+        """End a build and return and reset its (hits, misses).
+
+        With `prune`, only the entries that build used are kept; a failed build passes False
+        so the blocks it never reached stay cached.
+        """
+        if prune:
+            self._entries = self._used
+        else:
+            self._entries.update(self._used)
+        self._used = {}
+        counts = (self.hits, self.misses)
+        self.hits = self.misses = 0
+        return counts
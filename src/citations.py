@@ -0,0 +1,467 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from build_cache import file_digest
+from markdown_ast import Caption, Heading, ListItem, Paragraph, Reference, Table, check_within, resolve_image_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BIB_CACHE_DIR = '.cache/ieee_bib'
+# Part of every parsed-bib cache key; bump when parsing or formatting of entries changes.
+BIB_PARSER_VERSION = 1
+# Parsed bibliographies kept per process, most recently used last.
+MAX_MEMO_BIBS = 16
+# IEEE lists up to six authors, then switches to "et al.".
+MAX_LISTED_AUTHORS = 6
+
+# `[3]`, `[3, 5]`, `[3]-[7]` / `[3]–[7]`, or BibTeX keys `[@key]` / `[@a; @b]`.
+CITATION_PATTERN = re.compile(r'\[(?:(@[^\]\s][^\]]*)|(\d+(?:\s*,\s*\d+)*))\](?:\s*[-–]\s*\[(\d+)\])?')
+BIB_ENTRY_START = re.compile(r'@\s*(\w+)\s*[{(]')
+BIB_FIELD_NAME = re.compile(r'\s*([\w:.+-]+)\s*=\s*')
+FRONTMATTER_BLOCK = re.compile(r'^---\n(.*?)\n---\n', re.DOTALL)
+BIBLIOGRAPHY_LINE = re.compile(r'^bibliography:[ \t]*(.*?)[ \t]*$', re.MULTILINE)
+LATEX_ACCENTS = {'"': '\u0308', "'": '\u0301', '`': '\u0300', '^': '\u0302', '~': '\u0303', 'c': '\u0327'}
+LATEX_ACCENT = re.compile(r'\\(["\'`^~]|c\s)\s*\{?(\w)\}?')
+LATEX_COMMAND = re.compile(r'\\[a-zA-Z]+\s*')
+BIB_BARE_VALUE = re.compile(r'[^\s,#})]+')
+# BibTeX month macros, in IEEE's abbreviations.
+MONTHS = {'jan': 'Jan.', 'feb': 'Feb.', 'mar': 'Mar.', 'apr': 'Apr.', 'may': 'May', 'jun': 'Jun.',
+          'jul': 'Jul.', 'aug': 'Aug.', 'sep': 'Sep.', 'oct': 'Oct.', 'nov': 'Nov.', 'dec': 'Dec.'}
+
+# (path, mtime, size) -> parsed entries, so an unchanged .bib is not even re-hashed.
+_parsed_bibs = OrderedDict()
+_parsed_bibs_lock = threading.Lock()
+
+
+# --- BibTeX parsing ---
+
+def _read_braced(text, i, close):
+    """Return (content, index after the closing char) for text[i:] up to the unnested `close`."""
+    depth = 0
+    start = i
+    while i < len(text):
+        c = text[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            if depth == 0 and close == '}':
+                return text[start:i], i + 1
+            depth -= 1
+        elif c == close and depth == 0:
+            return text[start:i], i + 1
+        i += 1
+    raise ValueError('unbalanced braces in BibTeX entry')
+
+
+def _read_value(text, i, strings):
+    """Parse a field value (`{...}`, `"..."`, a number or a macro, joined with `#`)."""
+    pieces = []
+    while True:
+        while text[i].isspace():
+            i += 1
+        if text[i] == '{':
+            piece, i = _read_braced(text, i + 1, '}')
+        elif text[i] == '"':
+            piece, i = _read_braced(text, i + 1, '"')
+        else:
+            match = BIB_BARE_VALUE.match(text, i)
+            piece, i = match.group(0), match.end()
+            piece = strings.get(piece.lower(), MONTHS.get(piece.lower(), piece))
+        pieces.append(piece)
+        while i < len(text) and text[i].isspace():
+            i += 1
+        if i < len(text) and text[i] == '#':
+            i += 1
+            continue
+        return ''.join(pieces), i
+
+
+def _split_authors(value):
+    """Split an author list on the top-level ` and `, leaving `{Braced and Corporate}` names whole."""
+    names, depth, start = [], 0, 0
+    lowered = value.lower()
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+        elif depth == 0 and lowered.startswith(' and ', i):
+            names.append(value[start:i])
+            i += 5
+            start = i
+            continue
+        i += 1
+    names.append(value[start:])
+    return [name.strip() for name in names if name.strip()]
+
+
+def latex_to_text(value):
+    """Plain text for a BibTeX value: accents composed, commands and grouping braces dropped."""
+    value = LATEX_ACCENT.sub(lambda m: m.group(2) + LATEX_ACCENTS[m.group(1).strip()], value)
+    value = value.replace('\\&', '&').replace('\\%', '%').replace('\\_', '_').replace('\\$', '$')
+    value = LATEX_COMMAND.sub('', value).replace('{', '').replace('}', '')
+    value = value.replace('---', '—').replace('--', '–').replace('~', ' ')
+    return unicodedata.normalize('NFC', ' '.join(value.split()))
+
+
+def _ieee_name(name):
+    """`Last, First Middle` or `First Middle Last` -> `F. M. Last`; braced names are kept as written."""
+    if name.startswith('{') and name.endswith('}'):
+        return latex_to_text(name)
+    if ',' in name:
+        last, first = (part.strip() for part in name.split(',', 1))
+    else:
+        parts = name.split()
+        last, first = parts[-1], ' '.join(parts[:-1])
+    initials = ' '.join('-'.join(f'{piece[0]}.' for piece in part.split('-') if piece)
+                        for part in latex_to_text(first).split())
+    last = latex_to_text(last)
+    return f'{initials} {last}' if initials else last
+
+
+def parse_bibtex(text):
+    """Entries of a BibTeX file as {key: {'type': ..., 'author': [...], field: text}}.
+
+    Field names are lowercased and values converted to plain text; `@string` macros
+    are expanded and `@comment`/`@preamble` blocks skipped. A malformed entry is logged
+    and skipped rather than failing the whole file.
+    """
+    entries = {}
+    strings = {}
+    pos = 0
+    while True:
+        match = BIB_ENTRY_START.search(text, pos)
+        if match is None:
+            return entries
+        entry_type = match.group(1).lower()
+        close = '}' if text[match.end() - 1] == '{' else ')'
+        try:
+            body, pos = _read_braced(text, match.end(), close)
+        except ValueError as e:
+            logger.warning(f"Skipping BibTeX entry at offset {match.start()}: {e}")
+            pos = match.end()
+            continue
+        if entry_type in ('comment', 'preamble'):
+            continue
+        try:
+            if entry_type == 'string':
+                field = BIB_FIELD_NAME.match(body)
+                strings[field.group(1).lower()] = _read_value(body + ',', field.end(), strings)[0]
+                continue
+            key, _, rest = body.partition(',')
+            fields = {'type': entry_type}
+            rest += ','
+            i = 0
+            while True:
+                field = BIB_FIELD_NAME.match(rest, i)
+                if field is None:
+                    break
+                value, i = _read_value(rest, field.end(), strings)
+                fields[field.group(1).lower()] = value
+                i += 1  # the separating comma
+        except (AttributeError, IndexError, ValueError) as e:
+            logger.warning(f"Skipping malformed BibTeX entry at offset {match.start()}: {e}")
+            continue
+        for name in ('author', 'editor'):
+            if name in fields:
+                fields[name] = [_ieee_name(author) for author in _split_authors(fields[name])]
+        for name, value in fields.items():
+            if isinstance(value, str) and name != 'url':
+                fields[name] = latex_to_text(value)
+        entries[key.strip()] = fields
+
+
+def load_bibliography(path, cache_dir=DEFAULT_BIB_CACHE_DIR):
+    """Parsed entries of a `.bib` file, parsing it at most once across papers and runs.
+
+    Results are memoized per process by path, mtime and size, and persisted as JSON
+    under `cache_dir` keyed by the file's content hash, so batch and service workers
+    share one parse of a large shared bibliography. Pass `cache_dir=None` to skip the
+    on-disk cache. Raises OSError if the file cannot be read.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _parsed_bibs_lock:
+        if memo_key in _parsed_bibs:
+            _parsed_bibs.move_to_end(memo_key)
+            return _parsed_bibs[memo_key]
+
+    entries = None
+    cache_file = None
+    if cache_dir:
+        digest = hashlib.sha256(f'{file_digest(path)}:{BIB_PARSER_VERSION}'.encode('ascii')).hexdigest()
+        cache_file = os.path.join(cache_dir, f'{digest}.json')
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = None
+    if entries is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = parse_bibtex(f.read())
+        logger.info(f"Parsed {len(entries)} BibTeX entries from {path}")
+        if cache_file:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = f'{cache_file}.{os.getpid()}.tmp'
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f)
+                os.replace(tmp, cache_file)
+            except OSError as e:
+                logger.warning(f"Could not store parsed bibliography for {path}: {str(e)}")
+
+    with _parsed_bibs_lock:
+        _parsed_bibs[memo_key] = entries
+        while len(_parsed_bibs) > MAX_MEMO_BIBS:
+            _parsed_bibs.popitem(last=False)
+    return entries
+
+
+# --- IEEE formatting ---
+
+def _author_list(names):
+    if len(names) > MAX_LISTED_AUTHORS:
+        return f'{names[0]} et al.'
+    if len(names) <= 2:
+        return ' and '.join(names)
+    return ', '.join(names[:-1]) + ', and ' + names[-1]
+
+
+def format_entry(entry):
+    """An IEEE reference-list entry (without the `[n]` label) for a parsed BibTeX entry."""
+    authors = _author_list(entry.get('author') or entry.get('editor') or [])
+    title = entry.get('title', '')
+    date = ' '.join(part for part in (entry.get('month'), entry.get('year')) if part)
+    pages = entry.get('pages', '').replace('-', '–')
+    pages = (f'pp. {pages}' if '–' in pages else f'p. {pages}') if pages else None
+    entry_type = entry.get('type')
+    if entry_type == 'book':
+        place = ': '.join(part for part in (entry.get('address'), entry.get('publisher')) if part)
+        head = ', '.join(part for part in (authors, title) if part)
+        tail = ', '.join(part for part in (place, date) if part)
+        text = f'{head}. {tail}.' if tail else f'{head}.'
+    else:
+        if entry_type == 'article':
+            venue = [entry.get('journal'), entry.get('volume') and f"vol. {entry['volume']}",
+                     entry.get('number') and f"no. {entry['number']}", pages, date]
+        elif entry_type in ('inproceedings', 'conference', 'incollection'):
+            venue = [entry.get('booktitle') and f"in {entry['booktitle']}", entry.get('address'), date, pages]
+        else:
+            venue = [entry.get('howpublished') or entry.get('journal') or entry.get('booktitle')
+                     or entry.get('publisher') or entry.get('institution') or entry.get('school'),
+                     entry_type == 'techreport' and entry.get('number') and f"Tech. Rep. {entry['number']}", date]
+        venue = ', '.join(part for part in venue if part)
+        if title:
+            # IEEE puts the comma or final period inside the closing quote.
+            quoted = f'"{title},"' if venue else f'"{title}."'
+            text = ' '.join(part for part in (f'{authors},' if authors else '', quoted, f'{venue}.' if venue else '')
+                            if part)
+        else:
+            text = ', '.join(part for part in (authors, venue) if part) + '.'
+    if entry.get('url'):
+        text += f" [Online]. Available: {entry['url']}"
+    return text
+
+
+# --- Citation index ---
+
+def bibliography_refs(frontmatter):
+    """The `bibliography:` entries of a paper's frontmatter, as a list of paths."""
+    refs = frontmatter.get('bibliography') or []
+    return [refs] if isinstance(refs, str) else [str(ref) for ref in refs]
+
+
+def find_bibliography_files(content, input_file):
+    """Resolved `.bib` paths named in the frontmatter, found without a YAML parse (for cache keys)."""
+    match = FRONTMATTER_BLOCK.match(content)
+    if match is None:
+        return []
+    line = BIBLIOGRAPHY_LINE.search(match.group(1))
+    if line is None:
+        return []
+    value = line.group(1)
+    if value.startswith('['):
+        refs = value.strip('[]').split(',')
+    elif value:
+        refs = [value]
+    else:
+        # A block list: the `- path` lines that follow.
+        refs = []
+        for item in match.group(1)[line.end():].split('\n')[1:]:
+            if not item.lstrip().startswith('- '):
+                break
+            refs.append(item.lstrip()[2:])
+    return [resolve_image_path(ref.strip().strip('\'"'), input_file) for ref in refs if ref.strip()]
+
+
+def _compress_numbers(numbers):
+    """IEEE citation text for reference numbers: runs of three or more become `[a]–[c]`."""
+    numbers = sorted(set(numbers))
+    parts = []
+    i = 0
+    while i < len(numbers):
+        j = i
+        while j + 1 < len(numbers) and numbers[j + 1] == numbers[j] + 1:
+            j += 1
+        if j - i >= 2:
+            parts.append(f'[{numbers[i]}]–[{numbers[j]}]')
+        else:
+            parts.extend(f'[{n}]' for n in numbers[i:j + 1])
+        i = j + 1
+    return ', '.join(parts)
+
+
+class CitationError(ValueError):
+    """A paper's citations cannot be resolved consistently, e.g. numbered and BibTeX styles are mixed."""
+
+
+def citation_numbers(numbers, range_end=None):
+    """Reference numbers of a numeric citation: `numbers` as written (`'3, 5'`), its last one
+    extended through `range_end` for `[3]-[7]`. A reversed range such as `[7]-[3]` is read as `[3]-[7]`.
+    """
+    cited = [int(n) for n in numbers.split(',')]
+    if range_end is not None:
+        first, last = sorted((cited.pop(), int(range_end)))
+        cited.extend(range(first, last + 1))
+    return cited
+
+
+class CitationIndex:
+    """Resolves a paper's citations against its reference list and bibliography in one pass.
+
+    Numeric citations (`[3]`, `[3, 5]`, `[3]-[7]`) are checked against the `[n]` entries
+    under `## REFERENCES`. BibTeX citations (`[@key]`, `[@a; @b]`) are numbered in order
+    of first use and rewritten to IEEE form; their entries are appended to the reference
+    list. The two styles cannot be mixed in one paper, as the generated numbers would clash
+    with the written ones; doing so raises CitationError. Missing, unused and duplicate
+    references are reported when the blocks run out.
+    """
+
+    def __init__(self, bibliography=None):
+        self.bibliography = bibliography or {}
+        self.references = {}
+        self.duplicates = set()
+        self.cited = set()
+        self.numbered = False
+        self.key_numbers = OrderedDict()
+        self.missing_keys = set()
+
+    @classmethod
+    def for_paper(cls, frontmatter, input_file=None, root=None):
+        """Index for a paper whose frontmatter may name `.bib` files (relative to `input_file`).
+
+        With `root`, a `.bib` path outside that directory raises ValueError.
+        """
+        bibliography = {}
+        for ref in bibliography_refs(frontmatter):
+            path = resolve_image_path(ref, input_file) if input_file else ref
+            if root is not None:
+                check_within(path, root)
+            try:
+                bibliography.update(load_bibliography(path))
+            except (OSError, UnicodeDecodeError) as e:
+                logger.error(f"Could not read bibliography {path}: {str(e)}")
+        return cls(bibliography)
+
+    def _cite(self, match):
+        keys, numbers, range_end = match.groups()
+        if keys is None:
+            self._numbered(match.group(0))
+            self.cited.update(citation_numbers(numbers, range_end))
+            return match.group(0)
+        if self.numbered:
+            self._mixed(match.group(0))
+        resolved = []
+        for key in keys.split(';'):
+            key = key.strip().lstrip('@')
+            if key not in self.bibliography:
+                self.missing_keys.add(key)
+                continue
+            if key not in self.key_numbers:
+                self.key_numbers[key] = len(self.key_numbers) + 1
+            resolved.append(self.key_numbers[key])
+        self.cited.update(resolved)
+        text = _compress_numbers(resolved) if resolved else '[?]'
+        return text if range_end is None else f'{text}–[{range_end}]'
+
+    def _numbered(self, where):
+        self.numbered = True
+        if self.key_numbers:
+            self._mixed(where)
+
+    def _mixed(self, where):
+        raise CitationError(f"{where!r}: the paper mixes numbered references and BibTeX keys; "
+                         f"cite either only `[n]` entries or only `[@key]`s")
+
+    def resolve_text(self, text):
+        return CITATION_PATTERN.sub(self._cite, text) if '[' in text else text
+
+    def _index_reference(self, block):
+        if block.number is None:
+            return
+        if block.number in self.references:
+            self.duplicates.add(block.number)
+        self.references[block.number] = block.text
+
+    def resolve(self, blocks, report=True):
+        """Yield `blocks` with citations resolved, then any bibliography entries that were cited.
+
+        Lazy, so it can sit between a streaming tokenizer and writer. With `report`, the
+        citation check is logged once the last block has been produced.
+        """
+        has_heading = False
+        for block in blocks:
+            block_type = type(block)
+            if block_type is Paragraph or block_type is ListItem or block_type is Caption:
+                block.text = self.resolve_text(block.text)
+            elif block_type is Table:
+                block.rows = [[self.resolve_text(cell) for cell in row] for row in block.rows]
+            elif block_type is Reference:
+                if block.number is not None:
+                    self._numbered(block.text[:40])
+                self._index_reference(block)
+            elif block_type is Heading and block.text == 'REFERENCES':
+                has_heading = True
+            yield block
+        if self.key_numbers:
+            if not has_heading:
+                yield Heading('REFERENCES', 1)
+            for key, number in self.key_numbers.items():
+                reference = Reference(f'[{number}] {format_entry(self.bibliography[key])}', number)
+                self._index_reference(reference)
+                yield reference
+        if report:
+            self.log_report()
+
+    def report(self):
+        """Citation problems found so far: cited numbers and keys without an entry, unused and duplicate entries."""
+        return {
+            'missing': sorted(self.cited - self.references.keys()),
+            'missing_keys': sorted(self.missing_keys),
+            'unused': sorted(self.references.keys() - self.cited),
+            'duplicates': sorted(self.duplicates),
+        }
+
+    def log_report(self):
+        report = self.report()
+        if report['missing']:
+            logger.warning(f"Citations without a reference entry: {_compress_numbers(report['missing'])}")
+        if report['missing_keys']:
+            logger.warning(f"Citation keys not found in the bibliography: {', '.join(report['missing_keys'])}")
+        if report['unused']:
+            logger.warning(f"References never cited in the text: {_compress_numbers(report['unused'])}")
+        if report['duplicates']:
+            logger.warning(f"Reference numbers defined more than once: {_compress_numbers(report['duplicates'])}")
+        if not any(report.values()):
+            logger.info(f"All {len(self.cited)} cited references resolved.")
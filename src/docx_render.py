@@ -0,0 +1,431 @@
+import copy
+import logging
+import threading
+from collections import OrderedDict
+
+from docx import Document
+from docx.opc.part import XmlPart
+from docx.package import Package
+from docx.section import Section
+from docx.shared import Pt, Inches
+from docx.table import Table as DocxTable
+from docx.oxml.ns import qn
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls
+from lxml import etree
+
+from markdown_ast import Caption, CodeBlock, Figure, Heading, ListItem, Paragraph, Reference, Table, iter_blocks
+from ieee_style import (
+    BOTTOM_MARGIN, COLUMN_SPACING_TWIPS, PAGE_HEIGHT, PAGE_WIDTH, SIDE_MARGIN, TEXT_WIDTH, TOP_MARGIN,
+    style_elements_xml,
+)
+from citations import CitationIndex
+from docx_template import MAX_CACHED_TEMPLATES, default_styles_xml, template_key, template_package
+from image_prep import FileImageSource, prepare_figure
+from table_layout import is_wide, table_width_twips, table_xml
+from telemetry import NULL_PROFILER
+
+logger = logging.getLogger(__name__)
+
+# Section breaks compiled so far, keyed by the final `w:sectPr` they start from; cleared past this size.
+MAX_CACHED_SECTIONS = 256
+
+_base_documents = OrderedDict()
+_base_lock = threading.Lock()
+# Shared by every thread that renders (render service workers, `multi_format` threads).
+_cache_lock = threading.Lock()
+_section_cache = {}
+_author_tables = {}
+
+
+def apply_page_geometry(section):
+    """Apply the IEEE page size and margins to a section."""
+    section.page_height = Inches(PAGE_HEIGHT)
+    section.page_width = Inches(PAGE_WIDTH)
+    section.top_margin = Inches(TOP_MARGIN)
+    section.bottom_margin = Inches(BOTTOM_MARGIN)
+    section.left_margin = Inches(SIDE_MARGIN)
+    section.right_margin = Inches(SIDE_MARGIN)
+
+
+def setup_page_margins(doc):
+    """Set the margins for the main document."""
+    apply_page_geometry(doc.sections[0])
+
+
+def register_ieee_styles(doc):
+    """Add the IEEE paragraph/character styles (see `ieee_style`) and table style the document lacks."""
+    defined = {style.get(qn('w:styleId')) for style in doc.styles.element.iterchildren(qn('w:style'))}
+    styles = parse_xml(f'<w:styles {nsdecls("w")}>{style_elements_xml(skip=defined)}'
+                       f'{default_styles_xml(skip=defined)}</w:styles>')
+    for style in list(styles):
+        doc.styles.element.append(style)
+
+
+def build_base_document(template=None):
+    """A document holding just the IEEE styles and page geometry.
+
+    `template` is an optional `.docx`/`.dotx` path whose styles, theme, settings and
+    headers/footers are kept; text in its body is dropped. IEEE styles it already
+    defines are left as the template has them.
+    """
+    doc = Document() if template is None else Document(template_package(template))
+    if template is not None:
+        body = doc.element.body
+        for child in list(body):
+            if child.tag != qn('w:sectPr'):
+                body.remove(child)
+    register_ieee_styles(doc)
+    setup_page_margins(doc)
+    return doc
+
+
+def base_document(template=None):
+    """The `build_base_document` for `template`, built once per process (and again if the file changes)."""
+    key = template_key(template)
+    with _base_lock:
+        if key in _base_documents:
+            _base_documents.move_to_end(key)
+            return _base_documents[key]
+    doc = build_base_document(template)
+    with _base_lock:
+        _base_documents[key] = doc
+        while len(_base_documents) > MAX_CACHED_TEMPLATES:
+            _base_documents.popitem(last=False)
+    return doc
+
+
+def clone_document(doc):
+    """An independent in-memory copy of a python-docx document.
+
+    XML parts are copied as element trees by lxml and binary parts share their bytes,
+    which is several times cheaper than reading and parsing the package again.
+    """
+    package = doc.part.package
+    clone = Package()
+    parts = {}
+    for part in package.iter_parts():
+        if isinstance(part, XmlPart):
+            parts[part] = type(part)(part.partname, part.content_type, copy.deepcopy(part.element), clone)
+        else:
+            parts[part] = type(part).load(part.partname, part.content_type, part.blob, clone)
+    for source, target in [(package, clone), *parts.items()]:
+        for rel in source.rels.values():
+            target_part = rel.target_ref if rel.is_external else parts[rel.target_part]
+            target.load_rel(rel.reltype, target_part, rel.rId, rel.is_external)
+    for part in parts.values():
+        part.after_unmarshal()
+    clone.after_unmarshal()
+    return clone.main_document_part.document
+
+
+def new_document(template=None):
+    """A fresh document for one paper: a copy of the cached base document for `template`."""
+    return clone_document(base_document(template))
+
+
+def add_styled_paragraph(container, style_id, text=''):
+    """Add a paragraph using a named IEEE style.
+
+    The style is set by id: python-docx's lookup by style name scans every style in
+    the document on each call, which dominated render time.
+    """
+    p = container.add_paragraph()
+    p._p.style = style_id
+    if text:
+        add_styled_run(p, text)
+    return p
+
+
+def add_styled_run(paragraph, text, style_id=None):
+    """Add a run, optionally with a named IEEE character style."""
+    run = paragraph.add_run(text)
+    if style_id:
+        run._r.style = style_id
+    return run
+
+
+def add_title(doc, frontmatter):
+    """Add the main paper title."""
+    title_text = frontmatter.get('title', 'Unknown Title')
+    add_styled_paragraph(doc, 'IEEETitle', title_text)
+
+
+def add_authors(doc, frontmatter):
+    """Add author dynamically depending on YAML frontmatter.
+
+    The empty table for each number of authors is built once per process and copied
+    for later papers; only the author text is added every time.
+    """
+    authors = frontmatter.get('authors', []) or []
+    num_authors = len(authors) if authors else 1
+    with _cache_lock:
+        compiled = _author_tables.get(len(authors))
+    if compiled is None:
+        author_table = _build_author_table(doc, len(authors), num_authors)
+        with _cache_lock:
+            _author_tables[len(authors)] = copy.deepcopy(author_table._tbl)
+    else:
+        tbl = copy.deepcopy(compiled)
+        doc.element.body._insert_tbl(tbl)
+        author_table = DocxTable(tbl, doc._body)
+
+    for idx, author in enumerate(authors):
+        if idx >= len(author_table.rows[0].cells):
+            break
+        cell = author_table.rows[0].cells[idx]
+
+        p1 = cell.paragraphs[0]
+        p1._p.style = 'IEEEAuthor'
+        add_styled_run(p1, author.get('name', ''))
+
+        for key in ('role', 'department', 'organization', 'email'):
+            if key in author:
+                p_detail = add_styled_paragraph(cell, 'IEEEAuthorDetail', author[key])
+                if key == 'email':
+                    p_detail.paragraph_format.space_after = Pt(0)
+
+    # Add spacing after author table
+    spacer = doc.add_paragraph()
+    spacer.paragraph_format.space_after = Pt(12)
+
+
+def _build_author_table(doc, count, num_columns):
+    """Append an empty author table: borderless, with a fixed width for each of the `count` authors."""
+    author_table = doc.add_table(rows=1, cols=max(1, num_columns))
+    author_table.autofit = False
+    author_table.allow_autofit = False
+
+    # Remove borders
+    for row in author_table.rows:
+        for cell in row.cells:
+            tcPr = cell._element.get_or_add_tcPr()
+            tcBorders = OxmlElement('w:tcBorders')
+            for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
+                border = OxmlElement(f'w:{border_name}')
+                border.set(qn('w:val'), 'none')
+                tcBorders.append(border)
+            tcPr.append(tcBorders)
+
+    for cell in author_table.rows[0].cells[:count]:
+        cell.width = Inches(TEXT_WIDTH / num_columns)
+    return author_table
+
+
+def set_two_column_layout(doc):
+    """Set layout to double columns for main text content."""
+    return _continuous_section(doc, 2)
+
+
+def set_single_column_layout(doc):
+    """Set layout to a single column (primarily for large images)."""
+    return _continuous_section(doc, 1)
+
+
+def current_columns(doc):
+    """Column count of the section new content is added to (the one the body's own sectPr describes)."""
+    cols = doc.element.body.get_or_add_sectPr().find(qn('w:cols'))
+    return int(cols.get(qn('w:num'), '1')) if cols is not None else 1
+
+
+def _continuous_section(doc, columns):
+    """Add a continuous section break and lay the new section out in `columns` columns.
+
+    The new section's properties depend only on those of the section being closed, so
+    python-docx works them out once per process and later breaks copy the cached XML.
+    """
+    body = doc.element.body
+    key = (etree.tostring(body.get_or_add_sectPr()), columns)
+    with _cache_lock:
+        compiled = _section_cache.get(key)
+    if compiled is not None:
+        sect_pr = copy.deepcopy(compiled)
+        body.replace(body.add_section_break(), sect_pr)
+        return Section(sect_pr, doc.part)
+
+    new_section = doc.add_section()
+    new_section.start_type = 0  # Continuous section break
+    apply_page_geometry(new_section)
+
+    sectPr = new_section._sectPr
+    cols = sectPr.xpath('./w:cols')[0] if sectPr.xpath('./w:cols') else OxmlElement('w:cols')
+    cols.set(qn('w:num'), str(columns))
+    if columns > 1:
+        cols.set(qn('w:space'), str(COLUMN_SPACING_TWIPS))
+    if not sectPr.xpath('./w:cols'):
+        sectPr.append(cols)
+    compiled = copy.deepcopy(sectPr)
+    with _cache_lock:
+        if len(_section_cache) >= MAX_CACHED_SECTIONS:
+            _section_cache.clear()
+        _section_cache[key] = compiled
+    return new_section
+
+
+def add_abstract_and_index_terms(doc, frontmatter):
+    """Add the abstract and index terms block."""
+    abstract_text = frontmatter.get('abstract', '')
+    if abstract_text:
+        abstract_para = add_styled_paragraph(doc, 'IEEEAbstract')
+        add_styled_run(abstract_para, 'Abstract', 'IEEELabel')
+        add_styled_run(abstract_para, '—', 'IEEELabel')
+        add_styled_run(abstract_para, abstract_text)
+
+    index_terms_text = frontmatter.get('index_terms', '')
+    if index_terms_text:
+        index_para = add_styled_paragraph(doc, 'IEEEIndexTerms')
+        add_styled_run(index_para, 'Index Terms', 'IEEELabel')
+        add_styled_run(index_para, '—', 'IEEELabel')
+        add_styled_run(index_para, index_terms_text)
+
+
+def process_table(doc, table):
+    """Append a parsed markdown table to the Word doc.
+
+    The `w:tbl` XML is built in one piece by `table_layout`; tables too wide for a text
+    column get a single-column section of their own, like figures, unless the current
+    section is already single-column (a table between a figure and its caption).
+    """
+    if not table.rows:
+        return
+    wide = is_wide(table) and current_columns(doc) > 1
+    if wide:
+        set_single_column_layout(doc)
+    doc.element.body._insert_tbl(parse_xml(table_xml(table, table_width_twips(table), f' {nsdecls("w")}')))
+    p = doc.add_paragraph()
+    p.paragraph_format.space_after = Pt(6)
+    if wide:
+        set_two_column_layout(doc)
+
+
+def render_heading(doc, block, image_source):
+    """Section headings (`## I.`, ACKNOWLEDGMENT, REFERENCES) and `###` subsections."""
+    add_styled_paragraph(doc, 'IEEEHeading1' if block.level == 1 else 'IEEEHeading2', block.text)
+
+
+def render_figure(doc, block, image_source):
+    """Full-width image in its own single-column section."""
+    img_path, source = image_source.resolve(block.path)
+    
+    # Single column for large images
+    set_single_column_layout(doc)
+    
+    p = add_styled_paragraph(doc, 'IEEEFigure')
+    
+    if source is not None:
+        r = p.add_run()
+        try:
+            r.add_picture(prepare_figure(source, TEXT_WIDTH), width=Inches(TEXT_WIDTH))
+            logger.info(f"Successfully inserted image: {img_path}")
+        except Exception as e:
+            logger.error(f"Failed to insert image {img_path}: {str(e)}")
+            p.add_run(f'[Error loading image: {img_path}]')
+    else:
+        logger.warning(f"Image file not found: {img_path}")
+        p.add_run(f'[Image missing: {img_path}]')
+
+
+def render_caption(doc, block, image_source):
+    """Figure caption, after which the two-column layout resumes."""
+    add_styled_paragraph(doc, 'IEEECaption', block.text)
+    
+    # Resume two-column layout after caption
+    set_two_column_layout(doc)
+
+
+def render_code_block(doc, block, image_source):
+    """Code is not printed; only `CCS = ...` formula lines are kept as centered equations."""
+    for line in block.lines:
+        if line.startswith('CCS ='):
+            add_styled_paragraph(doc, 'IEEEEquation', line)
+
+
+def render_table(doc, block, image_source):
+    process_table(doc, block)
+
+
+def render_reference(doc, block, image_source):
+    add_styled_paragraph(doc, 'IEEEReference', block.text)
+
+
+def render_list_item(doc, block, image_source):
+    add_styled_paragraph(doc, 'IEEEListItem', f'{block.marker} {block.text}')
+
+
+def render_paragraph(doc, block, image_source):
+    add_styled_paragraph(doc, 'IEEEBody', block.text)
+
+
+BLOCK_RENDERERS = {
+    Heading: render_heading,
+    Figure: render_figure,
+    Caption: render_caption,
+    CodeBlock: render_code_block,
+    Table: render_table,
+    Reference: render_reference,
+    ListItem: render_list_item,
+    Paragraph: render_paragraph,
+}
+
+
+def render_blocks(doc, blocks, image_source, profiler=NULL_PROFILER, block_cache=None):
+    """Append parsed body blocks to the Word doc, loading figures through `image_source`.
+
+    With a `build_cache.BlockCache`, blocks rendered by an earlier build of the same paper
+    are copied from it (see `_render_cached`).
+    """
+    for block in blocks:
+        with profiler.block(type(block).__name__):
+            if block_cache is None or type(block) is Figure:
+                BLOCK_RENDERERS[type(block)](doc, block, image_source)
+            else:
+                _render_cached(doc, block, image_source, block_cache)
+
+
+def _render_cached(doc, block, image_source, block_cache):
+    """Render a block, or copy the body XML it produced when it last started in the same section.
+
+    A block only appends elements before the body's `w:sectPr` and may replace that
+    `w:sectPr` (a section break), so both are stored. Figures add image parts to the
+    package and are never cached.
+    """
+    body = doc.element.body
+    key = (repr(block), etree.tostring(body.get_or_add_sectPr()))
+    cached = block_cache.get(key)
+    if cached is None:
+        start = len(body) - 1
+        BLOCK_RENDERERS[type(block)](doc, block, image_source)
+        sect_pr = body[-1]
+        final = None if etree.tostring(sect_pr) == key[1] else copy.deepcopy(sect_pr)
+        block_cache.put(key, ([copy.deepcopy(element) for element in body[start:-1]], final))
+        return
+    elements, final = cached
+    for element in elements:
+        body[-1].addprevious(copy.deepcopy(element))
+    if final is not None:
+        body.replace(body[-1], copy.deepcopy(final))
+
+
+def parse_markdown_content(doc, content, input_file):
+    """Parse the body of the markdown and render it into the Word doc, checking its citations."""
+    render_blocks(doc, CitationIndex().resolve(iter_blocks(content)), FileImageSource(input_file))
+
+
+def render_paper(paper, input_file=None, profiler=NULL_PROFILER, image_source=None, template=None,
+                 block_cache=None):
+    """Build the Word document for a parsed paper.
+
+    Figures are read relative to `input_file` unless an `image_source` is given. The
+    document starts as a copy of the cached base document for `template` (an optional
+    `.docx`/`.dotx` path), so styles and page setup are not rebuilt for every paper.
+    `block_cache` is an optional `build_cache.BlockCache` kept warm between rebuilds.
+    """
+    doc = new_document(template)
+    add_title(doc, paper.frontmatter)
+    add_authors(doc, paper.frontmatter)
+    
+    set_two_column_layout(doc)
+    add_abstract_and_index_terms(doc, paper.frontmatter)
+    
+    render_blocks(doc, paper.blocks, image_source or FileImageSource(input_file), profiler, block_cache)
+    return doc
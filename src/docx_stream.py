@@ -0,0 +1,350 @@
+import io
+import logging
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from docx.image.image import Image
+from docx.shared import Inches
+
+from ieee_style import (
+    BOTTOM_MARGIN, COLUMN_SPACING_TWIPS, PAGE_HEIGHT, PAGE_WIDTH, SIDE_MARGIN, TEXT_WIDTH, TOP_MARGIN,
+    style_elements_xml, twips,
+)
+from markdown_ast import Caption, CodeBlock, Figure, Heading, ListItem, Paragraph, Reference, Table
+from image_prep import prepare_figure
+from docx_template import default_styles_xml, default_template_path, read_template_parts
+from table_layout import TABLE_LOOK, TABLE_SPACER, is_wide, table_width_twips, table_xml
+from telemetry import NULL_PROFILER
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_PATH = default_template_path()
+WRITE_BUFFER_SIZE = 64 * 1024
+
+# Parts rebuilt by the writer; every other template part is copied verbatim.
+GENERATED_PARTS = {'[Content_Types].xml', 'word/document.xml', 'word/_rels/document.xml.rels', 'word/styles.xml'}
+
+DOCUMENT_OPEN = (
+    "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    ' xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"'
+    ' xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+    ' xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"><w:body>'
+)
+DOCUMENT_CLOSE = '</w:body></w:document>'
+IMAGE_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+NO_BORDERS = ('<w:tcBorders><w:top w:val="none"/><w:left w:val="none"/><w:bottom w:val="none"/>'
+              '<w:right w:val="none"/><w:insideH w:val="none"/><w:insideV w:val="none"/></w:tcBorders>')
+
+STYLE_ID = re.compile(r'w:styleId="([^"]+)"')
+HEADER_FOOTER_REF = re.compile(r'<w:(?:header|footer)Reference\b[^>]*/>')
+
+
+def load_template_parts(template=None):
+    """Read a `.docx`/`.dotx` template (python-docx's default without one) once per process."""
+    return read_template_parts(template)
+
+
+def _header_footer_refs(template):
+    """The header/footer references of the template's last section, as XML (empty if it has none)."""
+    document = template['word/document.xml'].decode('utf-8')
+    return ''.join(HEADER_FOOTER_REF.findall(document[document.rfind('<w:sectPr'):]))
+
+
+def _styles_part(template):
+    """The template's styles plus the IEEE styles and table style it does not define itself."""
+    styles = template['word/styles.xml'].decode('utf-8')
+    defined = set(STYLE_ID.findall(styles))
+    extra = style_elements_xml(skip=defined) + default_styles_xml(skip=defined)
+    return styles.replace('</w:styles>', extra + '</w:styles>').encode('utf-8')
+
+
+def _rels_part(template, images):
+    rels = template['word/_rels/document.xml.rels'].decode('utf-8')
+    extra = ''.join(
+        f'<Relationship Id="{rel_id}" Type="{IMAGE_REL_TYPE}" Target="{part_name[len("word/"):]}"/>'
+        for rel_id, part_name, _, _ in images
+    )
+    return rels.replace('</Relationships>', extra + '</Relationships>').encode('utf-8')
+
+
+def _content_types_part(template, images):
+    types = template['[Content_Types].xml'].decode('utf-8')
+    known = set(re.findall(r'Default Extension="([^"]+)"', types))
+    extra = ''
+    for _, part_name, content_type, _ in images:
+        ext = part_name.rsplit('.', 1)[-1]
+        if ext not in known:
+            known.add(ext)
+            extra += f'<Default Extension="{ext}" ContentType="{content_type}"/>'
+    return types.replace('</Types>', extra + '</Types>').encode('utf-8')
+
+
+def _run(text, char_style=None):
+    rpr = f'<w:rPr><w:rStyle w:val="{char_style}"/></w:rPr>' if char_style else ''
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def _paragraph(style, runs='', ppr_extra=''):
+    return f'<w:p><w:pPr><w:pStyle w:val="{style}"/>{ppr_extra}</w:pPr>{runs}</w:p>'
+
+
+class StreamingDocxWriter:
+    """Writes WordprocessingML for a paper straight into a text stream, block by block.
+
+    Nothing but the current block and the list of embedded images is held in memory.
+    Formatting comes from the named IEEE styles in `ieee_style`; sections are closed by
+    emitting their `w:sectPr` as soon as the layout changes.
+    """
+
+    def __init__(self, out, image_source, media_prefix='word/media/image', header_footer_refs='', block_cache=None):
+        self.out = out
+        self.image_source = image_source
+        self.media_prefix = media_prefix
+        # Later sections inherit the headers and footers of the first one.
+        self.header_footer_refs = header_footer_refs
+        # Optional `build_cache.BlockCache` of block XML from earlier builds (watch mode).
+        self.block_cache = block_cache
+        self.images = []
+        self._image_rels = {}
+        self._drawing_id = 0
+        # The first section keeps the template's defaults: starts a page, one column, 0.5" gap.
+        self.columns = 1
+        self.column_space = 720
+        self.continuous = False
+
+    def write(self, xml):
+        self.out.write(xml)
+
+    def _sect_pr(self):
+        section_type = '<w:type w:val="continuous"/>' if self.continuous else ''
+        num = f' w:num="{self.columns}"' if self.continuous else ''
+        refs = '' if self.continuous else self.header_footer_refs
+        return (
+            f'<w:sectPr>{refs}{section_type}<w:pgSz w:w="{twips(PAGE_WIDTH)}" w:h="{twips(PAGE_HEIGHT)}"/>'
+            f'<w:pgMar w:top="{twips(TOP_MARGIN)}" w:right="{twips(SIDE_MARGIN)}" w:bottom="{twips(BOTTOM_MARGIN)}"'
+            f' w:left="{twips(SIDE_MARGIN)}" w:header="720" w:footer="720" w:gutter="0"/>'
+            f'<w:cols w:space="{self.column_space}"{num}/><w:docGrid w:linePitch="360"/></w:sectPr>'
+        )
+
+    def section_break(self, columns):
+        """End the current section and start a continuous one with `columns` columns."""
+        self.write(f'<w:p><w:pPr>{self._sect_pr()}</w:pPr></w:p>')
+        self.columns = columns
+        self.column_space = COLUMN_SPACING_TWIPS
+        self.continuous = True
+
+    # --- Front matter ---
+
+    def title(self, frontmatter):
+        self.write(_paragraph('IEEETitle', _run(frontmatter.get('title', 'Unknown Title'))))
+
+    def authors(self, frontmatter):
+        authors = frontmatter.get('authors', []) or []
+        num_authors = len(authors) if authors else 1
+        col_width = twips(TEXT_WIDTH) // max(1, num_authors)
+        grid = ''.join(f'<w:gridCol w:w="{col_width}"/>' for _ in range(num_authors))
+        cells = []
+        for idx in range(num_authors):
+            author = authors[idx] if idx < len(authors) else {}
+            paragraphs = [_paragraph('IEEEAuthor', _run(str(author.get('name', ''))))] if author else ['<w:p/>']
+            details = [key for key in ('role', 'department', 'organization', 'email') if key in author]
+            for key in details:
+                last = '<w:spacing w:after="0"/>' if key == 'email' else ''
+                paragraphs.append(_paragraph('IEEEAuthorDetail', _run(str(author[key])), last))
+            cells.append(f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{col_width}"/>{NO_BORDERS}</w:tcPr>'
+                         f'{"".join(paragraphs)}</w:tc>')
+        self.write(f'<w:tbl><w:tblPr><w:tblW w:type="auto" w:w="0"/><w:tblLayout w:type="fixed"/>{TABLE_LOOK}'
+                   f'</w:tblPr><w:tblGrid>{grid}</w:tblGrid><w:tr>{"".join(cells)}</w:tr></w:tbl>')
+        # Spacing after the author block
+        self.write('<w:p><w:pPr><w:spacing w:after="240"/></w:pPr></w:p>')
+
+    def abstract_and_index_terms(self, frontmatter):
+        abstract_text = frontmatter.get('abstract', '')
+        if abstract_text:
+            runs = _run('Abstract', 'IEEELabel') + _run('—', 'IEEELabel') + _run(str(abstract_text))
+            self.write(_paragraph('IEEEAbstract', runs))
+        index_terms_text = frontmatter.get('index_terms', '')
+        if index_terms_text:
+            runs = _run('Index Terms', 'IEEELabel') + _run('—', 'IEEELabel') + _run(str(index_terms_text))
+            self.write(_paragraph('IEEEIndexTerms', runs))
+
+    # --- Body blocks ---
+
+    def heading(self, block):
+        self.write(_paragraph('IEEEHeading1' if block.level == 1 else 'IEEEHeading2', _run(block.text)))
+
+    def figure(self, block):
+        img_path, source = self.image_source.resolve(block.path)
+        self.section_break(1)
+        if source is None:
+            logger.warning(f"Image file not found: {img_path}")
+            self.write(_paragraph('IEEEFigure', _run(f'[Image missing: {img_path}]')))
+            return
+        try:
+            self.write(_paragraph('IEEEFigure', self._drawing(img_path, source)))
+            logger.info(f"Successfully inserted image: {img_path}")
+        except Exception as e:
+            logger.error(f"Failed to insert image {img_path}: {str(e)}")
+            self.write(_paragraph('IEEEFigure', _run(f'[Error loading image: {img_path}]')))
+
+    def _drawing(self, img_path, source):
+        prepared = prepare_figure(source, TEXT_WIDTH)
+        image = Image.from_file(prepared)
+        cx, cy = image.scaled_dimensions(Inches(TEXT_WIDTH), None)
+        key = os.path.abspath(img_path)
+        if key not in self._image_rels:
+            index = len(self.images) + 1
+            rel_id = f'rIdImg{index}'
+            self.images.append((rel_id, f'{self.media_prefix}{index}.{image.ext}', image.content_type, prepared))
+            self._image_rels[key] = rel_id
+        rel_id = self._image_rels[key]
+        self._drawing_id += 1
+        name = quoteattr(os.path.basename(img_path))
+        return (
+            f'<w:r><w:drawing><wp:inline><wp:extent cx="{cx}" cy="{cy}"/>'
+            f'<wp:docPr id="{self._drawing_id}" name="Picture {self._drawing_id}"/>'
+            '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+            '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture"><pic:pic>'
+            f'<pic:nvPicPr><pic:cNvPr id="0" name={name}/><pic:cNvPicPr/></pic:nvPicPr>'
+            f'<pic:blipFill><a:blip r:embed="{rel_id}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+            f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            '<a:prstGeom prst="rect"/></pic:spPr></pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+        )
+
+    def caption(self, block):
+        self.write(_paragraph('IEEECaption', _run(block.text)))
+        self.section_break(2)
+
+    def code_block(self, block):
+        for line in block.lines:
+            if line.startswith('CCS ='):
+                self.write(_paragraph('IEEEEquation', _run(line)))
+
+    def table(self, block):
+        if not block.rows:
+            return
+        wide = is_wide(block) and self.columns > 1
+        if wide:
+            self.section_break(1)
+        self.write(table_xml(block, table_width_twips(block)) + TABLE_SPACER)
+        if wide:
+            self.section_break(2)
+
+    def reference(self, block):
+        self.write(_paragraph('IEEEReference', _run(block.text)))
+
+    def list_item(self, block):
+        self.write(_paragraph('IEEEListItem', _run(f'{block.marker} {block.text}')))
+
+    def paragraph(self, block):
+        self.write(_paragraph('IEEEBody', _run(block.text)))
+
+    def blocks(self, blocks, profiler=NULL_PROFILER):
+        handlers = {
+            Heading: self.heading, Figure: self.figure, Caption: self.caption, CodeBlock: self.code_block,
+            Table: self.table, Reference: self.reference, ListItem: self.list_item, Paragraph: self.paragraph,
+        }
+        for block in blocks:
+            with profiler.block(type(block).__name__):
+                if self.block_cache is None or type(block) is Figure:
+                    handlers[type(block)](block)
+                else:
+                    self._cached_block(handlers[type(block)], block)
+
+    def _cached_block(self, handler, block):
+        """Write a block's XML, reusing what it produced when it last started in the same layout.
+
+        Figures number the embedded images and drawings, so they are never cached.
+        """
+        key = (repr(block), self.columns, self.column_space, self.continuous)
+        cached = self.block_cache.get(key)
+        if cached is None:
+            out, self.out = self.out, io.StringIO()
+            try:
+                handler(block)
+                xml = self.out.getvalue()
+            finally:
+                self.out = out
+            cached = (xml, self.columns, self.column_space, self.continuous)
+            self.block_cache.put(key, cached)
+        xml, self.columns, self.column_space, self.continuous = cached
+        self.write(xml)
+
+    def paper(self, paper, profiler=NULL_PROFILER):
+        self.write(DOCUMENT_OPEN)
+        self.title(paper.frontmatter)
+        self.authors(paper.frontmatter)
+        self.section_break(2)
+        self.abstract_and_index_terms(paper.frontmatter)
+        self.blocks(paper.blocks, profiler)
+        self.write(self._sect_pr() + DOCUMENT_CLOSE)
+
+
+def write_docx(paper, output, image_source, profiler=NULL_PROFILER, template=None, block_cache=None):
+    """Stream a parsed paper into a DOCX package at `output` (a path or binary file object).
+
+    Figures are loaded through `image_source` (see `image_prep.FileImageSource`).
+    `template` is an optional `.docx`/`.dotx` whose styles, theme, settings and headers/footers
+    are used; its body is replaced by the paper and its page setup by the IEEE one.
+    `block_cache` is an optional `build_cache.BlockCache` kept warm between rebuilds.
+
+    `paper.blocks` may be a lazy iterator (e.g. `markdown_ast.iter_blocks`) so rendering
+    proceeds while the body is still being tokenized. A path is written through a temporary
+    file next to it and only replaced on success, so a failure mid-stream (e.g. a bad
+    citation found late in the body) leaves any previous output intact.
+    """
+    if not isinstance(output, (str, os.PathLike)):
+        _write_package(paper, output, image_source, profiler, template, block_cache)
+        return
+    tmp_path = f'{output}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            _write_package(paper, f, image_source, profiler, template, block_cache)
+        os.replace(tmp_path, output)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _write_package(paper, output, image_source, profiler, template, block_cache=None):
+    template = load_template_parts(template)
+    # Keep clear of media the template itself embeds (e.g. a logo in its header).
+    media_prefix = ('word/media/ieee-image' if any(name.startswith('word/media/') for name in template)
+                    else 'word/media/image')
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        with z.open('word/document.xml', 'w', force_zip64=True) as raw:
+            with io.TextIOWrapper(io.BufferedWriter(raw, WRITE_BUFFER_SIZE), encoding='utf-8') as out:
+                writer = StreamingDocxWriter(out, image_source, media_prefix, _header_footer_refs(template),
+                                             block_cache)
+                writer.paper(paper, profiler)
+
+        for _, part_name, _, prepared in writer.images:
+            if isinstance(prepared, str):
+                z.write(prepared, part_name)
+            else:
+                z.writestr(part_name, prepared.getvalue())
+        z.writestr('word/_rels/document.xml.rels', _rels_part(template, writer.images))
+        z.writestr('word/styles.xml', _styles_part(template))
+        z.writestr('[Content_Types].xml', _content_types_part(template, writer.images))
+        for name, data in template.items():
+            if name not in GENERATED_PARTS:
+                z.writestr(name, data)
+
+
+class StreamedDocument:
+    """Drop-in for a python-docx `Document` in `save_and_convert`: renders through the streaming writer on save()."""
+
+    def __init__(self, paper, image_source, profiler=NULL_PROFILER, template=None, block_cache=None):
+        self.paper = paper
+        self.image_source = image_source
+        self.profiler = profiler
+        self.template = template
+        self.block_cache = block_cache
+
+    def save(self, path_or_stream):
+        write_docx(self.paper, path_or_stream, self.image_source, self.profiler, self.template, self.block_cache)
@@ -0,0 +1,84 @@
+import io
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+
+from table_layout import TABLE_STYLE_ID
+
+# A `.dotx` differs from a `.docx` only in the content type of its main part.
+TEMPLATE_MAIN_CONTENT_TYPE = b'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml'
+DOCUMENT_MAIN_CONTENT_TYPE = b'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml'
+# Templates kept per process; the least recently used one is dropped past this.
+MAX_CACHED_TEMPLATES = 8
+# Styles the generated XML uses that come from the default template rather than `ieee_style`.
+DEFAULT_TEMPLATE_STYLE_IDS = ('TableNormal', TABLE_STYLE_ID)
+
+_parts_cache = OrderedDict()
+_parts_lock = threading.Lock()
+
+
+def default_template_path():
+    """python-docx's built-in default document, the base when no template is given."""
+    import docx
+    return os.path.join(os.path.dirname(docx.__file__), 'templates', 'default.docx')
+
+
+def template_key(template=None):
+    """Cache key of a template file: its absolute path, modification time and size.
+
+    An edited template gets a new key, so long-running workers pick up the change.
+    """
+    path = os.path.abspath(template or default_template_path())
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def read_template_parts(template=None):
+    """The parts of a `.docx`/`.dotx` template as `{name: bytes}`, read once per process.
+
+    A `.dotx` main part is relabelled as a document, so the result opens as a `.docx`.
+    Raises OSError if the file cannot be read and zipfile.BadZipFile if it is not a package.
+    """
+    key = template_key(template)
+    with _parts_lock:
+        if key in _parts_cache:
+            _parts_cache.move_to_end(key)
+            return _parts_cache[key]
+    with zipfile.ZipFile(key[0]) as z:
+        parts = {name: z.read(name) for name in z.namelist()}
+    parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(TEMPLATE_MAIN_CONTENT_TYPE,
+                                                                        DOCUMENT_MAIN_CONTENT_TYPE)
+    with _parts_lock:
+        _parts_cache[key] = parts
+        while len(_parts_cache) > MAX_CACHED_TEMPLATES:
+            _parts_cache.popitem(last=False)
+    return parts
+
+
+def template_package(template=None):
+    """A template as an in-memory `.docx` package, ready for `docx.Document`."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        for name, data in read_template_parts(template).items():
+            z.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def default_styles_xml(skip=()):
+    """`w:style` definitions of `DEFAULT_TEMPLATE_STYLE_IDS`, copied from the default template.
+
+    A user template may lack the table style the IEEE tables refer to; Word would then
+    draw them without borders. Style ids in `skip` (those the template defines) are left out.
+    """
+    styles = read_template_parts()['word/styles.xml'].decode('utf-8')
+    xml = []
+    for style_id in DEFAULT_TEMPLATE_STYLE_IDS:
+        if style_id in skip:
+            continue
+        match = re.search(rf'<w:style\b[^>]*w:styleId="{re.escape(style_id)}".*?</w:style>', styles, re.DOTALL)
+        if match:
+            xml.append(match.group())
+    return ''.join(xml)
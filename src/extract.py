@@ -1,59 +1,400 @@
 import zipfile
 import xml.etree.ElementTree as ET
 import argparse
+import glob
+import json
+import mimetypes
 import os
+import posixpath
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_text import iter_pdf_text
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+P_NS = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+S_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# DOCX parts extracted after the body, as (section title, member name pattern).
+DOCX_EXTRA_PARTS = (
+    ('Headers', re.compile(r'word/header\d*\.xml')),
+    ('Footers', re.compile(r'word/footer\d*\.xml')),
+    ('Footnotes', re.compile(r'word/footnotes\.xml')),
+    ('Endnotes', re.compile(r'word/endnotes\.xml')),
+)
+
+# extension -> (MIME type, extractor) and MIME type -> extractor; see `register_extractor`.
+EXTRACTORS = {}
+MIME_EXTRACTORS = {}
+
+
+def register_extractor(mime_type, *extensions):
+    """Register a generator `extractor(path)` yielding text lines for a MIME type and its extensions."""
+    def decorator(func):
+        MIME_EXTRACTORS[mime_type] = func
+        for ext in extensions:
+            EXTRACTORS[ext] = (mime_type, func)
+        return func
+    return decorator
+
+
+def extractor_for(path, mime_type=None):
+    """Look up the extractor by explicit MIME type, file extension, then guessed MIME type."""
+    if mime_type in MIME_EXTRACTORS:
+        return mime_type, MIME_EXTRACTORS[mime_type]
+    ext = os.path.splitext(path)[1].lower()
+    if ext in EXTRACTORS:
+        return EXTRACTORS[ext]
+    guessed = mimetypes.guess_type(path)[0]
+    if guessed in MIME_EXTRACTORS:
+        return guessed, MIME_EXTRACTORS[guessed]
+    raise ValueError(f"Unsupported file format: {path}")
+
+
+# --- Streaming XML helpers ---
+
+def iter_closed(stream, tags):
+    """Yield each outermost element whose tag is in `tags` once it has been fully parsed.
+
+    Elements are detached from the tree as soon as they close (after being yielded), so
+    memory stays flat however large the part is; only the subtree of the element being
+    collected is kept.
+    """
+    stack = []
+    open_count = 0
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if elem.tag in tags:
+                open_count += 1
+            continue
+        stack.pop()
+        if elem.tag in tags:
+            open_count -= 1
+            if not open_count:
+                yield elem
+        if stack and not open_count:
+            stack[-1].remove(elem)
+
+
+def _paragraph_text(paragraph, ns):
+    return ''.join(node.text for node in paragraph.iter(f'{{{ns}}}t') if node.text)
+
+
+def _table_rows(table, ns):
+    """One ` | `-separated line per table row; paragraphs within a cell are joined by spaces."""
+    for row in table.iter(f'{{{ns}}}tr'):
+        cells = [' '.join(filter(None, (_paragraph_text(p, ns) for p in cell.iter(f'{{{ns}}}p'))))
+                 for cell in row if cell.tag == f'{{{ns}}}tc']
+        if any(cells):
+            yield ' | '.join(cells)
+
+
+def iter_paragraph_text(stream, ns):
+    """Stream the text of each `<ns:p>` paragraph of an XML part, and `<ns:tbl>` tables row by row."""
+    p_tag, tbl_tag = f'{{{ns}}}p', f'{{{ns}}}tbl'
+    for elem in iter_closed(stream, {p_tag, tbl_tag}):
+        if elem.tag == tbl_tag:
+            yield from _table_rows(elem, ns)
+        else:
+            p_text = _paragraph_text(elem, ns)
+            if p_text:
+                yield p_text
+
+
+def _has_member(z, name):
+    try:
+        z.getinfo(name)
+        return True
+    except KeyError:
+        return False
+
+
+def _read_rels(z, part_name):
+    """Relationships of a package part: {rId: (type, member name)}."""
+    directory, name = posixpath.split(part_name)
+    rels_name = posixpath.join(directory, '_rels', f'{name}.rels')
+    if not _has_member(z, rels_name):
+        return {}
+    rels = {}
+    with z.open(rels_name) as part:
+        for rel in iter_closed(part, {f'{{{REL_NS}}}Relationship'}):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target', '')
+            target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(directory, target))
+            rels[rel.get('Id')] = (rel.get('Type', ''), target)
+    return rels
+
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+def _section(title, lines):
+    """Yield `--- title ---` followed by `lines`, or nothing at all if `lines` is empty."""
+    for i, line in enumerate(lines):
+        if not i:
+            yield f"--- {title} ---"
+        yield line
+
+
+def _unique(lines):
+    seen = set()
+    for line in lines:
+        if line not in seen:
+            seen.add(line)
+            yield line
+
+
+# --- Extractors ---
+
+@register_extractor('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx')
+def iter_docx_text(docx_path):
+    """Body paragraphs and tables, then headers, footers, footnotes and endnotes."""
+    with zipfile.ZipFile(docx_path) as z:
+        with z.open('word/document.xml') as part:
+            yield from iter_paragraph_text(part, W_NS)
+        for title, pattern in DOCX_EXTRA_PARTS:
+            members = sorted((n for n in z.namelist() if pattern.fullmatch(n)), key=_natural_key)
+            # The same header/footer text is often repeated for first, odd and even pages.
+            yield from _section(title, _unique(_iter_members(z, members, W_NS)))
+
+
+def _iter_members(z, members, ns):
+    for member in members:
+        with z.open(member) as part:
+            yield from iter_paragraph_text(part, ns)
+
+
+def _slide_number(name):
+    return int(name.replace('ppt/slides/slide', '').replace('.xml', ''))
+
+
+def _iter_notes_text(stream):
+    """Text of the notes placeholder of a notes slide (skipping the slide image and number)."""
+    for shape in iter_closed(stream, {f'{{{P_NS}}}sp'}):
+        placeholder = shape.find(f'.//{{{P_NS}}}ph')
+        if placeholder is not None and placeholder.get('type') == 'body':
+            for paragraph in shape.iter(f'{{{A_NS}}}p'):
+                p_text = _paragraph_text(paragraph, A_NS)
+                if p_text:
+                    yield p_text
+
+
+@register_extractor('application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx')
+def iter_pptx_text(pptx_path):
+    """Slide text and tables, each slide followed by its speaker notes."""
+    with zipfile.ZipFile(pptx_path) as z:
+        slide_files = [f for f in z.namelist() if re.fullmatch(r'ppt/slides/slide\d+\.xml', f)]
+        # Sort slides by number
+        slide_files.sort(key=_slide_number)
+        for slide_file in slide_files:
+            yield f"--- Slide {slide_file} ---"
+            with z.open(slide_file) as part:
+                yield from iter_paragraph_text(part, A_NS)
+            notes = [target for rel_type, target in _read_rels(z, slide_file).values()
+                     if rel_type.endswith('/notesSlide') and _has_member(z, target)]
+            for notes_file in notes:
+                with z.open(notes_file) as part:
+                    yield from _section('Notes', _iter_notes_text(part))
+            yield ""
+
+
+def _column_index(cell_ref):
+    index = 0
+    for ch in cell_ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - ord('A') + 1
+    return index - 1
+
+
+def _shared_strings(z):
+    if not _has_member(z, 'xl/sharedStrings.xml'):
+        return []
+    t_tag, r_tag = f'{{{S_NS}}}t', f'{{{S_NS}}}r'
+    strings = []
+    with z.open('xl/sharedStrings.xml') as part:
+        for item in iter_closed(part, {f'{{{S_NS}}}si'}):
+            # Plain text or rich-text runs; phonetic hints (<rPh>) are not part of the value.
+            texts = [child.text for child in item if child.tag == t_tag]
+            texts += [t.text for run in item if run.tag == r_tag for t in run.iter(t_tag)]
+            strings.append(''.join(text for text in texts if text))
+    return strings
+
+
+def _cell_value(cell, strings):
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{{{S_NS}}}t'))
+    value = cell.find(f'{{{S_NS}}}v')
+    if value is None or value.text is None:
+        return ''
+    if cell_type == 's':
+        index = int(value.text)
+        return strings[index] if index < len(strings) else ''
+    if cell_type == 'b':
+        return 'TRUE' if value.text == '1' else 'FALSE'
+    return value.text
+
+
+@register_extractor('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx')
+def iter_xlsx_text(xlsx_path):
+    """Each worksheet's non-empty rows as ` | `-separated cell values, shared strings resolved."""
+    with zipfile.ZipFile(xlsx_path) as z:
+        strings = _shared_strings(z)
+        rels = _read_rels(z, 'xl/workbook.xml')
+        with z.open('xl/workbook.xml') as part:
+            sheets = [(sheet.get('name'), rels.get(sheet.get(f'{{{R_NS}}}id'), ('', ''))[1])
+                      for sheet in iter_closed(part, {f'{{{S_NS}}}sheet'})]
+        for name, member in sheets:
+            if not _has_member(z, member):
+                continue
+            yield f"--- Sheet {name} ---"
+            with z.open(member) as part:
+                for row in iter_closed(part, {f'{{{S_NS}}}row'}):
+                    values = {}
+                    for position, cell in enumerate(row.iter(f'{{{S_NS}}}c')):
+                        ref = cell.get('r')
+                        values[_column_index(ref) if ref else position] = _cell_value(cell, strings)
+                    if any(values.values()):
+                        yield ' | '.join(values.get(i, '') for i in range(max(values) + 1))
+            yield ""
+
+
+register_extractor('application/pdf', '.pdf')(iter_pdf_text)
+
 
 def extract_text_from_docx(docx_path):
     try:
-        with zipfile.ZipFile(docx_path) as z:
-            xml_content = z.read('word/document.xml')
-        tree = ET.XML(xml_content)
-        text = []
-        for paragraph in tree.iter('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p'):
-            p_text = ''.join(node.text for node in paragraph.iter('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t') if node.text)
-            if p_text:
-                text.append(p_text)
-        return '\n'.join(text)
+        return '\n'.join(iter_docx_text(docx_path))
     except Exception as e:
         return str(e)
 
+
 def extract_text_from_pptx(pptx_path):
     try:
-        text = []
-        with zipfile.ZipFile(pptx_path) as z:
-            slide_files = [f for f in z.namelist() if f.startswith('ppt/slides/slide') and f.endswith('.xml')]
-            # Sort slides by number
-            slide_files.sort(key=lambda x: int(x.replace('ppt/slides/slide', '').replace('.xml', '')))
-            for slide_file in slide_files:
-                text.append(f"--- Slide {slide_file} ---")
-                xml_content = z.read(slide_file)
-                tree = ET.XML(xml_content)
-                for paragraph in tree.iter('{http://schemas.openxmlformats.org/drawingml/2006/main}p'):
-                    p_text = ''.join(node.text for node in paragraph.iter('{http://schemas.openxmlformats.org/drawingml/2006/main}t') if node.text)
-                    if p_text:
-                        text.append(p_text)
-                text.append("")
-        return '\n'.join(text)
+        return '\n'.join(iter_pptx_text(pptx_path))
     except Exception as e:
         return str(e)
 
 
+def _is_glob(pattern):
+    """Return True if the pattern contains shell wildcard characters."""
+    return any(ch in pattern for ch in '*?[')
+
+
+def collect_inputs(inputs):
+    """Expand files, directories and glob patterns into the list of supported files."""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(os.path.join(item, name) for name in os.listdir(item)
+                             if os.path.splitext(name)[1].lower() in EXTRACTORS)
+        elif _is_glob(item):
+            matches = sorted(glob.glob(item, recursive=True))
+        else:
+            matches = [item]
+        if not matches:
+            print(f"No files matched: {item}", file=sys.stderr)
+        files.extend(matches)
+    return list(dict.fromkeys(files))
+
+
+def extract_to_file(input_path, output_path):
+    """Stream the text of one file into `output_path`; returns a result record."""
+    start = time.perf_counter()
+    result = {'input': input_path, 'output': output_path, 'status': 'ok', 'error': None}
+    tmp_path = f'{output_path}.tmp'
+    try:
+        _, extractor = extractor_for(input_path)
+        out_dir = os.path.dirname(output_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for i, line in enumerate(extractor(input_path)):
+                if i:
+                    f.write('\n')
+                f.write(line)
+        os.replace(tmp_path, output_path)
+    except Exception as e:
+        result.update(status='failed', error=f"{type(e).__name__}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def extract_record(input_path):
+    """Extract one file into a JSONL record: `{"path", "mime", "text"}` or `{"path", "error"}`."""
+    try:
+        mime_type, extractor = extractor_for(input_path)
+        return {'path': input_path, 'mime': mime_type, 'text': '\n'.join(extractor(input_path))}
+    except Exception as e:
+        return {'path': input_path, 'error': f"{type(e).__name__}: {e}"}
+
+
+def _txt_output(input_path, output_dir):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f'{stem}.txt')
+
+
+def _map(func, args, jobs):
+    """Run `func` over `args` in input order, on a process pool when there is more than one file."""
+    if jobs <= 1 or len(args[0]) <= 1:
+        yield from map(func, *args)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(func, *args, chunksize=4)
+
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Extract text from DOCX and PPTX files.')
-    parser.add_argument('-i', '--input', type=str, required=True, help='Path to the input DOCX or PPTX file.')
-    parser.add_argument('-o', '--output', type=str, required=True, help='Path to the output text file.')
-    
+    parser = argparse.ArgumentParser(description='Extract text from DOCX, PPTX, XLSX and PDF files.')
+    parser.add_argument('-i', '--input', nargs='+', required=True, help='Files, directories or glob patterns.')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Output text file when -i names one file (unless -o is an existing directory or ends '
+                             'with a path separator); otherwise a directory for one .txt per input.')
+    parser.add_argument('--jsonl', type=str, help='Write one JSON record per input to this file instead of .txt files.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes.')
+
     args = parser.parse_args()
-    
-    input_lower = args.input.lower()
-    
-    with open(args.output, 'w', encoding='utf-8') as f:
-        if input_lower.endswith('.docx'):
-            f.write(extract_text_from_docx(args.input))
-            print(f"Extracted DOCX text to {args.output}")
-        elif input_lower.endswith('.pptx'):
-            f.write(extract_text_from_pptx(args.input))
-            print(f"Extracted PPTX text to {args.output}")
-        else:
-            print("Unsupported file format. Please provide a .docx or .pptx file.")
+    if not args.output and not args.jsonl:
+        parser.error('provide --output or --jsonl')
+
+    files = collect_inputs(args.input)
+    if not files:
+        print("No supported files found. Nothing to do.")
+        sys.exit(1)
+
+    failed = 0
+    if args.jsonl:
+        with open(args.jsonl, 'w', encoding='utf-8') as f:
+            for record in _map(extract_record, (files,), args.jobs):
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                if 'error' in record:
+                    failed += 1
+                    print(f"Failed {record['path']}: {record['error']}")
+        print(f"Extracted {len(files) - failed}/{len(files)} files to {args.jsonl}")
+    else:
+        # One named file writes to `-o` as given, whatever its extension, as before folders were supported.
+        single = len(args.input) == 1 and os.path.isfile(args.input[0]) and not os.path.isdir(args.output) \
+            and not args.output.endswith((os.sep, '/'))
+        outputs = [args.output] if single else [_txt_output(path, args.output) for path in files]
+        duplicates = [out for out, count in Counter(outputs).items() if count > 1]
+        if duplicates:
+            parser.error(f"several inputs map to the same output: {', '.join(sorted(duplicates))}")
+        for result in _map(extract_to_file, (files, outputs), args.jobs):
+            if result['status'] == 'ok':
+                print(f"Extracted {result['input']} to {result['output']} ({result['seconds']:.2f}s)")
+            else:
+                failed += 1
+                print(f"Failed {result['input']}: {result['error']}")
 
+    sys.exit(1 if failed else 0)
@@ -1,34 +1,71 @@
+import hashlib
+import io
+import itertools
 import logging
 import sys
 import os
+import tempfile
 import traceback
-from docx import Document
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-
-import yaml
-import re
+from collections import namedtuple
+
+import json
 import argparse
+import time
+
+# Only lightweight modules are imported here. python-docx, lxml, yaml, Pillow and the
+# PDF engines are imported by the functions that need them, so `--help`, argument
+# errors and build-cache hits start quickly, and so do batch and service workers.
+from markdown_ast import Paper, check_within, find_referenced_images, iter_blocks, iter_referenced_images
+from citations import CitationError, CitationIndex, find_bibliography_files
+from ieee_style import LAYOUT_CONSTANTS, TEXT_WIDTH
+from image_prep import CallbackImageSource, FileImageSource, IMAGE_SETTINGS, prepare_images
+from telemetry import DEFAULT_TRACE_FILE, NULL_PROFILER
+from build_cache import BlockCache, BuildCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
 
 # --- Default Configuration Constants ---
 DEFAULT_INPUT_FILE = 'data/input/input.md'
 DEFAULT_OUTPUT_FILE = 'data/output/output.docx'
 LOG_FILE = 'logs/generate_ieee_format.log'
+BACKENDS = ('python-docx', 'stream')
+# 'office' converts the saved DOCX with Word/LibreOffice; 'weasyprint' renders HTML/CSS in-process.
+PDF_ENGINES = ('office', 'weasyprint')
+
+RenderedPaper = namedtuple('RenderedPaper', ['docx', 'pdf'])
+
+# Bump whenever a change alters the generated DOCX/PDF so cached builds are invalidated.
+GENERATOR_VERSION = '1.6.0'
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
+# Names that moved to `docx_render` (the python-docx backend), still importable from here.
+DOCX_RENDER_NAMES = (
+    'add_abstract_and_index_terms', 'add_authors', 'add_styled_paragraph', 'add_styled_run', 'add_title',
+    'apply_page_geometry', 'parse_markdown_content', 'process_table', 'register_ieee_styles', 'render_blocks',
+    'render_paper', 'set_single_column_layout', 'set_two_column_layout', 'setup_page_margins',
 )
+
 logger = logging.getLogger(__name__)
 
 
+def __getattr__(name):
+    """Load the python-docx renderer on first access to one of its names."""
+    if name in DOCX_RENDER_NAMES:
+        import docx_render
+        return getattr(docx_render, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def setup_logging(log_file=LOG_FILE, stream=None):
+    """Log to `log_file` and `stream` (stdout by default). Called by the entry points, never at import time."""
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler(stream or sys.stdout)
+        ]
+    )
+
+
 def read_markdown_file(filepath):
     """Read the markdown file with proper error handling."""
     try:
@@ -44,420 +81,176 @@ def read_markdown_file(filepath):
         sys.exit(1)
 
 
-def parse_frontmatter(content):
-    """Extract YAML frontmatter from the markdown content."""
+def load_frontmatter_yaml(text):
+    """Parse the YAML between the `---` lines; None if it is invalid (the error is logged)."""
+    import yaml
     try:
-        match = re.match(r'^---\n(.*?)\n---\n(.*)', content, re.DOTALL | re.MULTILINE)
-        if match:
-            frontmatter = yaml.safe_load(match.group(1))
-            body_content = match.group(2).strip()
-            logger.info("Successfully parsed YAML frontmatter metadata.")
-            return frontmatter, body_content
-        else:
-            logger.warning("No YAML frontmatter found. Using default placeholder values.")
-            return {}, content
+        frontmatter = yaml.safe_load(text)
     except yaml.YAMLError as exc:
         logger.error(f"Error parsing YAML frontmatter: {exc}")
-        return {}, content
+        return None
     except Exception as e:
         logger.error(f"Unexpected error parsing metadata: {str(e)}")
-        return {}, content
-
-
-def setup_page_margins(doc):
-    """Set the margins for the main document."""
-    section = doc.sections[0]
-    section.page_height = Inches(11)
-    section.page_width = Inches(8.5)
-    section.top_margin = Inches(0.75)
-    section.bottom_margin = Inches(1.0)
-    section.left_margin = Inches(0.625)
-    section.right_margin = Inches(0.625)
-
-
-def add_title(doc, frontmatter):
-    """Add the main paper title."""
-    title_text = frontmatter.get('title', 'Unknown Title')
-    title = doc.add_paragraph()
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    run = title.add_run(title_text)
-    run.font.size = Pt(24)
-    run.font.bold = True
-    run.font.name = 'Times New Roman'
-    title.paragraph_format.space_after = Pt(18)
-
-
-def add_authors(doc, frontmatter):
-    """Add author dynamically depending on YAML frontmatter."""
-    authors = frontmatter.get('authors', [])
-    num_authors = len(authors) if authors else 1
-    author_table = doc.add_table(rows=1, cols=max(1, num_authors))
-    author_table.autofit = False
-    author_table.allow_autofit = False
-
-    # Remove borders
-    for row in author_table.rows:
-        for cell in row.cells:
-            tcPr = cell._element.get_or_add_tcPr()
-            tcBorders = OxmlElement('w:tcBorders')
-            for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
-                border = OxmlElement(f'w:{border_name}')
-                border.set(qn('w:val'), 'none')
-                tcBorders.append(border)
-            tcPr.append(tcBorders)
-
-    for idx, author in enumerate(authors):
-        if idx >= len(author_table.rows[0].cells):
-            break
-        cell = author_table.rows[0].cells[idx]
-        cell.width = Inches(7.25 / num_authors)
-        
-        p1 = cell.paragraphs[0]
-        p1.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        run = p1.add_run(author.get('name', ''))
-        run.font.size = Pt(10)
-        run.font.name = 'Times New Roman'
-        p1.paragraph_format.space_after = Pt(3)
-        
-        if 'role' in author:
-            p_role = cell.add_paragraph()
-            p_role.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = p_role.add_run(author['role'])
-            run.font.size = Pt(9)
-            run.font.name = 'Times New Roman'
-            p_role.paragraph_format.space_after = Pt(3)
-            
-        if 'department' in author:
-            p_dept = cell.add_paragraph()
-            p_dept.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = p_dept.add_run(author['department'])
-            run.font.size = Pt(9)
-            run.font.name = 'Times New Roman'
-            p_dept.paragraph_format.space_after = Pt(3)
-            
-        if 'organization' in author:
-            p_org = cell.add_paragraph()
-            p_org.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = p_org.add_run(author['organization'])
-            run.font.size = Pt(9)
-            run.font.name = 'Times New Roman'
-            p_org.paragraph_format.space_after = Pt(3)
-            
-        if 'email' in author:
-            p_email = cell.add_paragraph()
-            p_email.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = p_email.add_run(author['email'])
-            run.font.size = Pt(9)
-            run.font.name = 'Times New Roman'
-            p_email.paragraph_format.space_after = Pt(0)
-
-    # Add spacing after author table
-    spacer = doc.add_paragraph()
-    spacer.paragraph_format.space_after = Pt(12)
-
-
-def set_two_column_layout(doc):
-    """Set layout to double columns for main text content."""
-    new_section = doc.add_section()
-    new_section.start_type = 0  # Continuous section break
-    new_section.page_height = Inches(11)
-    new_section.page_width = Inches(8.5)
-    new_section.top_margin = Inches(0.75)
-    new_section.bottom_margin = Inches(1.0)
-    new_section.left_margin = Inches(0.625)
-    new_section.right_margin = Inches(0.625)
-
-    sectPr = new_section._sectPr
-    cols = sectPr.xpath('./w:cols')[0] if sectPr.xpath('./w:cols') else OxmlElement('w:cols')
-    cols.set(qn('w:num'), '2')
-    cols.set(qn('w:space'), '360')
-    if not sectPr.xpath('./w:cols'):
-        sectPr.append(cols)
-    return new_section
-
-
-def set_single_column_layout(doc):
-    """Set layout to a single column (primarily for large images)."""
-    new_section = doc.add_section()
-    new_section.start_type = 0  # Continuous section break
-    new_section.page_height = Inches(11)
-    new_section.page_width = Inches(8.5)
-    new_section.top_margin = Inches(0.75)
-    new_section.bottom_margin = Inches(1.0)
-    new_section.left_margin = Inches(0.625)
-    new_section.right_margin = Inches(0.625)
-    
-    sectPr = new_section._sectPr
-    cols = sectPr.xpath('./w:cols')[0] if sectPr.xpath('./w:cols') else OxmlElement('w:cols')
-    cols.set(qn('w:num'), '1')
-    if not sectPr.xpath('./w:cols'):
-        sectPr.append(cols)
-    return new_section
-
-
-def add_abstract_and_index_terms(doc, frontmatter):
-    """Add the abstract and index terms block."""
-    abstract_text = frontmatter.get('abstract', '')
-    if abstract_text:
-        abstract_para = doc.add_paragraph()
-        run_bold = abstract_para.add_run('Abstract')
-        run_bold.font.size = Pt(9)
-        run_bold.font.bold = True
-        run_bold.font.italic = True
-        run_bold.font.name = 'Times New Roman'
-        run_emdash = abstract_para.add_run('—')
-        run_emdash.font.size = Pt(9)
-        run_emdash.font.bold = True
-        run_emdash.font.italic = True
-        run_emdash.font.name = 'Times New Roman'
-        run_text = abstract_para.add_run(abstract_text)
-        run_text.font.size = Pt(9)
-        run_text.font.bold = True
-        run_text.font.name = 'Times New Roman'
-        abstract_para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        abstract_para.paragraph_format.space_after = Pt(9)
-
-    index_terms_text = frontmatter.get('index_terms', '')
-    if index_terms_text:
-        index_para = doc.add_paragraph()
-        run_bold = index_para.add_run('Index Terms')
-        run_bold.font.size = Pt(9)
-        run_bold.font.bold = True
-        run_bold.font.italic = True
-        run_bold.font.name = 'Times New Roman'
-        run_emdash = index_para.add_run('—')
-        run_emdash.font.size = Pt(9)
-        run_emdash.font.bold = True
-        run_emdash.font.italic = True
-        run_emdash.font.name = 'Times New Roman'
-        run_text = index_para.add_run(index_terms_text)
-        run_text.font.size = Pt(9)
-        run_text.font.name = 'Times New Roman'
-        index_para.paragraph_format.space_after = Pt(12)
-
-
-def process_table(doc, current_table):
-    """Process a markdown table and append it correctly to the Word doc."""
-    if len(current_table) > 0:
-        rows = []
-        for table_line in current_table:
-            cells = [cell.strip() for cell in table_line.split('|') if cell.strip()]
-            if cells:
-                rows.append(cells)
-        
-        if len(rows) > 0:
-            max_cols = max(len(row) for row in rows)
-            table = doc.add_table(rows=len(rows), cols=max_cols)
-            table.style = 'Light Grid Accent 1'
-            
-            for i, row_data in enumerate(rows):
-                row = table.rows[i]
-                for j in range(min(len(row_data), max_cols)):
-                    cell = row.cells[j]
-                    cell.text = row_data[j].replace('**', '')
-                    for paragraph in cell.paragraphs:
-                        for run in paragraph.runs:
-                            run.font.size = Pt(8)
-                            run.font.name = 'Times New Roman'
-                            if i == 0:
-                                run.font.bold = True
-                        if j == 0:
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                        else:
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-            p = doc.add_paragraph()
-            p.paragraph_format.space_after = Pt(6)
+        return None
+    logger.info("Successfully parsed YAML frontmatter metadata.")
+    return frontmatter or {}
 
 
-def parse_markdown_content(doc, content, input_file):
-    """Line by line parser to handle the body of the markdown."""
-    lines = content.split('\n')
-    skip_header = True
-    in_code_block = False
-    current_table = []
-    in_table = False
+def parse_frontmatter(content):
+    """Extract YAML frontmatter from the markdown content."""
+    if content.startswith('---\n'):
+        end = content.find('\n---\n', 4)
+        if end != -1:
+            frontmatter = load_frontmatter_yaml(content[4:end])
+            return (frontmatter, content[end + 5:].strip()) if frontmatter is not None else ({}, content)
+    logger.warning("No YAML frontmatter found. Using default placeholder values.")
+    return {}, content
 
-    for line in lines:
-        line_stripped = line.strip()
-        
-        # Skip until Introduction
-        if 'I. INTRODUCTION' in line_stripped:
-            skip_header = False
-        if skip_header:
-            continue
-        
-        # Main section headings
-        if line_stripped.startswith('## I.') or line_stripped.startswith('## II.') or line_stripped.startswith('## III.') or line_stripped.startswith('## IV.') or line_stripped.startswith('## V.'):
-            p = doc.add_paragraph()
-            run = p.add_run(line_stripped.replace('##', '').strip())
-            run.font.size = Pt(10)
-            run.font.bold = True
-            run.font.name = 'Times New Roman'
-            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            p.paragraph_format.space_before = Pt(9)
-            p.paragraph_format.space_after = Pt(6)
-        
-        # Subsection headings
-        elif line_stripped.startswith('### '):
-            p = doc.add_paragraph()
-            run = p.add_run(line_stripped.replace('###', '').strip())
-            run.font.size = Pt(9)
-            run.font.bold = True
-            run.font.italic = True
-            run.font.name = 'Times New Roman'
-            p.paragraph_format.space_before = Pt(6)
-            p.paragraph_format.space_after = Pt(3)
-
-        # Images
-        elif line_stripped.startswith('![') and '](' in line_stripped and line_stripped.endswith(')'):
-            match = re.search(r'!\[(.*?)\]\((.*?)\)', line_stripped)
-            if match:
-                img_path = match.group(2)
-                
-                # Resolve img_path relative to the markdown file directory
-                md_dir = os.path.dirname(input_file)
-                if md_dir:
-                    img_path = os.path.join(md_dir, img_path)
-                
-                # Single column for large images
-                set_single_column_layout(doc)
-                
-                p = doc.add_paragraph()
-                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                p.paragraph_format.space_before = Pt(12)
-                p.paragraph_format.space_after = Pt(6)
-                
-                if os.path.exists(img_path):
-                    r = p.add_run()
-                    try:
-                        r.add_picture(img_path, width=Inches(7.25))
-                        logger.info(f"Successfully inserted image: {img_path}")
-                    except Exception as e:
-                        logger.error(f"Failed to insert image {img_path}: {str(e)}")
-                        p.add_run(f'[Error loading image: {img_path}]')
-                else:
-                    logger.warning(f"Image file not found: {img_path}")
-                    p.add_run(f'[Image missing: {img_path}]')
-
-        # Captions
-        elif (line_stripped.startswith('*Fig. ') and line_stripped.endswith('*')) or (line_stripped.startswith('_Fig. ') and line_stripped.endswith('_')):
-            caption_text = line_stripped.strip('*_')
-            caption = doc.add_paragraph()
-            run = caption.add_run(caption_text)
-            run.font.size = Pt(8)
-            run.font.bold = True
-            run.font.name = 'Times New Roman'
-            caption.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            caption.paragraph_format.space_after = Pt(12)
-            
-            # Resume two-column layout after caption
-            set_two_column_layout(doc)
-        
-        # Code blocks
-        elif line_stripped.startswith('```'):
-            in_code_block = not in_code_block
-            continue
-        
-        elif in_code_block:
-            if line_stripped.startswith('CCS ='):
-                p = doc.add_paragraph()
-                run = p.add_run(line_stripped)
-                run.font.size = Pt(9)
-                run.font.italic = True
-                run.font.name = 'Times New Roman'
-                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                p.paragraph_format.space_before = Pt(6)
-                p.paragraph_format.space_after = Pt(6)
-            continue
-        
-        # Table detection
-        elif line_stripped.startswith('|'):
-            if all(c in '|-: ' for c in line_stripped):
-                continue
-            if not in_table:
-                in_table = True
-                current_table = []
-            current_table.append(line_stripped)
-        
-        elif in_table and not line_stripped.startswith('|'):
-            process_table(doc, current_table)
-            in_table = False
-            current_table = []
-        
-        # Acknowledgment section
-        elif line_stripped.startswith('## ACKNOWLEDGMENT'):
-            p = doc.add_paragraph()
-            run = p.add_run('ACKNOWLEDGMENT')
-            run.font.size = Pt(10)
-            run.font.bold = True
-            run.font.name = 'Times New Roman'
-            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            p.paragraph_format.space_before = Pt(9)
-            p.paragraph_format.space_after = Pt(6)
-        
-        # References
-        elif line_stripped.startswith('[') and ']' in line_stripped:
-            if line_stripped.startswith('[1]'):
-                ref_heading = doc.add_paragraph()
-                run = ref_heading.add_run('REFERENCES')
-                run.font.size = Pt(10)
-                run.font.bold = True
-                run.font.name = 'Times New Roman'
-                ref_heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                ref_heading.paragraph_format.space_before = Pt(9)
-                ref_heading.paragraph_format.space_after = Pt(6)
-            
-            p = doc.add_paragraph()
-            run = p.add_run(line_stripped)
-            run.font.size = Pt(8)
-            run.font.name = 'Times New Roman'
-            p.paragraph_format.space_after = Pt(3)
-            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        
-        # Bullet points
-        elif line_stripped.startswith('- ') or line_stripped.startswith('1. ') or line_stripped.startswith('2. ') or line_stripped.startswith('3. ') or line_stripped.startswith('4. ') or line_stripped.startswith('5. ') or line_stripped.startswith('6. '):
-            p = doc.add_paragraph()
-            run = p.add_run(line_stripped.replace('**', ''))
-            run.font.size = Pt(9)
-            run.font.name = 'Times New Roman'
-            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-            p.paragraph_format.space_after = Pt(6)
-            p.paragraph_format.left_indent = Inches(0.25)
-        
-        # Regular paragraphs
-        elif len(line_stripped) > 0 and not line_stripped.startswith('#') and not line_stripped.startswith('---') and not line_stripped.startswith('**Author'):
-            cleaned_line = line_stripped.replace('**', '')
-            p = doc.add_paragraph()
-            run = p.add_run(cleaned_line)
-            run.font.size = Pt(9)
-            run.font.name = 'Times New Roman'
-            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-            p.paragraph_format.space_after = Pt(6)
-            p.paragraph_format.line_spacing = 1.0
-
-    if in_table and current_table:
-        process_table(doc, current_table)
-
-
-def save_and_convert(doc, output_file):
-    """Save DOCX and convert it to PDF."""
+
+def open_markdown_lines(filepath):
+    """Open a markdown file for streaming and return an iterator over its lines.
+
+    Exits like `read_markdown_file` if the file cannot be opened. Lines keep their
+    newline; the file is closed once the iterator is exhausted or discarded.
+    """
     try:
-        doc.save(output_file)
+        f = open(filepath, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        logger.error(f"Error: {filepath} not found. Please ensure the file exists in the current directory.")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Unexpected error reading markdown file: {str(e)}")
+        sys.exit(1)
+    logger.info(f"Streaming {filepath}")
+    return _iter_file_lines(f)
+
+
+def _iter_file_lines(f):
+    with f:
+        yield from f
+
+
+def read_frontmatter(lines):
+    """Split a stream of markdown lines into `(frontmatter, body_lines)`.
+
+    Only the lines up to the closing `---` are consumed here. The body is the rest of the
+    same iterator, so it can be tokenized while the file is still being read.
+    """
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is not None and first.rstrip('\n') == '---':
+        block = []
+        for line in lines:
+            if line.rstrip('\n') == '---':
+                frontmatter = load_frontmatter_yaml(''.join(block))
+                if frontmatter is not None:
+                    return frontmatter, lines
+                return {}, itertools.chain([first], block, [line], lines)
+            block.append(line)
+        lines = iter(block)
+        first_lines = [first]
+    else:
+        first_lines = [first] if first is not None else []
+    logger.warning("No YAML frontmatter found. Using default placeholder values.")
+    return {}, itertools.chain(first_lines, lines)
+
+
+def scan_markdown_file(input_file):
+    """Stream a markdown file once for its build inputs, without holding its text.
+
+    Returns `(digest, images, bibliographies)`: the SHA-256 of the text and the resolved
+    paths of the images and `.bib` files it references.
+    """
+    digest = hashlib.sha256()
+    head = []
+
+    def hashed_lines():
+        in_head = None
+        for line in open_markdown_lines(input_file):
+            digest.update(line.encode('utf-8'))
+            if in_head is not False:
+                is_fence = line.rstrip('\n') == '---'
+                if in_head is None:
+                    in_head = is_fence
+                elif is_fence:
+                    in_head = False
+                    head.append(line)
+                if in_head:
+                    head.append(line)
+            yield line
+
+    images = list(iter_referenced_images(hashed_lines(), input_file))
+    return digest.hexdigest(), images, find_bibliography_files(''.join(head), input_file)
+
+
+def open_paper(input_file, report=True, root=None):
+    """Stream a paper from disk: the frontmatter is parsed up front, the body tokenized lazily as it is read.
+
+    With `root`, `.bib` files outside that directory are rejected (see `paper_blocks`).
+    """
+    frontmatter, body_lines = read_frontmatter(open_markdown_lines(input_file))
+    return Paper(frontmatter, paper_blocks(frontmatter, body_lines, input_file, report, root))
+
+
+def load_paper(input_file, root=None):
+    """Parse a paper file into a `Paper` with a block list, without reading the whole text into memory first."""
+    paper = open_paper(input_file, root=root)
+    return Paper(paper.frontmatter, list(paper.blocks))
+
+
+def pdf_path_for(output_file):
+    """Path of the PDF produced alongside a DOCX output."""
+    return os.path.splitext(output_file)[0] + '.pdf'
+
+
+def paper_blocks(frontmatter, body_content, input_file=None, report=True, root=None):
+    """Lazily tokenize the body (text or an iterable of lines), resolving citations against its references and `.bib` files.
+
+    Bibliography paths are relative to `input_file` (the working directory without one);
+    with `root`, one outside that directory raises ValueError. With `report`, missing and
+    unused references are logged once the blocks are consumed.
+    """
+    return CitationIndex.for_paper(frontmatter, input_file, root).resolve(iter_blocks(body_content), report)
+
+
+def parse_paper(content, input_file=None):
+    """Parse a whole markdown paper (frontmatter + body) once, ready to be rendered any number of times."""
+    frontmatter, body_content = parse_frontmatter(content)
+    return Paper(frontmatter, list(paper_blocks(frontmatter, body_content, input_file)))
+
+
+def save_and_convert(doc, output_file, convert_pdf=True, pdf_pool=None, profiler=NULL_PROFILER):
+    """Save DOCX and convert it to PDF.
+
+    `pdf_pool` is an optional started `soffice_pool.SofficePool` used instead of
+    spawning LibreOffice for this document; `convert_pdf=False` stops after the DOCX.
+    """
+    try:
+        with profiler.stage('save'):
+            doc.save(output_file)
         logger.info(f"IEEE Paper generated successfully in two-column format: {output_file}")
+    except CitationError:
+        # The streaming backend parses while it saves; this is an input error, reported by the caller.
+        raise
     except Exception as e:
         logger.error(f"Failed to save DOCX file {output_file}: {str(e)}\n{traceback.format_exc()}")
         sys.exit(1)
 
+    if convert_pdf:
+        with profiler.stage('pdf'):
+            convert_to_pdf(output_file, pdf_pool=pdf_pool)
+
+
+def convert_to_pdf(output_file, pdf_pool=None):
+    """Convert a saved DOCX to PDF using Word, the LibreOffice pool or a soffice spawn."""
     try:
         logger.info("Attempting to convert DOCX to PDF using Word (docx2pdf)...")
         from docx2pdf import convert
-        import os
-        import subprocess
         import shutil
+        from soffice_pool import convert_with_soffice
         
         abs_in = os.path.abspath(output_file)
-        abs_out = os.path.abspath(output_file.replace('.docx', '.pdf'))
+        abs_out = os.path.abspath(pdf_path_for(output_file))
         
         # docx2pdf requires Word to be installed and not sandboxed
         try:
@@ -467,15 +260,21 @@ def save_and_convert(doc, output_file):
         except Exception as e:
             logger.warning(f"Word docx2pdf conversion failed. Falling back to alternative methods. Reason: {e}")
             
-        # Fallback 1: LibreOffice Headless
+        # Fallback 1: warm LibreOffice pool shared across documents
+        if pdf_pool is not None:
+            logger.info("Attempting fallback conversion using the LibreOffice pool...")
+            result = pdf_pool.convert(abs_in, abs_out)
+            logger.info(f"IEEE Paper generated successfully in PDF format using LibreOffice ({result.backend}, {result.seconds:.2f}s): {abs_out}")
+            return
+
+        # Fallback 2: LibreOffice Headless
         if shutil.which("soffice"):
             logger.info("Attempting fallback conversion using LibreOffice...")
-            out_dir = os.path.dirname(abs_out)
-            subprocess.run(['soffice', '--headless', '--convert-to', 'pdf', '--outdir', out_dir, abs_in], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            convert_with_soffice(abs_in, abs_out)
             logger.info(f"IEEE Paper generated successfully in PDF format using LibreOffice: {abs_out}")
             return
             
-        # Fallback 2: Mac native textutil/cupsfilter routing (less layout perfect but works natively)
+        # Fallback 3: Mac native textutil/cupsfilter routing (less layout perfect but works natively)
         logger.warning("No LibreOffice found. PDF must be manually generated from the provided DOCX.")
         logger.warning(f"Please open '{abs_in}' in Pages or Word and manually Export as PDF.")
         
@@ -485,31 +284,366 @@ def save_and_convert(doc, output_file):
         logger.error(f"Failed to automatically convert DOCX to PDF: {str(e)}")
 
 
-def generate_paper(input_file, output_file):
-    """Main execution function to put it all together."""
-    content = read_markdown_file(input_file)
-    frontmatter, body_content = parse_frontmatter(content)
-    
-    doc = Document()
-    setup_page_margins(doc)
-    add_title(doc, frontmatter)
-    add_authors(doc, frontmatter)
-    
-    set_two_column_layout(doc)
-    add_abstract_and_index_terms(doc, frontmatter)
-    
-    # We now also pass `input_file` to `parse_markdown_content` so it can resolve images
-    parse_markdown_content(doc, body_content, input_file)
-    
-    save_and_convert(doc, output_file)
-
+def convert_with_weasyprint(paper, image_source, output_file, pdf_pool=None):
+    """Render the PDF in-process from the parsed paper, falling back to `convert_to_pdf`."""
+    pdf_file = pdf_path_for(output_file)
+    try:
+        import html_pdf
+        html_pdf.render_pdf(paper, image_source, pdf_file)
+        logger.info(f"IEEE Paper generated successfully in PDF format using weasyprint: {pdf_file}")
+    except (ImportError, OSError) as e:
+        logger.warning(f"weasyprint is unavailable, falling back to the office converters. Reason: {e}")
+        convert_to_pdf(output_file, pdf_pool=pdf_pool)
+    except Exception as e:
+        logger.error(f"Failed to render PDF with weasyprint: {str(e)}\n{traceback.format_exc()}")
+
+
+def docx_to_pdf_bytes(docx_bytes, pdf_pool=None):
+    """Convert DOCX bytes to PDF bytes.
+
+    The external converters only work on files, so this is the one step that goes
+    through a temporary directory. Raises RuntimeError if no converter produced a PDF.
+    """
+    with tempfile.TemporaryDirectory(prefix='ieee-pdf-') as tmp_dir:
+        docx_file = os.path.join(tmp_dir, 'paper.docx')
+        with open(docx_file, 'wb') as f:
+            f.write(docx_bytes)
+        convert_to_pdf(docx_file, pdf_pool=pdf_pool)
+        pdf_file = pdf_path_for(docx_file)
+        if not os.path.exists(pdf_file):
+            raise RuntimeError("PDF conversion failed: no converter produced a PDF (see the log)")
+        with open(pdf_file, 'rb') as f:
+            return f.read()
+
+
+def render_to_bytes(markdown, resolve_image=None, convert_pdf=False, pdf_pool=None, backend='python-docx',
+                    pdf_engine='office', template=None):
+    """Render a Markdown paper in memory and return `RenderedPaper(docx, pdf)` as bytes.
+
+    `markdown` is the paper as text or UTF-8 bytes. Figures are fetched with
+    `resolve_image(path)`, called with the path written in the Markdown, which returns
+    the image bytes or None if it is missing. Nothing is written to disk except the
+    temporary DOCX the office converters need when `convert_pdf` is set; `pdf` is None otherwise.
+    `template` is an optional `.docx`/`.dotx` path the DOCX is based on. Raises
+    ValueError for a `backend` or `pdf_engine` outside `BACKENDS`/`PDF_ENGINES`.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    if pdf_engine not in PDF_ENGINES:
+        raise ValueError(f"pdf_engine must be one of {', '.join(PDF_ENGINES)}, not {pdf_engine!r}")
+    if isinstance(markdown, bytes):
+        markdown = markdown.decode('utf-8')
+    image_source = CallbackImageSource(resolve_image)
+    frontmatter, body_content = parse_frontmatter(markdown)
+    use_weasyprint = convert_pdf and pdf_engine == 'weasyprint'
+    blocks = paper_blocks(frontmatter, body_content)
+    # The stream backend consumes the blocks lazily; keep them only when weasyprint needs them again.
+    paper = Paper(frontmatter, blocks if backend == 'stream' and not use_weasyprint else list(blocks))
+    if backend == 'stream':
+        from docx_stream import StreamedDocument
+        doc = StreamedDocument(paper, image_source, template=template)
+    else:
+        from docx_render import render_paper
+        doc = render_paper(paper, image_source=image_source, template=template)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    docx_bytes = buffer.getvalue()
+    pdf_bytes = None
+    if use_weasyprint:
+        try:
+            import html_pdf
+            pdf_bytes = html_pdf.render_pdf(paper, image_source)
+        except (ImportError, OSError) as e:
+            logger.warning(f"weasyprint is unavailable, falling back to the office converters. Reason: {e}")
+    if convert_pdf and pdf_bytes is None:
+        pdf_bytes = docx_to_pdf_bytes(docx_bytes, pdf_pool)
+    return RenderedPaper(docx_bytes, pdf_bytes)
+
+
+def build_cache_salt(backend='python-docx', pdf_engine='office'):
+    """Everything besides the inputs that changes the rendered output."""
+    return json.dumps({'version': GENERATOR_VERSION, 'layout': LAYOUT_CONSTANTS, 'images': IMAGE_SETTINGS,
+                       'backend': backend, 'pdf_engine': pdf_engine}, sort_keys=True)
+
+
+def paper_cache_key(cache, content, input_file, backend='python-docx', pdf_engine='office', template=None):
+    """Build-cache key for a markdown source, the images and `.bib` files it references and the DOCX template."""
+    inputs = find_referenced_images(content, input_file) + find_bibliography_files(content, input_file)
+    inputs += [template] if template else []
+    return cache.key_for(content, inputs, build_cache_salt(backend, pdf_engine))
+
+
+def paper_file_cache_key(cache, input_file, backend='python-docx', pdf_engine='office', template=None):
+    """`paper_cache_key` for a markdown file, streamed instead of read whole."""
+    digest, images, bibliographies = scan_markdown_file(input_file)
+    inputs = images + bibliographies + ([template] if template else [])
+    return cache.key_for_digest(digest, inputs, build_cache_salt(backend, pdf_engine))
+
+
+def restore_from_cache(cache, cache_key, output_file, convert_pdf, pdf_pool, max_pages=None, input_file=None):
+    """Serve a paper from the build cache. Returns `(restored, estimate)`; `restored` is False on a miss.
+
+    With `max_pages`, the page estimate stored with the entry (made now if the entry has
+    none) is checked against the budget, and an over-budget paper gets no PDF.
+    """
+    pdf_file = pdf_path_for(output_file)
+    if not cache.restore(cache_key, {'docx': output_file, 'pdf': pdf_file}):
+        return False, None
+    logger.info(f"Build cache hit for {output_file} (hits={cache.hits}, misses={cache.misses})")
+    estimate = None
+    if max_pages is not None:
+        estimate = cache.load_json(cache_key, 'estimate')
+        if estimate is None:
+            from page_estimate import estimate_paper
+            estimate = estimate_paper(open_paper(input_file, report=False), FileImageSource(input_file))
+            cache.store_json(cache_key, 'estimate', estimate)
+        apply_page_budget(estimate, max_pages, input_file)
+        if estimate['over_budget']:
+            convert_pdf = False
+            if os.path.exists(pdf_file):
+                os.unlink(pdf_file)
+    if convert_pdf and not os.path.exists(pdf_file):
+        # The cached build predates a working PDF converter; convert the restored DOCX only.
+        convert_to_pdf(output_file, pdf_pool=pdf_pool)
+        cache.store(cache_key, {'pdf': pdf_file})
+    return True, estimate
+
+
+def apply_page_budget(estimate, max_pages, input_file):
+    """Log a page estimate against `max_pages` and add its `over_budget` flag."""
+    from page_estimate import log_estimate
+    log_estimate(estimate, max_pages)
+    # A started page is a printed page, so 7.2 estimated pages do not fit a 7 page budget.
+    estimate['over_budget'] = estimate['page_count'] > max_pages
+    if estimate['over_budget']:
+        logger.warning(f"{input_file} is estimated at {estimate['pages']:.2f} pages ({estimate['page_count']} printed), "
+                       f"over the {max_pages} page budget; skipping PDF conversion.")
+    return estimate
+
+
+def check_page_budget(paper, image_source, max_pages, input_file):
+    """Estimate the printed length of a parsed paper and log it against `max_pages`.
+
+    Returns the estimate (see `page_estimate.PageEstimator.estimate`) with an added
+    `over_budget` flag.
+    """
+    from page_estimate import estimate_paper
+    return apply_page_budget(estimate_paper(paper, image_source), max_pages, input_file)
+
+
+def generate_paper(input_file, output_file, convert_pdf=True, pdf_pool=None, cache=None, backend='python-docx',
+                   profiler=NULL_PROFILER, pdf_engine='office', max_pages=None, template=None, root=None,
+                   block_cache=None):
+    """Main execution function to put it all together.
+
+    `cache` is an optional `build_cache.BuildCache`; unchanged inputs are then served
+    from the stored DOCX/PDF instead of being rebuilt. `backend='stream'` writes the
+    DOCX with `docx_stream` instead of building a python-docx object tree. `profiler`
+    is an optional `telemetry.Profiler` that records each stage and block type.
+    `pdf_engine='weasyprint'` renders the PDF in-process instead of converting the DOCX.
+    With `max_pages`, the page count is estimated from font metrics first and the PDF is
+    only produced if the estimate fits; the estimate is returned (None otherwise) and
+    stored with the cache entry, so cache hits are held to the budget too. `template` is
+    an optional `.docx`/`.dotx` the DOCX is based on; its styles and page setup are loaded
+    once per process and reused for every paper. With `root`, every image and `.bib` file
+    the paper references must lie inside that directory, or ValueError is raised before
+    anything is read; services rendering untrusted Markdown set it to the job directory.
+    `block_cache` is an optional `build_cache.BlockCache` that watch mode keeps between
+    rebuilds, so only blocks that changed since the last build are rendered again.
+
+    The markdown is never held in memory whole: one streaming pass hashes it and lists
+    its images, and the parser then reads the body line by line as it renders.
+    """
+    with profiler.stage('read'):
+        digest, images, bibliographies = scan_markdown_file(input_file)
+    if root is not None:
+        for path in images + bibliographies:
+            check_within(path, root)
+
+    cache_key = None
+    if cache is not None:
+        with profiler.stage('cache_lookup'):
+            inputs = images + bibliographies + ([template] if template else [])
+            cache_key = cache.key_for_digest(digest, inputs, build_cache_salt(backend, pdf_engine))
+            restored, estimate = restore_from_cache(cache, cache_key, output_file, convert_pdf, pdf_pool, max_pages,
+                                                    input_file)
+        if restored:
+            return estimate
+        logger.info(f"Build cache miss for {output_file} (hits={cache.hits}, misses={cache.misses})")
+        cache.release(output_file, pdf_path_for(output_file))
+
+    # Downsample/recompress every figure up front, in parallel; rendering then reuses the results.
+    with profiler.stage('images'):
+        prepare_images(images, TEXT_WIDTH)
+
+    image_source = FileImageSource(input_file, root)
+    estimate = None
+    try:
+        if backend == 'stream':
+            from docx_stream import StreamedDocument
+            if max_pages is not None:
+                with profiler.stage('estimate'):
+                    # The streamed blocks cannot be replayed, so the estimate reads the file on its own.
+                    estimate = check_page_budget(open_paper(input_file, report=False, root=root), image_source, max_pages,
+                                                 input_file)
+            # Reading, parsing and rendering happen while the DOCX is written, i.e. in the `save` stage.
+            doc = StreamedDocument(open_paper(input_file, root=root), image_source, profiler, template, block_cache)
+        else:
+            from docx_render import render_paper
+            with profiler.stage('parse'):
+                paper = load_paper(input_file, root)
+            if max_pages is not None:
+                with profiler.stage('estimate'):
+                    estimate = check_page_budget(paper, image_source, max_pages, input_file)
+            with profiler.stage('render'):
+                doc = render_paper(paper, input_file, profiler, template=template, block_cache=block_cache)
+        if estimate is not None and estimate['over_budget']:
+            convert_pdf = False
+            # A PDF left over from an earlier build would no longer match the DOCX.
+            if os.path.exists(pdf_path_for(output_file)):
+                os.unlink(pdf_path_for(output_file))
+
+        use_weasyprint = convert_pdf and pdf_engine == 'weasyprint'
+        save_and_convert(doc, output_file, convert_pdf=convert_pdf and not use_weasyprint, pdf_pool=pdf_pool,
+                         profiler=profiler)
+        if use_weasyprint:
+            if backend == 'stream':
+                # The streamed blocks were consumed by the DOCX writer; read the body again.
+                paper = open_paper(input_file, report=False, root=root)
+            with profiler.stage('pdf'):
+                convert_with_weasyprint(paper, image_source, output_file, pdf_pool=pdf_pool)
+    except CitationError as e:
+        # The body is parsed lazily, so an inconsistent citation style surfaces here.
+        logger.error(f"Cannot generate {output_file}: {str(e)}")
+        sys.exit(1)
 
-if __name__ == '__main__':
+    if cache is not None:
+        with profiler.stage('cache_store'):
+            cache.store(cache_key, {'docx': output_file, 'pdf': pdf_path_for(output_file)})
+            if estimate is not None:
+                cache.store_json(cache_key, 'estimate', {k: v for k, v in estimate.items() if k != 'over_budget'})
+    return estimate
+
+
+def watch_paper(input_file, output_file, poll_interval=0.25, pdf_delay=1.5, backend='python-docx', template=None):
+    """Rebuild the DOCX whenever the markdown or its images change; refresh the PDF in the background.
+
+    The body XML of every block stays in memory between rebuilds, so a save re-renders only
+    the blocks that changed (and figures); the file is still re-read and re-parsed each time.
+    """
+    from watcher import FileWatcher, PdfScheduler
+
+    fallback = None
+    if sys.platform in ('darwin', 'win32'):
+        fallback = lambda docx_path, pdf_path: convert_to_pdf(docx_path)
+    scheduler = PdfScheduler(pdf_path_for(output_file), delay=pdf_delay, fallback=fallback)
+    if not scheduler.use_soffice and fallback is None:
+        logger.warning("No PDF converter available; watch mode will only refresh the DOCX.")
+        scheduler = None
+
+    watcher = FileWatcher()
+    block_cache = BlockCache()
+    logger.info(f"Watching {input_file} for changes. Press Ctrl+C to stop.")
+    try:
+        rebuild = True
+        while True:
+            if rebuild or watcher.changed():
+                rebuild = False
+                start = time.perf_counter()
+                try:
+                    generate_paper(input_file, output_file, convert_pdf=False, backend=backend, template=template,
+                                   block_cache=block_cache)
+                except SystemExit:
+                    # Mid-save or unreadable input: keep watching and retry on the next change.
+                    block_cache.finish(prune=False)
+                    logger.warning(f"Rebuild of {input_file} failed; waiting for the next change.")
+                else:
+                    hits, misses = block_cache.finish()
+                    logger.info(f"DOCX refreshed in {time.perf_counter() - start:.2f}s "
+                                f"({misses} of {hits + misses} blocks re-rendered)")
+                    if scheduler is not None:
+                        scheduler.schedule(output_file)
+                try:
+                    _, images, bibliographies = scan_markdown_file(input_file)
+                    inputs = images + bibliographies
+                except (OSError, SystemExit):
+                    inputs = []
+                watcher.set_paths([input_file] + inputs + ([template] if template else []))
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        logger.info("Stopping watch mode.")
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown()
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate IEEE format paper from Markdown.')
     parser.add_argument('-i', '--input', type=str, default=DEFAULT_INPUT_FILE, help='Path to the input markdown file.')
     parser.add_argument('-o', '--output', type=str, default=DEFAULT_OUTPUT_FILE, help='Path to the output DOCX file.')
+    parser.add_argument('--no-cache', action='store_true', help='Always rebuild, ignoring the build cache.')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='Directory of the build cache.')
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help='Build cache size limit in MiB.')
+    parser.add_argument('--pdf-engine', choices=PDF_ENGINES, default='office',
+                        help='Convert the DOCX with Word/LibreOffice, or render the PDF in-process with weasyprint.')
+    parser.add_argument('--backend', choices=BACKENDS, default='python-docx',
+                        help='DOCX writer: python-docx object tree, or the streaming writer for very long papers.')
+    parser.add_argument('--template', type=str,
+                        help='Word template (.dotx or .docx) whose styles, theme and headers the DOCX is based on.')
+    parser.add_argument('--watch', action='store_true', help='Rebuild the DOCX on every save and refresh the PDF in the background.')
+    parser.add_argument('--pdf-delay', type=float, default=1.5, help='Seconds of inactivity before watch mode converts to PDF.')
+    parser.add_argument('--formats', type=str,
+                        help='Comma-separated outputs to build from one parse, in parallel: docx,pdf,html,tex. '
+                             'Bypasses the build cache.')
+    parser.add_argument('--max-pages', type=float,
+                        help='Estimate the page count first and only produce the PDF if it fits this many pages.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Record wall/CPU time and allocations per stage and per block type.')
+    parser.add_argument('--profile-trace', type=str, default=DEFAULT_TRACE_FILE,
+                        help='JSON-lines file the --profile records are appended to.')
+    parser.add_argument('--profile-pstats', type=str, help='With --profile, also dump cProfile stats to this file.')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.profile and args.watch:
+        parser.error('--profile cannot be combined with --watch')
+    if args.template is not None and not os.path.isfile(args.template):
+        parser.error(f'--template: {args.template} not found')
+    formats = None
+    if args.formats is not None:
+        from multi_format import parse_formats
+        try:
+            formats = parse_formats(args.formats)
+        except ValueError as e:
+            parser.error(f'--formats: {e}')
+        if args.watch or args.profile:
+            parser.error('--formats cannot be combined with --watch or --profile')
     
+    setup_logging()
     logger.info(f"Starting generation with Input: {args.input} | Output: {args.output}")
-    generate_paper(args.input, args.output)
+    if args.watch:
+        watch_paper(args.input, args.output, pdf_delay=args.pdf_delay, backend=args.backend, template=args.template)
+    elif formats is not None:
+        from multi_format import render_formats
+        try:
+            results = render_formats(args.input, args.output, formats, backend=args.backend,
+                                     pdf_engine=args.pdf_engine, max_pages=args.max_pages, template=args.template)
+        except CitationError as e:
+            logger.error(f"Cannot generate {args.output}: {str(e)}")
+            sys.exit(1)
+        if any(result['status'] == 'failed' for result in results.values()):
+            sys.exit(1)
+    else:
+        cache = None if args.no_cache else BuildCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024)
+        if args.profile:
+            from telemetry import Profiler
+            with Profiler(args.profile_trace, args.profile_pstats, input=args.input, output=args.output,
+                          backend=args.backend) as profiler:
+                generate_paper(args.input, args.output, cache=cache, backend=args.backend, profiler=profiler,
+                               pdf_engine=args.pdf_engine, max_pages=args.max_pages, template=args.template)
+        else:
+            generate_paper(args.input, args.output, cache=cache, backend=args.backend, pdf_engine=args.pdf_engine,
+                           max_pages=args.max_pages, template=args.template)
+
+
+if __name__ == '__main__':
+    main()
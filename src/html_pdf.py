@@ -0,0 +1,217 @@
+import base64
+import io
+import logging
+import os
+import pathlib
+import threading
+from html import escape
+
+from PIL import Image
+
+from ieee_style import TEXT_WIDTH, style_css
+from image_prep import prepare_figure
+from markdown_ast import Caption, CodeBlock, Figure, Heading, ListItem, Paragraph, Reference, Table
+from table_layout import cell_text, column_widths, default_alignments, is_wide, table_width_twips
+
+logger = logging.getLogger(__name__)
+
+# Layout rules that have no DOCX style counterpart (the style classes come from `ieee_style`).
+LAYOUT_CSS = '''
+.authors { width: 100%; table-layout: fixed; border-collapse: collapse; margin-bottom: 12pt; }
+.authors td { vertical-align: top; padding: 0; }
+.IEEEFigure img { width: 100%; }
+.IEEETable { width: 100%; table-layout: fixed; border-collapse: collapse; margin-bottom: 6pt; }
+.IEEETable tr { break-inside: avoid; }
+.IEEETable td { padding: 1pt 3pt; border-top: 0.5pt solid #4f81bd; }
+.IEEETable thead td { border-top: 1pt solid #4f81bd; border-bottom: 1pt solid #4f81bd; }
+'''
+# Images weasyprint keeps decoded across documents; cleared once it grows past this.
+MAX_CACHED_IMAGES = 256
+
+_engine = None
+_engine_lock = threading.Lock()
+_image_cache = {}
+
+
+def load_engine():
+    """Import weasyprint and build the font configuration and stylesheet shared by every document.
+
+    Raises ImportError/OSError when weasyprint or its native libraries (pango) are missing.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            import weasyprint
+            from weasyprint.text.fonts import FontConfiguration
+            font_config = FontConfiguration()
+            stylesheet = weasyprint.CSS(string=style_css() + LAYOUT_CSS, font_config=font_config)
+            _engine = (weasyprint, font_config, stylesheet)
+    return _engine
+
+
+def _p(style_id, content):
+    return f'<p class="{style_id}">{content}</p>'
+
+
+class HtmlPaperWriter:
+    """Builds the HTML for a parsed paper, block by block, mirroring `StreamingDocxWriter`.
+
+    Two-column text lives in `.columns` containers; figures close the current container
+    and the caption opens the next one, like the section breaks in the DOCX.
+    """
+
+    def __init__(self, image_source, stylesheet=None):
+        self.image_source = image_source
+        self.stylesheet = stylesheet
+        self.parts = []
+        self.in_columns = False
+
+    def write(self, html):
+        self.parts.append(html)
+
+    def open_columns(self):
+        if not self.in_columns:
+            self.write('<div class="columns">')
+            self.in_columns = True
+
+    def close_columns(self):
+        if self.in_columns:
+            self.write('</div>')
+            self.in_columns = False
+
+    # --- Front matter ---
+
+    def title(self, frontmatter):
+        self.write(_p('IEEETitle', escape(str(frontmatter.get('title', 'Unknown Title')))))
+
+    def authors(self, frontmatter):
+        authors = frontmatter.get('authors', []) or []
+        cells = []
+        for author in authors:
+            lines = [_p('IEEEAuthor', escape(str(author.get('name', ''))))]
+            lines += [_p('IEEEAuthorDetail', escape(str(author[key])))
+                      for key in ('role', 'department', 'organization', 'email') if key in author]
+            cells.append(f'<td>{"".join(lines)}</td>')
+        if cells:
+            self.write(f'<table class="authors"><tr>{"".join(cells)}</tr></table>')
+
+    def abstract_and_index_terms(self, frontmatter):
+        abstract_text = frontmatter.get('abstract', '')
+        if abstract_text:
+            self.write(_p('IEEEAbstract', f'<span class="IEEELabel">Abstract—</span>{escape(str(abstract_text))}'))
+        index_terms_text = frontmatter.get('index_terms', '')
+        if index_terms_text:
+            self.write(_p('IEEEIndexTerms',
+                          f'<span class="IEEELabel">Index Terms—</span>{escape(str(index_terms_text))}'))
+
+    # --- Body blocks ---
+
+    def heading(self, block):
+        self.write(_p('IEEEHeading1' if block.level == 1 else 'IEEEHeading2', escape(block.text)))
+
+    def figure(self, block):
+        img_path, source = self.image_source.resolve(block.path)
+        self.close_columns()
+        if source is None:
+            logger.warning(f"Image file not found: {img_path}")
+            self.write(_p('IEEEFigure', escape(f'[Image missing: {img_path}]')))
+            return
+        try:
+            self.write(_p('IEEEFigure', f'<img src="{self._image_url(source)}" alt="{escape(block.alt)}">'))
+        except Exception as e:
+            logger.error(f"Failed to insert image {img_path}: {str(e)}")
+            self.write(_p('IEEEFigure', escape(f'[Error loading image: {img_path}]')))
+
+    def _image_url(self, source):
+        prepared = prepare_figure(source, TEXT_WIDTH)
+        if isinstance(prepared, str):
+            return pathlib.Path(os.path.abspath(prepared)).as_uri()
+        data = prepared.getvalue()
+        with Image.open(io.BytesIO(data)) as im:
+            mime_type = im.get_format_mimetype()
+        return f'data:{mime_type};base64,{base64.b64encode(data).decode("ascii")}'
+
+    def caption(self, block):
+        self.write(_p('IEEECaption', escape(block.text)))
+        self.open_columns()
+
+    def code_block(self, block):
+        for line in block.lines:
+            if line.startswith('CCS ='):
+                self.write(_p('IEEEEquation', escape(line)))
+
+    def table(self, block):
+        if not block.rows:
+            return
+        wide = is_wide(block) and self.in_columns
+        total = table_width_twips(block)
+        cols = ''.join(f'<col style="width: {100 * width / total:.2f}%">' for width in column_widths(block, total))
+        aligns = [f' style="text-align: {align}"' for align in default_alignments(block)]
+        rows = [
+            '<tr>' + ''.join(f'<td class="IEEETableText"{align}>{escape(cell_text(cell))}</td>'
+                             for align, cell in zip(aligns, row)) + '</tr>'
+            for row in block.rows
+        ]
+        header = rows[0].replace('class="IEEETableText"', 'class="IEEETableText IEEETableHeader"')
+        if wide:
+            self.close_columns()
+        self.write(f'<table class="IEEETable"><colgroup>{cols}</colgroup>'
+                   f'<thead>{header}</thead><tbody>{"".join(rows[1:])}</tbody></table>')
+        if wide:
+            self.open_columns()
+
+    def reference(self, block):
+        self.write(_p('IEEEReference', escape(block.text)))
+
+    def list_item(self, block):
+        self.write(_p('IEEEListItem', escape(f'{block.marker} {block.text}')))
+
+    def paragraph(self, block):
+        self.write(_p('IEEEBody', escape(block.text)))
+
+    def blocks(self, blocks):
+        handlers = {
+            Heading: self.heading, Figure: self.figure, Caption: self.caption, CodeBlock: self.code_block,
+            Table: self.table, Reference: self.reference, ListItem: self.list_item, Paragraph: self.paragraph,
+        }
+        for block in blocks:
+            handlers[type(block)](block)
+
+    def paper(self, paper):
+        title = escape(str(paper.frontmatter.get('title', 'Unknown Title')))
+        style = f'<style>{self.stylesheet}</style>' if self.stylesheet else ''
+        self.write(f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title>{style}</head><body>')
+        self.title(paper.frontmatter)
+        self.authors(paper.frontmatter)
+        self.open_columns()
+        self.abstract_and_index_terms(paper.frontmatter)
+        self.blocks(paper.blocks)
+        self.close_columns()
+        self.write('</body></html>')
+        return ''.join(self.parts)
+
+
+def paper_to_html(paper, image_source, standalone=False):
+    """HTML for a parsed paper; figures are loaded through `image_source`.
+
+    With `standalone`, the IEEE stylesheet is embedded so the page previews on its own in
+    a browser; otherwise it is left to the stylesheet `render_pdf` passes to weasyprint.
+    """
+    stylesheet = style_css() + LAYOUT_CSS if standalone else None
+    return HtmlPaperWriter(image_source, stylesheet).paper(paper)
+
+
+def render_pdf(paper, image_source, target=None):
+    """Render a parsed paper to PDF in-process with weasyprint.
+
+    `target` is a path or binary file object; without one the PDF bytes are returned.
+    Fonts are subset, and the font configuration, stylesheet and decoded images are
+    reused across documents.
+    """
+    weasyprint, font_config, stylesheet = load_engine()
+    html = paper_to_html(paper, image_source)
+    if len(_image_cache) > MAX_CACHED_IMAGES:
+        _image_cache.clear()
+    document = weasyprint.HTML(string=html, base_url=os.getcwd())
+    return document.write_pdf(target, font_config=font_config, stylesheets=[stylesheet],
+                              full_fonts=False, cache=_image_cache)
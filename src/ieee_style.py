@@ -0,0 +1,145 @@
+# --- IEEE Page Layout Constants (inches unless noted) ---
+PAGE_WIDTH = 8.5
+PAGE_HEIGHT = 11
+TOP_MARGIN = 0.75
+BOTTOM_MARGIN = 1.0
+SIDE_MARGIN = 0.625
+TEXT_WIDTH = PAGE_WIDTH - 2 * SIDE_MARGIN
+COLUMN_SPACING_TWIPS = 360
+
+LAYOUT_CONSTANTS = {
+    'page_width': PAGE_WIDTH,
+    'page_height': PAGE_HEIGHT,
+    'top_margin': TOP_MARGIN,
+    'bottom_margin': BOTTOM_MARGIN,
+    'side_margin': SIDE_MARGIN,
+    'column_spacing_twips': COLUMN_SPACING_TWIPS,
+}
+
+FONT_NAME = 'Times New Roman'
+TWIPS_PER_INCH = 1440
+TWIPS_PER_POINT = 20
+# Width of one text column in the two-column layout (3.5").
+COLUMN_WIDTH = (TEXT_WIDTH - COLUMN_SPACING_TWIPS / TWIPS_PER_INCH) / 2
+
+# --- Named IEEE styles ---
+# Each entry: style id -> (display name, properties). Sizes are in points; `before`/`after`
+# are paragraph spacing in points, `indent` is a left indent in inches and `line` is a
+# line-spacing multiple. Anything not listed is inherited from the document defaults.
+PARAGRAPH_STYLES = {
+    'IEEETitle': ('IEEE Title', {'size': 24, 'bold': True, 'align': 'center', 'after': 18}),
+    'IEEEAuthor': ('IEEE Author', {'size': 10, 'align': 'center', 'after': 3}),
+    'IEEEAuthorDetail': ('IEEE Author Detail', {'size': 9, 'align': 'center', 'after': 3}),
+    'IEEEAbstract': ('IEEE Abstract', {'size': 9, 'bold': True, 'align': 'both', 'after': 9}),
+    'IEEEIndexTerms': ('IEEE Index Terms', {'size': 9, 'after': 12}),
+    'IEEEHeading1': ('IEEE Heading 1', {'size': 10, 'bold': True, 'align': 'center', 'before': 9, 'after': 6}),
+    'IEEEHeading2': ('IEEE Heading 2', {'size': 9, 'bold': True, 'italic': True, 'before': 6, 'after': 3}),
+    'IEEEBody': ('IEEE Body', {'size': 9, 'align': 'both', 'after': 6, 'line': 1.0}),
+    'IEEEListItem': ('IEEE List Item', {'size': 9, 'align': 'both', 'after': 6, 'indent': 0.25}),
+    'IEEEFigure': ('IEEE Figure', {'align': 'center', 'before': 12, 'after': 6}),
+    'IEEECaption': ('IEEE Caption', {'size': 8, 'bold': True, 'align': 'center', 'after': 12}),
+    'IEEEEquation': ('IEEE Equation', {'size': 9, 'italic': True, 'align': 'center', 'before': 6, 'after': 6}),
+    'IEEEReference': ('IEEE Reference', {'size': 8, 'align': 'both', 'after': 3}),
+    'IEEETableText': ('IEEE Table', {'size': 8}),
+}
+
+CHARACTER_STYLES = {
+    'IEEELabel': ('IEEE Label', {'bold': True, 'italic': True}),
+    'IEEETableHeader': ('IEEE Table Header', {'bold': True}),
+}
+
+
+def twips(inches):
+    return int(round(inches * TWIPS_PER_INCH))
+
+
+def _ppr_xml(props):
+    parts = []
+    spacing = ''
+    if 'before' in props:
+        spacing += f' w:before="{int(props["before"] * TWIPS_PER_POINT)}"'
+    if 'after' in props:
+        spacing += f' w:after="{int(props["after"] * TWIPS_PER_POINT)}"'
+    if 'line' in props:
+        spacing += f' w:line="{int(props["line"] * 240)}" w:lineRule="auto"'
+    if spacing:
+        parts.append(f'<w:spacing{spacing}/>')
+    if 'indent' in props:
+        parts.append(f'<w:ind w:left="{twips(props["indent"])}"/>')
+    if 'align' in props:
+        parts.append(f'<w:jc w:val="{props["align"]}"/>')
+    return f'<w:pPr>{"".join(parts)}</w:pPr>' if parts else ''
+
+
+def _rpr_xml(props, with_font):
+    parts = []
+    if with_font:
+        parts.append(f'<w:rFonts w:ascii="{FONT_NAME}" w:hAnsi="{FONT_NAME}"/>')
+    if 'bold' in props:
+        parts.append('<w:b/>' if props['bold'] else '<w:b w:val="0"/>')
+    if 'italic' in props:
+        parts.append('<w:i/>' if props['italic'] else '<w:i w:val="0"/>')
+    if 'size' in props:
+        parts.append(f'<w:sz w:val="{int(props["size"] * 2)}"/>')
+    return f'<w:rPr>{"".join(parts)}</w:rPr>' if parts else ''
+
+
+def style_elements_xml(skip=()):
+    """`w:style` definitions for every IEEE style, as one XML string (w: prefix, no namespace declaration).
+
+    Style ids in `skip` (e.g. those a user template already defines) are left out.
+    """
+    from xml.sax.saxutils import quoteattr
+
+    xml = []
+    for style_id, (name, props) in PARAGRAPH_STYLES.items():
+        if style_id in skip:
+            continue
+        xml.append(
+            f'<w:style w:type="paragraph" w:customStyle="1" w:styleId={quoteattr(style_id)}>'
+            f'<w:name w:val={quoteattr(name)}/><w:basedOn w:val="Normal"/><w:qFormat/>'
+            f'{_ppr_xml(props)}{_rpr_xml(props, with_font=True)}</w:style>'
+        )
+    for style_id, (name, props) in CHARACTER_STYLES.items():
+        if style_id in skip:
+            continue
+        xml.append(
+            f'<w:style w:type="character" w:customStyle="1" w:styleId={quoteattr(style_id)}>'
+            f'<w:name w:val={quoteattr(name)}/><w:basedOn w:val="DefaultParagraphFont"/>'
+            f'{_rpr_xml(props, with_font=False)}</w:style>'
+        )
+    return ''.join(xml)
+
+
+def _css_declarations(props):
+    decls = []
+    if 'size' in props:
+        decls.append(f'font-size: {props["size"]}pt')
+    if 'bold' in props:
+        decls.append(f'font-weight: {"bold" if props["bold"] else "normal"}')
+    if 'italic' in props:
+        decls.append(f'font-style: {"italic" if props["italic"] else "normal"}')
+    if 'align' in props:
+        decls.append(f'text-align: {"justify" if props["align"] == "both" else props["align"]}')
+    if 'before' in props or 'after' in props:
+        decls.append(f'margin: {props.get("before", 0)}pt 0 {props.get("after", 0)}pt')
+    if 'indent' in props:
+        decls.append(f'margin-left: {props["indent"]}in')
+    if 'line' in props:
+        # Word's single spacing for Times is about 1.15 times the font size.
+        decls.append(f'line-height: {round(props["line"] * 1.15, 3)}')
+    return '; '.join(decls)
+
+
+def style_css():
+    """The IEEE page geometry and named styles as CSS, one class per style id."""
+    rules = [
+        f'@page {{ size: {PAGE_WIDTH}in {PAGE_HEIGHT}in; '
+        f'margin: {TOP_MARGIN}in {SIDE_MARGIN}in {BOTTOM_MARGIN}in {SIDE_MARGIN}in; }}',
+        f'body {{ font-family: "{FONT_NAME}", "Times", serif; font-size: 10pt; margin: 0; }}',
+        f'.columns {{ column-count: 2; column-gap: {COLUMN_SPACING_TWIPS / TWIPS_PER_INCH}in; }}',
+        'p { margin: 0; }',
+    ]
+    for style_id, (_, props) in {**PARAGRAPH_STYLES, **CHARACTER_STYLES}.items():
+        rules.append(f'.{style_id} {{ {_css_declarations(props)} }}')
+    return '\n'.join(rules) + '\n'
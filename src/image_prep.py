@@ -0,0 +1,176 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from build_cache import file_digest
+from markdown_ast import check_within, resolve_image_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_CACHE_DIR = '.cache/ieee_images'
+# Figures are downsampled to this print resolution for the width they are rendered at.
+TARGET_DPI = 300
+JPEG_QUALITY = 85
+MAX_WORKERS = 8
+# Prepared in-memory figures kept per process, most recently used last.
+MAX_MEMO_IMAGES = 64
+
+SAVE_OPTIONS = {
+    'PNG': {'optimize': True},
+    'JPEG': {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True},
+}
+# Part of every cache key and of the build-cache salt; bump 'version' when processing changes.
+IMAGE_SETTINGS = {'dpi': TARGET_DPI, 'jpeg_quality': JPEG_QUALITY, 'version': 1}
+
+# (path, mtime, size, width, cache dir) -> prepared path, so a figure is hashed once per process.
+_prepared = {}
+_prepared_lock = threading.Lock()
+# (content hash, width) -> prepared bytes for figures handed over in memory.
+_prepared_data = OrderedDict()
+
+
+class FileImageSource:
+    """Figures read from disk, relative to the Markdown file.
+
+    With `root`, a reference that resolves outside that directory (an absolute or `../`
+    path, or a symlink out) raises ValueError instead of being read.
+    """
+
+    def __init__(self, input_file, root=None):
+        self.input_file = input_file
+        self.root = root
+
+    def resolve(self, ref):
+        """Return `(name, source)` for an image reference; `source` is a path, or None if missing."""
+        path = resolve_image_path(ref, self.input_file)
+        if self.root is not None:
+            check_within(path, self.root)
+        return path, (path if os.path.exists(path) else None)
+
+
+class CallbackImageSource:
+    """Figures supplied by a `resolve_image(ref) -> bytes | None` callback instead of the filesystem."""
+
+    def __init__(self, resolve_image=None):
+        self.resolve_image = resolve_image
+
+    def resolve(self, ref):
+        return ref, (self.resolve_image(ref) if self.resolve_image is not None else None)
+
+
+def _recompress(src, width_inches):
+    """Downsample/recompress an image path or stream.
+
+    Returns `(data, resized)`, or None for formats that are embedded as they are.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as im:
+        fmt = im.format
+        if fmt not in SAVE_OPTIONS:
+            return None
+        if fmt == 'JPEG':
+            # Re-encoding drops EXIF, so bake the orientation into the pixels first.
+            im = ImageOps.exif_transpose(im)
+        max_width = int(round(width_inches * TARGET_DPI))
+        resized = im.width > max_width
+        if resized:
+            height = max(1, round(im.height * max_width / im.width))
+            im = im.resize((max_width, height), Image.LANCZOS)
+        out = io.BytesIO()
+        im.save(out, format=fmt, **SAVE_OPTIONS[fmt])
+    return out.getvalue(), resized
+
+
+def _process(src, dst, width_inches):
+    """Write the downsampled/recompressed `src` to `dst`, or a copy of `src` if that is no smaller."""
+    tmp = f'{dst}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        result = _recompress(src, width_inches)
+        if result is not None and (result[1] or len(result[0]) < os.path.getsize(src)):
+            with open(tmp, 'wb') as f:
+                f.write(result[0])
+            os.replace(tmp, dst)
+            return True
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+        return False
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def prepare_image(img_path, width_inches, cache_dir=DEFAULT_IMAGE_CACHE_DIR):
+    """Path of a print-ready version of `img_path` for a figure `width_inches` wide.
+
+    Processed images are stored under `cache_dir` by content hash, so reruns and papers
+    sharing a diagram reuse them. Falls back to `img_path` if the image can't be processed.
+    """
+    try:
+        st = os.stat(img_path)
+    except OSError:
+        return img_path
+    memo_key = (os.path.abspath(img_path), st.st_mtime_ns, st.st_size, width_inches, cache_dir)
+    with _prepared_lock:
+        prepared = _prepared.get(memo_key)
+    if prepared and os.path.exists(prepared):
+        return prepared
+
+    settings = json.dumps(dict(IMAGE_SETTINGS, width=width_inches), sort_keys=True)
+    key = hashlib.sha256(f'{file_digest(img_path)}:{settings}'.encode('utf-8')).hexdigest()
+    prepared = os.path.join(cache_dir, key[:2], key + os.path.splitext(img_path)[1].lower())
+    if not os.path.exists(prepared):
+        try:
+            os.makedirs(os.path.dirname(prepared), exist_ok=True)
+            if _process(img_path, prepared, width_inches):
+                logger.info(f"Optimized image {img_path}: {st.st_size} -> {os.path.getsize(prepared)} bytes")
+        except Exception as e:
+            logger.warning(f"Image preprocessing failed for {img_path}, embedding the original: {str(e)}")
+            return img_path
+
+    with _prepared_lock:
+        _prepared[memo_key] = prepared
+    return prepared
+
+
+def prepare_image_data(data, width_inches):
+    """In-memory counterpart of `prepare_image` for figures supplied as bytes."""
+    key = (hashlib.sha256(data).hexdigest(), width_inches)
+    with _prepared_lock:
+        if key in _prepared_data:
+            _prepared_data.move_to_end(key)
+            return _prepared_data[key]
+    try:
+        result = _recompress(io.BytesIO(data), width_inches)
+    except Exception as e:
+        logger.warning(f"Image preprocessing failed, embedding the original: {str(e)}")
+        return data
+    prepared = result[0] if result is not None and (result[1] or len(result[0]) < len(data)) else data
+    with _prepared_lock:
+        _prepared_data[key] = prepared
+        while len(_prepared_data) > MAX_MEMO_IMAGES:
+            _prepared_data.popitem(last=False)
+    return prepared
+
+
+def prepare_figure(source, width_inches):
+    """Print-ready figure for an image source: a path for files, a stream for in-memory data."""
+    if isinstance(source, str):
+        return prepare_image(source, width_inches)
+    return io.BytesIO(prepare_image_data(source, width_inches))
+
+
+def prepare_images(img_paths, width_inches, cache_dir=DEFAULT_IMAGE_CACHE_DIR):
+    """Prepare several images in parallel threads; returns {original path: prepared path}."""
+    img_paths = list(dict.fromkeys(img_paths))
+    if not img_paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(img_paths))) as pool:
+        prepared = pool.map(lambda path: prepare_image(path, width_inches, cache_dir), img_paths)
+        return dict(zip(img_paths, prepared))
@@ -0,0 +1,231 @@
+import logging
+import os
+import re
+
+from citations import CITATION_PATTERN, citation_numbers
+from markdown_ast import Caption, CodeBlock, Figure, Heading, ListItem, Paragraph, Reference, Table
+from table_layout import cell_text, default_alignments, is_wide
+
+logger = logging.getLogger(__name__)
+
+LATEX_SPECIALS = {
+    '\\': r'\textbackslash{}', '&': r'\&', '%': r'\%', '$': r'\$', '#': r'\#', '_': r'\_',
+    '{': r'\{', '}': r'\}', '~': r'\textasciitilde{}', '^': r'\textasciicircum{}',
+    # Symbols pdflatex's utf8 input encoding has no text-mode mapping for.
+    '→': r'$\rightarrow$', '←': r'$\leftarrow$', '≥': r'$\geq$', '≤': r'$\leq$', '×': r'$\times$',
+    '±': r'$\pm$', '≈': r'$\approx$',
+}
+LATEX_SPECIAL_CHARS = re.compile('|'.join(map(re.escape, LATEX_SPECIALS)))
+# IEEEtran numbers sections itself, so the `IV.` / `A.` written in the Markdown is dropped.
+SECTION_NUMBER = re.compile(r'^(?:[IVXLCDM]+|\d+)\.\s+')
+SUBSECTION_NUMBER = re.compile(r'^[A-Z]\.\s+')
+FIGURE_LABEL = re.compile(r'^Fig\.\s*\d+[.:]\s*')
+# Pandoc's rule: no space inside the dollars and no digit right after, so `$5 and $10` stay text.
+INLINE_MATH = re.compile(r'(\$(?=\S)[^$]+?(?<=\S)\$)(?!\d)')
+EMPHASIS = re.compile(r'(?<!\w)_([^_]+)_(?!\w)')
+REFERENCE_LABEL = re.compile(r'^\[\d+\]\s*')
+UNNUMBERED_SECTIONS = ('ACKNOWLEDGMENT', 'ACKNOWLEDGMENTS', 'ACKNOWLEDGEMENT', 'ACKNOWLEDGEMENTS')
+
+PREAMBLE = r'''\documentclass[conference]{IEEEtran}
+\usepackage[T1]{fontenc}
+\usepackage[utf8]{inputenc}
+\usepackage{graphicx}
+\usepackage{cite}
+'''
+
+
+def escape(text):
+    return LATEX_SPECIAL_CHARS.sub(lambda m: LATEX_SPECIALS[m.group()], text)
+
+
+def _cite(match):
+    keys, first, last = match.group(1), match.group(2), match.group(3)
+    if keys or first is None:
+        return escape(match.group())
+    numbers = citation_numbers(first, last)
+    return r'\cite{' + ','.join(f'ref{n}' for n in numbers) + '}'
+
+
+def text_with_citations(text):
+    """Escape body text, turning the resolved `[n]` citations into `\\cite` commands.
+
+    Inline `$...$` math is already LaTeX and is kept as written.
+    """
+    parts = []
+    for i, span in enumerate(INLINE_MATH.split(text)):
+        if i % 2:
+            parts.append(span)
+            continue
+        pos = 0
+        for match in CITATION_PATTERN.finditer(span):
+            parts.append(escape(span[pos:match.start()]))
+            parts.append(_cite(match))
+            pos = match.end()
+        parts.append(escape(span[pos:]))
+    return ''.join(parts)
+
+
+class LatexPaperWriter:
+    """Builds IEEEtran LaTeX for a parsed paper, block by block, mirroring `HtmlPaperWriter`.
+
+    Figure paths are written relative to `output_dir`, where the `.tex` file is saved.
+    Consecutive list items share one list environment and a figure stays open until its
+    caption, so the writer tracks both between blocks.
+    """
+
+    def __init__(self, image_source, output_dir='.'):
+        self.image_source = image_source
+        self.output_dir = output_dir
+        self.parts = []
+        self.open_list = None
+        self.open_figure = None
+        self.in_bibliography = False
+        self.references = 0
+
+    def write(self, latex):
+        self.parts.append(latex)
+
+    def close_list(self):
+        if self.open_list:
+            self.write(f'\\end{{{self.open_list}}}\n\n')
+            self.open_list = None
+
+    def close_figure(self, caption=None):
+        if self.open_figure:
+            if caption:
+                self.write(f'\\caption{{{text_with_citations(FIGURE_LABEL.sub("", caption))}}}\n')
+            self.write(f'\\end{{{self.open_figure}}}\n\n')
+            self.open_figure = None
+
+    def close_bibliography(self):
+        if self.in_bibliography:
+            self.write('\\end{thebibliography}\n\n')
+            self.in_bibliography = False
+
+    # --- Front matter ---
+
+    def title(self, frontmatter):
+        self.write(f'\\title{{{escape(str(frontmatter.get("title", "Unknown Title")))}}}\n\n')
+
+    def authors(self, frontmatter):
+        authors = frontmatter.get('authors', []) or []
+        blocks = []
+        for author in authors:
+            details = ' \\\\\n'.join(escape(str(author[key]))
+                                     for key in ('role', 'department', 'organization', 'email') if key in author)
+            blocks.append(f'\\IEEEauthorblockN{{{escape(str(author.get("name", "")))}}}\n'
+                          f'\\IEEEauthorblockA{{{details}}}')
+        if blocks:
+            self.write('\\author{' + '\n\\and\n'.join(blocks) + '}\n\n')
+
+    def abstract_and_index_terms(self, frontmatter):
+        abstract_text = frontmatter.get('abstract', '')
+        if abstract_text:
+            self.write(f'\\begin{{abstract}}\n{escape(str(abstract_text))}\n\\end{{abstract}}\n\n')
+        index_terms_text = frontmatter.get('index_terms', '')
+        if index_terms_text:
+            self.write(f'\\begin{{IEEEkeywords}}\n{escape(str(index_terms_text))}\n\\end{{IEEEkeywords}}\n\n')
+
+    # --- Body blocks ---
+
+    def heading(self, block):
+        self.close_bibliography()
+        if block.level == 1 and block.text.strip().upper() == 'REFERENCES':
+            self.write('\\begin{thebibliography}{99}\n')
+            self.in_bibliography = True
+        elif block.level == 1 and block.text.strip().upper() in UNNUMBERED_SECTIONS:
+            self.write(f'\\section*{{{escape(block.text.strip().capitalize())}}}\n\n')
+        elif block.level == 1:
+            self.write(f'\\section{{{escape(SECTION_NUMBER.sub("", block.text))}}}\n\n')
+        else:
+            self.write(f'\\subsection{{{escape(SUBSECTION_NUMBER.sub("", block.text))}}}\n\n')
+
+    def figure(self, block):
+        img_path, source = self.image_source.resolve(block.path)
+        if source is None:
+            logger.warning(f"Image file not found: {img_path}")
+            self.write(f'% Image missing: {img_path}\n\n')
+            return
+        path = os.path.relpath(img_path, self.output_dir).replace(os.sep, '/')
+        self.open_figure = 'figure*'
+        self.write(f'\\begin{{figure*}}[!t]\n\\centering\n\\includegraphics[width=\\textwidth]{{{path}}}\n')
+
+    def caption(self, block):
+        if self.open_figure:
+            self.close_figure(block.text)
+        else:
+            self.write(f'\\begin{{center}}\\footnotesize {text_with_citations(block.text)}\\end{{center}}\n\n')
+
+    def code_block(self, block):
+        for line in block.lines:
+            if line.startswith('CCS ='):
+                self.write(f'\\begin{{center}}\n\\textit{{{escape(line)}}}\n\\end{{center}}\n\n')
+
+    def table(self, block):
+        if not block.rows:
+            return
+        env = 'table*' if is_wide(block) else 'table'
+        spec = '|' + '|'.join(align[0] for align in default_alignments(block)) + '|'
+        header = [f'\\textbf{{{escape(cell_text(cell))}}}' for cell in block.rows[0]]
+        rows = [' & '.join(row) + ' \\\\'
+                for row in [header] + [[escape(cell_text(cell)) for cell in row] for row in block.rows[1:]]]
+        self.write(f'\\begin{{{env}}}[!t]\n\\centering\n\\begin{{tabular}}{{{spec}}}\n\\hline\n'
+                   + '\n\\hline\n'.join(rows)
+                   + f'\n\\hline\n\\end{{tabular}}\n\\end{{{env}}}\n\n')
+
+    def reference(self, block):
+        if not self.in_bibliography:
+            self.write('\\begin{thebibliography}{99}\n')
+            self.in_bibliography = True
+        self.references += 1
+        number = block.number if block.number is not None else self.references
+        # `_Journal_` is the Markdown for the italic venue; odd parts are the emphasized spans.
+        parts = EMPHASIS.split(REFERENCE_LABEL.sub('', block.text))
+        text = ''.join(f'\\emph{{{escape(part)}}}' if i % 2 else escape(part) for i, part in enumerate(parts))
+        self.write(f'\\bibitem{{ref{number}}} {text}\n')
+
+    def list_item(self, block):
+        env = 'itemize' if block.marker == '-' else 'enumerate'
+        if self.open_list != env:
+            self.close_list()
+            self.write(f'\\begin{{{env}}}\n')
+            self.open_list = env
+        self.write(f'\\item {text_with_citations(block.text)}\n')
+
+    def paragraph(self, block):
+        text = block.text.strip()
+        if len(text) > 4 and text.startswith('$$') and text.endswith('$$'):
+            # Display math is already LaTeX.
+            self.write(f'\\[\n{text[2:-2].strip()}\n\\]\n\n')
+        else:
+            self.write(f'{text_with_citations(block.text)}\n\n')
+
+    def blocks(self, blocks):
+        handlers = {
+            Heading: self.heading, Figure: self.figure, Caption: self.caption, CodeBlock: self.code_block,
+            Table: self.table, Reference: self.reference, ListItem: self.list_item, Paragraph: self.paragraph,
+        }
+        for block in blocks:
+            if not isinstance(block, ListItem):
+                self.close_list()
+            if not isinstance(block, Caption):
+                self.close_figure()
+            handlers[type(block)](block)
+        self.close_list()
+        self.close_figure()
+        self.close_bibliography()
+
+    def paper(self, paper):
+        self.write(PREAMBLE + '\n\\begin{document}\n\n')
+        self.title(paper.frontmatter)
+        self.authors(paper.frontmatter)
+        self.write('\\maketitle\n\n')
+        self.abstract_and_index_terms(paper.frontmatter)
+        self.blocks(paper.blocks)
+        self.write('\\end{document}\n')
+        return ''.join(self.parts)
+
+
+def paper_to_latex(paper, image_source, output_dir='.'):
+    """IEEEtran LaTeX source for a parsed paper; figure paths are relative to `output_dir`."""
+    return LatexPaperWriter(image_source, output_dir).paper(paper)
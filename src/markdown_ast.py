@@ -0,0 +1,292 @@
+import os
+import re
+from dataclasses import dataclass, field
+
+# Body content before the first line containing this marker (title block, notes) is skipped.
+INTRO_MARKER = 'I. INTRODUCTION'
+
+IMAGE_PATTERN = re.compile(r'!\[(.*?)\]\((.*?)\)')
+SECTION_HEADING = re.compile(r'^##\s+(?:[IVXLCDM]+|\d+)\.')
+NUMBERED_ITEM = re.compile(r'^(\d+\.) ')
+REFERENCE_LABEL = re.compile(r'^\[(\d+)\]')
+TABLE_CELL_SEPARATOR = re.compile(r'(?<!\\)\|')
+TABLE_DELIMITER_CELL = re.compile(r'^:?-+:?$')
+
+
+# --- Block tree ---
+
+@dataclass
+class Heading:
+    text: str
+    level: int  # 1 = section (`## IV.`, ACKNOWLEDGMENT, REFERENCES), 2 = subsection (`### A.`)
+
+
+@dataclass
+class Paragraph:
+    text: str
+
+
+@dataclass
+class ListItem:
+    marker: str  # '-' or the ordinal such as '3.'
+    text: str
+
+
+@dataclass
+class Table:
+    rows: list  # cell texts, header row first; every row has the same number of cells
+    alignments: list = field(default_factory=list)  # per column: 'left', 'center', 'right' or None
+
+
+@dataclass
+class Figure:
+    alt: str
+    path: str  # as written in the markdown, relative to the markdown file
+
+
+@dataclass
+class Caption:
+    text: str
+
+
+@dataclass
+class CodeBlock:
+    language: str
+    lines: list = field(default_factory=list)
+
+
+@dataclass
+class Reference:
+    text: str  # the whole entry, including its `[n]` label
+    number: int = None
+
+
+@dataclass
+class Paper:
+    frontmatter: dict
+    blocks: list
+
+
+def is_image_line(line_stripped):
+    """True for a line holding only a markdown image, e.g. `![Fig. 1](path.png)`."""
+    return line_stripped.startswith('![') and '](' in line_stripped and line_stripped.endswith(')')
+
+
+def resolve_image_path(img_path, input_file):
+    """Resolve an image path relative to the markdown file directory."""
+    md_dir = os.path.dirname(input_file)
+    if md_dir:
+        img_path = os.path.join(md_dir, img_path)
+    return img_path
+
+
+def check_within(path, root):
+    """Raise ValueError unless `path`, with symlinks resolved, lies inside the directory `root`."""
+    real_root = os.path.realpath(root)
+    if os.path.commonpath([os.path.realpath(path), real_root]) != real_root:
+        raise ValueError(f"{path} is outside {root}; only files next to the paper may be referenced")
+    return path
+
+
+def iter_referenced_images(lines, input_file):
+    """Yield the resolved path of every image referenced in `lines` (any iterable of lines), in order."""
+    for line in lines:
+        line_stripped = line.strip()
+        if is_image_line(line_stripped):
+            match = IMAGE_PATTERN.search(line_stripped)
+            if match:
+                yield resolve_image_path(match.group(2), input_file)
+
+
+def find_referenced_images(content, input_file):
+    """List the resolved paths of every image the markdown references, in order."""
+    return list(iter_referenced_images(content.split('\n'), input_file))
+
+
+def _split_table_row(line):
+    """Cells of a GFM table row; `\\|` is a literal pipe and blank cells are kept."""
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [cell.strip().replace('\\|', '|') for cell in TABLE_CELL_SEPARATOR.split(line)]
+
+
+def _delimiter_alignments(cells):
+    """Column alignments of a delimiter row such as `| :--- | :-: | --: |`, or None for other rows."""
+    if not cells or not all(TABLE_DELIMITER_CELL.match(cell.replace(' ', '')) for cell in cells):
+        return None
+    alignments = []
+    for cell in cells:
+        cell = cell.replace(' ', '')
+        if cell.startswith(':') and cell.endswith(':'):
+            alignments.append('center')
+        elif cell.endswith(':'):
+            alignments.append('right')
+        elif cell.startswith(':'):
+            alignments.append('left')
+        else:
+            alignments.append(None)
+    return alignments
+
+
+def parse_table(lines):
+    """Build a Table from its `|` lines, or None when it has no content rows.
+
+    Rows are padded with blank cells to the widest row. Delimiter rows are dropped; the
+    first one sets the column alignments.
+    """
+    rows = []
+    alignments = None
+    for line in lines:
+        cells = _split_table_row(line)
+        row_alignments = _delimiter_alignments(cells)
+        if row_alignments is not None:
+            if alignments is None:
+                alignments = row_alignments
+            continue
+        if any(cells):
+            rows.append(cells)
+    if not rows:
+        return None
+    max_cols = max(len(row) for row in rows)
+    for row in rows:
+        row.extend([''] * (max_cols - len(row)))
+    alignments = (alignments or [])[:max_cols]
+    alignments.extend([None] * (max_cols - len(alignments)))
+    return Table(rows, alignments)
+
+
+# --- Line handlers, dispatched on the first character of the stripped line ---
+
+def _paragraph(line):
+    return (Paragraph(line.replace('**', '')),)
+
+
+def _hash_line(line):
+    if SECTION_HEADING.match(line):
+        return (Heading(line.replace('##', '').strip(), 1),)
+    if line.startswith('### '):
+        return (Heading(line.replace('###', '').strip(), 2),)
+    if line.startswith('## ACKNOWLEDGMENT'):
+        return (Heading('ACKNOWLEDGMENT', 1),)
+    if line.startswith('## REFERENCES'):
+        return (Heading('REFERENCES', 1),)
+    # Other headings are implied by their content.
+    return ()
+
+
+def _bang_line(line):
+    if not is_image_line(line):
+        return _paragraph(line)
+    match = IMAGE_PATTERN.search(line)
+    return (Figure(match.group(1), match.group(2)),) if match else ()
+
+
+def _emphasis_line(line):
+    if (line.startswith('*Fig. ') and line.endswith('*')) or (line.startswith('_Fig. ') and line.endswith('_')):
+        return (Caption(line.strip('*_')),)
+    if line.startswith('**Author'):
+        return ()
+    return _paragraph(line)
+
+
+def _reference(line):
+    match = REFERENCE_LABEL.match(line)
+    return Reference(line, int(match.group(1)) if match else None)
+
+
+def _dash_line(line):
+    if line.startswith('- '):
+        return (ListItem('-', line[2:].replace('**', '')),)
+    if line.startswith('---'):
+        return ()
+    return _paragraph(line)
+
+
+def _digit_line(line):
+    match = NUMBERED_ITEM.match(line)
+    if match:
+        return (ListItem(match.group(1), line[match.end():].replace('**', '')),)
+    return _paragraph(line)
+
+
+_LINE_HANDLERS = {
+    '': lambda line: (),
+    '#': _hash_line,
+    '!': _bang_line,
+    '*': _emphasis_line,
+    '_': _emphasis_line,
+    '-': _dash_line,
+}
+_LINE_HANDLERS.update({digit: _digit_line for digit in '0123456789'})
+
+
+def iter_blocks(lines):
+    """Tokenize body lines into blocks in a single pass.
+
+    `lines` may be the body text or any iterable of lines. Fenced code and tables span
+    several lines and are emitted when they close; every other block maps to one line.
+    """
+    if isinstance(lines, str):
+        lines = lines.split('\n')
+    started = False
+    code = None
+    table = None
+    # `[n] ...` lines are reference entries only under REFERENCES; elsewhere they are text.
+    in_references = False
+
+    for line in lines:
+        line = line.strip()
+        if not started:
+            if INTRO_MARKER not in line:
+                continue
+            started = True
+
+        if code is not None:
+            if line.startswith('```'):
+                yield code
+                code = None
+            else:
+                code.lines.append(line)
+            continue
+
+        if line.startswith('|'):
+            if table is None:
+                table = []
+            table.append(line)
+            continue
+        if table is not None:
+            parsed = parse_table(table)
+            if parsed is not None:
+                yield parsed
+            table = None
+
+        if line.startswith('```'):
+            code = CodeBlock(line[3:].strip())
+            continue
+
+        if line[:1] == '[' and ']' in line and (in_references or line.startswith('[1]')):
+            if not in_references:
+                # Without a `## REFERENCES` heading, the list starts at `[1]`.
+                in_references = True
+                yield Heading('REFERENCES', 1)
+            yield _reference(line)
+            continue
+
+        blocks = _LINE_HANDLERS.get(line[:1], _paragraph)(line)
+        if blocks and type(blocks[0]) is Heading and blocks[0].level == 1:
+            in_references = blocks[0].text == 'REFERENCES'
+        yield from blocks
+
+    if table:
+        parsed = parse_table(table)
+        if parsed is not None:
+            yield parsed
+    if code is not None:
+        yield code
+
+
+def parse_blocks(lines):
+    """Parse the markdown body into a list of blocks."""
+    return list(iter_blocks(lines))
@@ -0,0 +1,205 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from generate_ieee_format import check_page_budget, convert_to_pdf, load_paper, pdf_path_for, setup_logging
+from ieee_style import TEXT_WIDTH
+from image_prep import FileImageSource, prepare_images
+from markdown_ast import Figure, resolve_image_path
+
+FORMATS = ('docx', 'pdf', 'html', 'tex')
+
+logger = logging.getLogger(__name__)
+
+
+def parse_formats(value):
+    """Parse a comma-separated `--formats` value such as `docx,pdf,html`, keeping the given order."""
+    formats = []
+    for name in value.split(','):
+        name = name.strip().lower()
+        if name not in FORMATS:
+            raise ValueError(f"unknown format {name!r}; choose from {', '.join(FORMATS)}")
+        if name not in formats:
+            formats.append(name)
+    if not formats:
+        raise ValueError('no output formats given')
+    return formats
+
+
+def output_paths(output_file, formats):
+    """Map each format to `<output stem>.<format>`."""
+    stem = os.path.splitext(output_file)[0]
+    return {fmt: f'{stem}.{fmt}' for fmt in formats}
+
+
+# --- Backends ---
+# Module level so the process pool can pickle them; each returns its own run time in seconds.
+
+def write_docx(paper, input_file, docx_file, backend='python-docx', template=None):
+    start = time.perf_counter()
+    image_source = FileImageSource(input_file)
+    if backend == 'stream':
+        from docx_stream import StreamedDocument
+        StreamedDocument(paper, image_source, template=template).save(docx_file)
+    else:
+        from docx_render import render_paper
+        render_paper(paper, image_source=image_source, template=template).save(docx_file)
+    logger.info(f"IEEE Paper generated successfully in two-column format: {docx_file}")
+    return time.perf_counter() - start
+
+
+def write_weasyprint_pdf(paper, input_file, pdf_file):
+    start = time.perf_counter()
+    import html_pdf
+    html_pdf.render_pdf(paper, FileImageSource(input_file), pdf_file)
+    logger.info(f"IEEE Paper generated successfully in PDF format using weasyprint: {pdf_file}")
+    return time.perf_counter() - start
+
+
+def write_html(paper, input_file, html_file):
+    start = time.perf_counter()
+    import html_pdf
+    html = html_pdf.paper_to_html(paper, FileImageSource(input_file), standalone=True)
+    with open(html_file, 'w', encoding='utf-8') as f:
+        f.write(html)
+    logger.info(f"IEEE Paper generated successfully in HTML format: {html_file}")
+    return time.perf_counter() - start
+
+
+def write_tex(paper, input_file, tex_file):
+    start = time.perf_counter()
+    from latex_export import paper_to_latex
+    latex = paper_to_latex(paper, FileImageSource(input_file), os.path.dirname(tex_file) or '.')
+    with open(tex_file, 'w', encoding='utf-8') as f:
+        f.write(latex)
+    logger.info(f"IEEE Paper generated successfully in LaTeX format: {tex_file}")
+    return time.perf_counter() - start
+
+
+def convert_docx(docx_future, docx_file, pdf_file, pdf_pool=None):
+    """Wait for the DOCX, then convert it with the office converters (the wait is not timed)."""
+    docx_future.result()
+    start = time.perf_counter()
+    convert_to_pdf(docx_file, pdf_pool=pdf_pool)
+    converted = pdf_path_for(docx_file)
+    if not os.path.exists(converted):
+        raise RuntimeError("PDF conversion failed: no converter produced a PDF (see the log)")
+    if os.path.abspath(converted) != os.path.abspath(pdf_file):
+        shutil.move(converted, pdf_file)
+    return time.perf_counter() - start
+
+
+class FanOut:
+    """Runs the output backends for one parsed paper side by side.
+
+    The CPU-bound renderers (DOCX, weasyprint PDF) run in worker processes so they do
+    not share the GIL; the light HTML/LaTeX writers and the office PDF converter, which
+    mostly waits on Word/LibreOffice, run on threads. A DOCX needed only as the office
+    converter's input is written to `tmp_dir`.
+    """
+
+    def __init__(self, paper, input_file, paths, backend, pdf_pool, processes, threads, tmp_dir, template=None):
+        self.paper = paper
+        self.input_file = input_file
+        self.paths = paths
+        self.backend = backend
+        self.pdf_pool = pdf_pool
+        self.processes = processes
+        self.threads = threads
+        self.tmp_dir = tmp_dir
+        self.template = template
+        self._docx = None
+        self._docx_lock = threading.Lock()
+
+    def docx(self):
+        """`(future, path)` of the DOCX build, submitted on first use."""
+        with self._docx_lock:
+            if self._docx is None:
+                docx_file = self.paths.get('docx') or os.path.join(self.tmp_dir, 'paper.docx')
+                future = self.processes.submit(write_docx, self.paper, self.input_file, docx_file, self.backend,
+                                               self.template)
+                self._docx = (future, docx_file)
+            return self._docx
+
+    def office_pdf(self):
+        return self.threads.submit(convert_docx, *self.docx(), self.paths['pdf'], self.pdf_pool)
+
+    def weasyprint_pdf(self):
+        future = self.processes.submit(write_weasyprint_pdf, self.paper, self.input_file, self.paths['pdf'])
+
+        def wait():
+            try:
+                return future.result()
+            except (ImportError, OSError) as e:
+                logger.warning(f"weasyprint is unavailable, falling back to the office converters. Reason: {e}")
+                return convert_docx(*self.docx(), self.paths['pdf'], self.pdf_pool)
+        return self.threads.submit(wait)
+
+    def submit(self, fmt, pdf_engine):
+        if fmt == 'docx':
+            return self.docx()[0]
+        if fmt == 'pdf':
+            return self.weasyprint_pdf() if pdf_engine == 'weasyprint' else self.office_pdf()
+        writer = write_html if fmt == 'html' else write_tex
+        return self.threads.submit(writer, self.paper, self.input_file, self.paths[fmt])
+
+
+def render_formats(input_file, output_file, formats=FORMATS, backend='python-docx', pdf_engine='office',
+                   pdf_pool=None, max_pages=None, template=None):
+    """Parse a paper once and write it in each of `formats` (see `FORMATS`) concurrently.
+
+    Outputs go next to `output_file` with the format's extension. With `max_pages`, the PDF
+    is skipped when the estimated length is over budget. Returns a dict per format with
+    `path`, `status` ('ok', 'failed' or 'skipped'), `seconds` (the backend's own run time,
+    excluding waits on other backends) and `error`, and logs the same as a timing report.
+    `template` is an optional `.docx`/`.dotx` for the DOCX (and the office PDF made from it).
+    The build cache is not consulted: every format is rebuilt.
+    """
+    start = time.perf_counter()
+    paper = load_paper(input_file)
+    image_paths = [resolve_image_path(block.path, input_file) for block in paper.blocks if isinstance(block, Figure)]
+    prepare_images([path for path in image_paths if os.path.exists(path)], TEXT_WIDTH)
+    parse_seconds = time.perf_counter() - start
+    paths = output_paths(output_file, formats)
+    results = {fmt: {'path': path, 'status': 'ok', 'seconds': 0.0, 'error': None} for fmt, path in paths.items()}
+
+    if max_pages is not None and 'pdf' in formats:
+        estimate = check_page_budget(paper, FileImageSource(input_file), max_pages, input_file)
+        if estimate['over_budget']:
+            results['pdf']['status'] = 'skipped'
+            # A PDF left over from an earlier build would no longer match the other outputs.
+            if os.path.exists(paths['pdf']):
+                os.unlink(paths['pdf'])
+
+    pending = [fmt for fmt in formats if results[fmt]['status'] == 'ok']
+    # At most two CPU-bound renders run at once (DOCX and weasyprint PDF); workers start on first use.
+    with tempfile.TemporaryDirectory(prefix='ieee-formats-') as tmp_dir, \
+            ProcessPoolExecutor(max_workers=2, initializer=setup_logging) as processes, \
+            ThreadPoolExecutor(max_workers=max(1, len(pending))) as threads:
+        fan_out = FanOut(paper, input_file, paths, backend, pdf_pool, processes, threads, tmp_dir, template)
+        futures = {fmt: fan_out.submit(fmt, pdf_engine) for fmt in pending}
+        for fmt, future in futures.items():
+            try:
+                results[fmt]['seconds'] = future.result()
+            except RuntimeError as e:
+                # No converter produced a PDF; the converters have already logged why.
+                results[fmt].update(status='failed', error=str(e))
+                logger.error(f"Failed to generate the {fmt} output: {str(e)}")
+            except Exception as e:
+                results[fmt].update(status='failed', error=str(e))
+                logger.error(f"Failed to generate the {fmt} output: {str(e)}\n{traceback.format_exc()}")
+
+    log_timings(results, parse_seconds, time.perf_counter() - start)
+    return results
+
+
+def log_timings(results, parse_seconds, total_seconds):
+    logger.info(f"Output timings (parsed once in {parse_seconds:.2f}s):")
+    for fmt, result in results.items():
+        logger.info(f"  {fmt:<5} {result['status']:<7} {result['seconds']:7.2f}s  {result['path']}")
+    logger.info(f"All formats finished in {total_seconds:.2f}s wall time")
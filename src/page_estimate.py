@@ -0,0 +1,364 @@
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from ieee_style import (
+    BOTTOM_MARGIN, COLUMN_WIDTH, FONT_NAME, PAGE_HEIGHT, PARAGRAPH_STYLES, TEXT_WIDTH, TOP_MARGIN,
+)
+from markdown_ast import Caption, CodeBlock, Figure, Heading, ListItem, Paragraph, Reference, Table
+from table_layout import CELL_PADDING_TWIPS, column_widths, is_wide, table_width_twips
+
+logger = logging.getLogger(__name__)
+
+POINTS_PER_INCH = 72
+DEFAULT_FONT_SIZE = 10
+# Word's single line spacing for Times is about 1.15 times the font size.
+DEFAULT_LINE_FACTOR = 1.15
+# Bold Times is slightly wider than the regular face when no bold font file is found.
+BOLD_WIDTH_FACTOR = 1.04
+# Height of a figure whose image cannot be read, in points.
+MISSING_FIGURE_HEIGHT = 12
+MAX_MEMO_WORDS = 50000
+
+# Times New Roman or a metric-compatible face, regular then bold.
+FONT_FILES = {
+    'regular': ('Times New Roman.ttf', 'times.ttf', 'Times.ttc', 'LiberationSerif-Regular.ttf',
+                'texgyretermes-regular.otf', 'NimbusRoman-Regular.otf', 'FreeSerif.ttf'),
+    'bold': ('Times New Roman Bold.ttf', 'timesbd.ttf', 'LiberationSerif-Bold.ttf', 'texgyretermes-bold.otf',
+             'NimbusRoman-Bold.otf', 'FreeSerifBold.ttf'),
+}
+FONT_DIRS = ('/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.fonts'),
+             os.path.expanduser('~/.local/share/fonts'), '/Library/Fonts', '/System/Library/Fonts/Supplemental',
+             os.path.expanduser('~/Library/Fonts'), 'C:\\Windows\\Fonts')
+# Adobe Times-Roman advance widths (1/1000 em) for printable ASCII, used when no font file is found.
+TIMES_ROMAN_WIDTHS = dict(zip(
+    ' !"#$%&\'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~',
+    (250, 333, 408, 500, 500, 833, 778, 180, 333, 333, 500, 564, 250, 333, 250, 278) + (500,) * 10
+    + (278, 278, 564, 564, 564, 444, 921, 722, 667, 667, 722, 611, 556, 722, 722, 333, 389, 722, 611, 889,
+       722, 722, 556, 722, 667, 556, 611, 722, 722, 944, 722, 722, 611, 333, 278, 333, 469, 500, 333, 444,
+       500, 444, 500, 444, 333, 500, 500, 278, 278, 500, 278, 778, 500, 500, 500, 500, 333, 389, 278, 500,
+       500, 722, 500, 500, 444, 480, 200, 480, 541),
+))
+TIMES_ROMAN_DEFAULT_WIDTH = 500
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+class FontMetrics:
+    """Advance widths of one face in ems, with a memo of measured words."""
+
+    def __init__(self, widths, default_width, line_factor=DEFAULT_LINE_FACTOR, scale=1.0, source='builtin'):
+        self.widths = widths
+        self.default_width = default_width
+        self.line_factor = line_factor
+        self.scale = scale
+        self.source = source
+        self._words = {}
+
+    @classmethod
+    def from_font_file(cls, path):
+        """Read the cmap and horizontal metrics of a TrueType/OpenType font with fontTools."""
+        from fontTools.ttLib import TTFont
+
+        font = TTFont(path, lazy=True, fontNumber=0)
+        units = font['head'].unitsPerEm
+        advances = font['hmtx'].metrics
+        widths = {chr(code): advances[glyph][0] / units for code, glyph in font.getBestCmap().items()
+                  if glyph in advances}
+        hhea = font['hhea']
+        line_factor = (hhea.ascent - hhea.descent + hhea.lineGap) / units
+        font.close()
+        return cls(widths, widths.get('n', TIMES_ROMAN_DEFAULT_WIDTH / 1000), line_factor, source=path)
+
+    @classmethod
+    def builtin(cls, scale=1.0):
+        widths = {char: width / 1000 for char, width in TIMES_ROMAN_WIDTHS.items()}
+        return cls(widths, TIMES_ROMAN_DEFAULT_WIDTH / 1000, scale=scale)
+
+    def word_width(self, word):
+        """Width of `word` in ems."""
+        width = self._words.get(word)
+        if width is None:
+            get = self.widths.get
+            default = self.default_width
+            width = sum(get(char, default) for char in word) * self.scale
+            if len(self._words) < MAX_MEMO_WORDS:
+                self._words[word] = width
+        return width
+
+
+def find_font_file(kind, font_dirs=FONT_DIRS):
+    """Path of the first installed font named in `FONT_FILES[kind]`, or None."""
+    wanted = {name.lower(): rank for rank, name in enumerate(FONT_FILES[kind])}
+    best = None
+    for font_dir in font_dirs:
+        for root, _, files in os.walk(font_dir):
+            for name in files:
+                rank = wanted.get(name.lower())
+                if rank is not None and (best is None or rank < best[0]):
+                    best = (rank, os.path.join(root, name))
+    return best[1] if best else None
+
+
+def load_metrics(font_path=None, bold_font_path=None):
+    """Regular and bold `FontMetrics`, loaded once per process.
+
+    Font files are looked up in the usual system font directories unless given.
+    Without a usable font file the built-in Adobe Times-Roman widths are used.
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None or font_path or bold_font_path:
+            faces = {}
+            for kind, path in (('regular', font_path), ('bold', bold_font_path)):
+                path = path or os.environ.get(f'IEEE_{kind.upper()}_FONT') or find_font_file(kind)
+                if path:
+                    try:
+                        faces[kind] = FontMetrics.from_font_file(path)
+                    except Exception as e:
+                        logger.warning(f"Could not read font metrics from {path}: {str(e)}")
+            if 'regular' not in faces:
+                logger.info(f"No {FONT_NAME} font file found; estimating with built-in Times-Roman widths.")
+                faces['regular'] = FontMetrics.builtin()
+            faces.setdefault('bold', FontMetrics(faces['regular'].widths, faces['regular'].default_width,
+                                                 faces['regular'].line_factor, BOLD_WIDTH_FACTOR,
+                                                 faces['regular'].source))
+            _metrics = faces
+        return _metrics
+
+
+class _PageFlow:
+    """Stacks block heights onto pages the way Word lays out the generated sections.
+
+    Two-column content is collected until the next single-column block; the continuous
+    section break then balances it across both columns.
+    """
+
+    def __init__(self, page_height):
+        self.page_height = page_height
+        self.pages = 0
+        self.y = 0.0
+        self.column_height = 0.0
+
+    def add_column(self, height):
+        self.column_height += height
+
+    def add_full(self, height, splittable=False):
+        self.flush_columns()
+        if not splittable and self.y > 0 and self.y + height > self.page_height:
+            self.pages += 1
+            self.y = 0.0
+        self.y += height
+        while self.y > self.page_height:
+            self.pages += 1
+            self.y -= self.page_height
+
+    def flush_columns(self):
+        height, self.column_height = self.column_height, 0.0
+        available = 2 * (self.page_height - self.y)
+        if height <= available:
+            self.y += height / 2
+            return
+        height -= available
+        full_pages, rest = divmod(height, 2 * self.page_height)
+        self.pages += 1 + int(full_pages)
+        self.y = rest / 2
+
+    def total(self):
+        self.flush_columns()
+        return self.pages + self.y / self.page_height
+
+
+class PageEstimator:
+    """Predicts the printed length of a parsed paper from font metrics, without rendering it.
+
+    Lines are broken greedily word by word at the 3.5" column (or full text width for
+    the title block, figures and wide tables); paragraph spacing comes from the IEEE
+    styles. Figure heights follow the image's aspect ratio at full text width.
+    """
+
+    def __init__(self, image_source=None, metrics=None):
+        self.image_source = image_source
+        self.metrics = metrics or load_metrics()
+
+    def line_height(self, size):
+        return size * self.metrics['regular'].line_factor
+
+    def count_lines(self, text, width_pt, size, bold=False):
+        """Lines `text` wraps to at `width_pt`, breaking between words."""
+        face = self.metrics['bold' if bold else 'regular']
+        space = face.word_width(' ') * size
+        lines = 1
+        x = 0.0
+        for word in text.split():
+            word_width = face.word_width(word) * size
+            if x and x + space + word_width > width_pt:
+                lines += 1
+                x = 0.0
+            if word_width > width_pt:
+                # Words wider than the line are broken across lines.
+                lines += int(word_width // width_pt)
+                word_width %= width_pt
+            x += (space if x else 0.0) + word_width
+        return lines
+
+    def paragraph_height(self, style_id, text, width_pt):
+        props = PARAGRAPH_STYLES[style_id][1]
+        size = props.get('size', DEFAULT_FONT_SIZE)
+        width_pt -= props.get('indent', 0) * POINTS_PER_INCH
+        lines = self.count_lines(text, width_pt, size, props.get('bold', False)) if text else 1
+        return lines * self.line_height(size) * props.get('line', 1.0) + props.get('before', 0) + props.get('after', 0)
+
+    def table_height(self, table, width_pt):
+        size = PARAGRAPH_STYLES['IEEETableText'][1]['size']
+        widths = [(twips - CELL_PADDING_TWIPS) / 20 for twips in column_widths(table, table_width_twips(table))]
+        height = 0.0
+        for i, row in enumerate(table.rows):
+            lines = max(self.count_lines(cell.replace('**', ''), width, size, bold=i == 0) if cell else 1
+                        for cell, width in zip(row, widths))
+            height += lines * self.line_height(size) + 1
+        return height + 6  # the spacer paragraph after the table
+
+    def figure_height(self, figure):
+        props = PARAGRAPH_STYLES['IEEEFigure'][1]
+        spacing = props.get('before', 0) + props.get('after', 0)
+        if self.image_source is None:
+            return spacing + MISSING_FIGURE_HEIGHT
+        _, source = self.image_source.resolve(figure.path)
+        if source is None:
+            return spacing + MISSING_FIGURE_HEIGHT
+        try:
+            from PIL import Image
+            with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as im:
+                width, height = im.size
+        except Exception:
+            return spacing + MISSING_FIGURE_HEIGHT
+        return spacing + TEXT_WIDTH * POINTS_PER_INCH * height / width
+
+    def front_matter_height(self, frontmatter, full_pt):
+        height = self.paragraph_height('IEEETitle', str(frontmatter.get('title', 'Unknown Title')), full_pt)
+        authors = frontmatter.get('authors', []) or []
+        if authors:
+            cell_pt = full_pt / len(authors)
+            height += max(
+                self.paragraph_height('IEEEAuthor', str(author.get('name', '')), cell_pt)
+                + sum(self.paragraph_height('IEEEAuthorDetail', str(author[key]), cell_pt)
+                      for key in ('role', 'department', 'organization', 'email') if key in author)
+                for author in authors
+            )
+        return height + 6  # the spacer paragraph after the author table
+
+    def estimate(self, paper):
+        """Estimated pages and per-section character counts for a parsed paper.
+
+        Returns a dict with `pages` (fractional), `page_count` (whole pages printed) and
+        `sections`: one entry per top-level heading with its body `chars`, `words` and
+        estimated `pages`.
+        """
+        column_pt = COLUMN_WIDTH * POINTS_PER_INCH
+        full_pt = TEXT_WIDTH * POINTS_PER_INCH
+        page_height = (PAGE_HEIGHT - TOP_MARGIN - BOTTOM_MARGIN) * POINTS_PER_INCH
+        flow = _PageFlow(page_height)
+        flow.add_full(self.front_matter_height(paper.frontmatter, full_pt))
+        for key, label, style_id in (('abstract', 'Abstract—', 'IEEEAbstract'),
+                                     ('index_terms', 'Index Terms—', 'IEEEIndexTerms')):
+            if paper.frontmatter.get(key):
+                flow.add_column(self.paragraph_height(style_id, label + str(paper.frontmatter[key]), column_pt))
+
+        sections = OrderedDict()
+        section = sections.setdefault('(front matter)', {'chars': 0, 'words': 0, 'height': 0.0})
+        for block in paper.blocks:
+            block_type = type(block)
+            column_height = full_height = 0.0
+            if block_type is Paragraph or block_type is ListItem:
+                text = block.text if block_type is Paragraph else f'{block.marker} {block.text}'
+                column_height = self.paragraph_height('IEEEBody' if block_type is Paragraph else 'IEEEListItem',
+                                                      text, column_pt)
+                section['chars'] += len(block.text)
+                section['words'] += len(block.text.split())
+            elif block_type is Heading:
+                if block.level == 1:
+                    section = sections.setdefault(block.text, {'chars': 0, 'words': 0, 'height': 0.0})
+                style_id = 'IEEEHeading1' if block.level == 1 else 'IEEEHeading2'
+                column_height = self.paragraph_height(style_id, block.text, column_pt)
+            elif block_type is Reference:
+                column_height = self.paragraph_height('IEEEReference', block.text, column_pt)
+            elif block_type is CodeBlock:
+                column_height = sum(self.paragraph_height('IEEEEquation', line, column_pt)
+                                    for line in block.lines if line.startswith('CCS ='))
+            elif block_type is Table:
+                if is_wide(block):
+                    full_height = self.table_height(block, full_pt)
+                    flow.add_full(full_height, splittable=True)
+                else:
+                    column_height = self.table_height(block, column_pt)
+            elif block_type is Figure:
+                full_height = self.figure_height(block)
+                flow.add_full(full_height)
+            elif block_type is Caption:
+                full_height = self.paragraph_height('IEEECaption', block.text, full_pt)
+                flow.add_full(full_height)
+            if column_height:
+                flow.add_column(column_height)
+            section['height'] += column_height / 2 + full_height
+
+        pages = flow.total()
+        return {
+            'pages': round(pages, 2),
+            'page_count': max(1, math.ceil(pages - 1e-9)),
+            'font': self.metrics['regular'].source,
+            'sections': [{'heading': heading, 'chars': totals['chars'], 'words': totals['words'],
+                          'pages': round(totals['height'] / page_height, 2)}
+                         for heading, totals in sections.items() if totals['chars'] or totals['height']],
+        }
+
+
+def estimate_paper(paper, image_source=None):
+    """Estimate the printed length of a parsed paper; see `PageEstimator.estimate`."""
+    return PageEstimator(image_source).estimate(paper)
+
+
+def log_estimate(estimate, max_pages=None):
+    budget = f" (budget {max_pages})" if max_pages else ''
+    logger.info(f"Estimated length: {estimate['pages']:.2f} pages, {estimate['page_count']} printed{budget}")
+    for section in estimate['sections']:
+        logger.info(f"  {section['heading'][:40]:<40} {section['chars']:>7} chars {section['words']:>6} words "
+                    f"{section['pages']:>6.2f} pages")
+
+
+def main(argv=None):
+    from generate_ieee_format import DEFAULT_INPUT_FILE, load_paper, setup_logging
+    from image_prep import FileImageSource
+
+    parser = argparse.ArgumentParser(description='Estimate the page count of an IEEE paper without rendering it.')
+    parser.add_argument('-i', '--input', type=str, default=DEFAULT_INPUT_FILE, help='Path to the input markdown file.')
+    parser.add_argument('--max-pages', type=float, help='Exit with status 1 if the estimate exceeds this many pages.')
+    parser.add_argument('--font', type=str, help=f'{FONT_NAME} (or metric-compatible) font file for the metrics.')
+    parser.add_argument('--bold-font', type=str, help='Bold face of --font.')
+    parser.add_argument('--json', action='store_true', help='Print the estimate as JSON.')
+    args = parser.parse_args(argv)
+
+    # With --json, stdout carries the JSON alone; the log goes to stderr.
+    setup_logging(stream=sys.stderr if args.json else None)
+    paper = load_paper(args.input)
+    estimator = PageEstimator(FileImageSource(args.input), load_metrics(args.font, args.bold_font))
+    estimate = estimator.estimate(paper)
+    if args.json:
+        print(json.dumps(estimate, indent=2))
+    else:
+        log_estimate(estimate, args.max_pages)
+    if args.max_pages is not None and estimate['page_count'] > args.max_pages:
+        logger.error(f"{args.input} is estimated at {estimate['pages']:.2f} pages ({estimate['page_count']} printed), "
+                     f"over the {args.max_pages} page budget.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,569 @@
+import math
+import re
+import zlib
+from collections import namedtuple
+
+# A minimal PDF text extractor for the PDFs this project produces (LibreOffice, weasyprint,
+# Word): plain or FlateDecode streams, classic or compressed (object stream) object tables,
+# and fonts mapped to Unicode through /ToUnicode CMaps. It is not a general PDF parser:
+# encrypted files and other stream filters are not supported.
+
+Ref = namedtuple('Ref', 'num')
+
+
+class Name(str):
+    """A PDF name object, e.g. /Font (stored without the slash)."""
+
+
+class Operator(str):
+    """A content-stream operator such as Tj or BT."""
+
+
+DELIMITERS = b'()<>[]{}/%'
+WHITESPACE = b' \t\r\n\f\0'
+NUMBER = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
+OBJECT_HEADER = re.compile(rb'(\d+)\s+(\d+)\s+obj\b')
+REF_TAIL = re.compile(rb'\s+(\d+)\s+R\b')
+INLINE_IMAGE_END = re.compile(rb'\sEI(?=\s|$)')
+ENCRYPTED_TRAILER = re.compile(rb'trailer\s*<<[^%]{0,2000}?/Encrypt\b')
+STRING_ESCAPES = {ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b', ord('f'): b'\f'}
+MAX_FORM_DEPTH = 8
+IDENTITY = (1, 0, 0, 1, 0, 0)
+# A gap wider than this many ems between two strings on a line is a word space.
+WORD_GAP = 0.15
+# Baselines further apart than this many ems are separate lines (superscripts stay on theirs).
+LINE_GAP = 0.5
+
+
+class PdfError(ValueError):
+    pass
+
+
+class Lexer:
+    """Tokenizer shared by object and content-stream parsing."""
+
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+
+    def skip_space(self):
+        data, n = self.data, len(self.data)
+        while self.pos < n:
+            c = data[self.pos]
+            if c in WHITESPACE:
+                self.pos += 1
+            elif c == 0x25:  # % comment
+                end = data.find(b'\n', self.pos)
+                self.pos = n if end < 0 else end + 1
+            else:
+                break
+
+    def _literal_string(self):
+        data, out, depth = self.data, bytearray(), 1
+        self.pos += 1
+        while self.pos < len(data):
+            c = data[self.pos]
+            self.pos += 1
+            if c == 0x5C:  # backslash
+                e = data[self.pos:self.pos + 1]
+                self.pos += 1
+                if not e:
+                    break
+                if e[0] in STRING_ESCAPES:
+                    out += STRING_ESCAPES[e[0]]
+                elif e in b'01234567':
+                    octal = e
+                    while len(octal) < 3 and data[self.pos:self.pos + 1] in (b'0', b'1', b'2', b'3', b'4', b'5', b'6', b'7'):
+                        octal += data[self.pos:self.pos + 1]
+                        self.pos += 1
+                    out.append(int(octal, 8) & 0xFF)
+                elif e == b'\r':
+                    if data[self.pos:self.pos + 1] == b'\n':
+                        self.pos += 1
+                elif e != b'\n':
+                    out += e
+            elif c == 0x28:
+                depth += 1
+                out.append(c)
+            elif c == 0x29:
+                depth -= 1
+                if not depth:
+                    break
+                out.append(c)
+            else:
+                out.append(c)
+        return bytes(out)
+
+    def _hex_string(self):
+        end = self.data.find(b'>', self.pos)
+        if end < 0:
+            end = len(self.data)
+        digits = re.sub(rb'[^0-9A-Fa-f]', b'', self.data[self.pos + 1:end])
+        self.pos = end + 1
+        if len(digits) % 2:
+            digits += b'0'
+        return bytes.fromhex(digits.decode('ascii'))
+
+    def token(self):
+        """Next value or operator; `None` at the end of the data."""
+        self.skip_space()
+        data = self.data
+        if self.pos >= len(data):
+            return None
+        c = data[self.pos:self.pos + 1]
+        if c == b'(':
+            return self._literal_string()
+        if c == b'<':
+            if data[self.pos + 1:self.pos + 2] == b'<':
+                self.pos += 2
+                return self._dict()
+            return self._hex_string()
+        if c == b'[':
+            self.pos += 1
+            items = []
+            while True:
+                self.skip_space()
+                if data[self.pos:self.pos + 1] in (b']', b''):
+                    self.pos += 1
+                    return items
+                items.append(self.token())
+        if c == b'/':
+            start = self.pos = self.pos + 1
+            while self.pos < len(data) and data[self.pos] not in WHITESPACE and data[self.pos] not in DELIMITERS:
+                self.pos += 1
+            name = data[start:self.pos].decode('latin-1')
+            return Name(re.sub(r'#([0-9A-Fa-f]{2})', lambda m: chr(int(m.group(1), 16)), name))
+        if c in (b']', b'>', b')', b'{', b'}'):
+            self.pos += 1
+            return Operator(c.decode('latin-1'))
+
+        match = NUMBER.match(data, self.pos)
+        if match:
+            self.pos = match.end()
+            text = match.group()
+            number = float(text) if b'.' in text else int(text)
+            # `num gen R` indirect reference
+            if isinstance(number, int):
+                ref = REF_TAIL.match(data, self.pos)
+                if ref:
+                    self.pos = ref.end()
+                    return Ref(number)
+            return number
+
+        start = self.pos
+        while self.pos < len(data) and data[self.pos] not in WHITESPACE and data[self.pos] not in DELIMITERS:
+            self.pos += 1
+        if self.pos == start:
+            self.pos += 1
+        word = data[start:self.pos].decode('latin-1')
+        return {'true': True, 'false': False, 'null': None}.get(word, Operator(word))
+
+    def _dict(self):
+        result = {}
+        while True:
+            self.skip_space()
+            if self.data[self.pos:self.pos + 2] == b'>>' or self.pos >= len(self.data):
+                self.pos += 2
+                return result
+            key = self.token()
+            result[key] = self.token()
+
+
+class PdfDocument:
+    """Objects of a PDF file, loaded by scanning for `n g obj` headers."""
+
+    def __init__(self, data):
+        if data[:5] != b'%PDF-':
+            raise PdfError('not a PDF file')
+        self.data = data
+        self.objects = {}
+        self.streams = {}
+        self._scan()
+        self._load_object_streams()
+        if ENCRYPTED_TRAILER.search(data) or any(
+                isinstance(v, dict) and v.get('Type') == 'XRef' and 'Encrypt' in v for v in self.objects.values()):
+            raise PdfError('encrypted PDFs are not supported')
+
+    def _scan(self):
+        data, pos = self.data, 0
+        while True:
+            match = OBJECT_HEADER.search(data, pos)
+            if not match:
+                return
+            num = int(match.group(1))
+            lexer = Lexer(data, match.end())
+            value = lexer.token()
+            lexer.skip_space()
+            pos = lexer.pos
+            if data.startswith(b'stream', pos):
+                start = pos + 6
+                if data[start:start + 2] == b'\r\n':
+                    start += 2
+                elif data[start:start + 1] in (b'\n', b'\r'):
+                    start += 1
+                length = value.get('Length') if isinstance(value, dict) else None
+                if isinstance(length, int) and data.startswith(b'endstream', self._skip_eol(start + length)):
+                    end = start + length
+                else:
+                    end = data.find(b'endstream', start)
+                    if end < 0:
+                        end = len(data)
+                self.streams[num] = (start, end)
+                pos = end
+            self.objects[num] = value
+
+    def _skip_eol(self, pos):
+        while self.data[pos:pos + 1] in (b'\r', b'\n', b' '):
+            pos += 1
+        return pos
+
+    def _load_object_streams(self):
+        for num, value in list(self.objects.items()):
+            if not (isinstance(value, dict) and value.get('Type') == 'ObjStm'):
+                continue
+            data = self.stream(num)
+            if data is None:
+                continue
+            lexer = Lexer(data)
+            header = [lexer.token() for _ in range(2 * self.resolve(value.get('N', 0)))]
+            first = self.resolve(value.get('First', 0))
+            for obj_num, offset in zip(header[::2], header[1::2]):
+                if obj_num not in self.objects:
+                    self.objects[obj_num] = Lexer(data, first + offset).token()
+
+    def resolve(self, value):
+        while isinstance(value, Ref):
+            value = self.objects.get(value.num)
+        return value
+
+    def stream(self, ref):
+        """Decoded bytes of a stream object, or None if its filter isn't supported."""
+        num = ref.num if isinstance(ref, Ref) else ref
+        if num not in self.streams:
+            return None
+        start, end = self.streams[num]
+        raw = self.data[start:end]
+        filters = self.resolve(self.objects[num].get('Filter'))
+        if isinstance(filters, str):
+            filters = [filters]
+        for name in filters or []:
+            if name not in ('FlateDecode', 'Fl'):
+                return None
+            raw = zlib.decompressobj().decompress(raw)
+        return raw
+
+    def pages(self):
+        """Page dictionaries in reading order, with /Resources inherited from the page tree."""
+        catalog = next((v for v in self.objects.values() if isinstance(v, dict) and v.get('Type') == 'Catalog'), None)
+        if catalog is None:
+            raise PdfError('no document catalog')
+        stack = [(self.resolve(catalog.get('Pages')), None)]
+        seen = set()
+        while stack:
+            node, resources = stack.pop()
+            if not isinstance(node, dict) or id(node) in seen:
+                continue
+            seen.add(id(node))
+            resources = node.get('Resources', resources)
+            if node.get('Type') == 'Pages' or 'Kids' in node:
+                kids = self.resolve(node.get('Kids')) or []
+                stack.extend((self.resolve(kid), resources) for kid in reversed(kids))
+            else:
+                yield node, self.resolve(resources) or {}
+
+
+class CMap:
+    """A /ToUnicode CMap: byte codes -> Unicode text."""
+
+    def __init__(self, data):
+        self.code_length = 1
+        self.mapping = {}
+        lengths = [len(lo) for lo, _ in re.findall(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>',
+                                                   b''.join(re.findall(rb'begincodespacerange(.*?)endcodespacerange', data, re.S)))]
+        if lengths:
+            self.code_length = max(1, min(lengths) // 2)
+        for block in re.findall(rb'beginbfchar(.*?)endbfchar', data, re.S):
+            for src, dst in re.findall(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>', block):
+                self.mapping[int(src, 16)] = _utf16(dst)
+        for block in re.findall(rb'beginbfrange(.*?)endbfrange', data, re.S):
+            for lo, hi, dst in re.findall(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f]*>|\[[^\]]*\])', block):
+                lo, hi = int(lo, 16), int(hi, 16)
+                if dst.startswith(b'['):
+                    for code, item in zip(range(lo, hi + 1), re.findall(rb'<([0-9A-Fa-f]*)>', dst)):
+                        self.mapping[code] = _utf16(item)
+                else:
+                    base = dst[1:-1]
+                    start = int(base, 16) if base else 0
+                    width = len(base)
+                    for offset in range(hi - lo + 1):
+                        self.mapping[lo + offset] = _utf16(f'{start + offset:0{width}X}'.encode('ascii'))
+
+    def decode(self, data):
+        n = self.code_length
+        return ''.join(self.mapping.get(int.from_bytes(data[i:i + n], 'big'), '') for i in range(0, len(data), n))
+
+
+def _utf16(hex_digits):
+    try:
+        return bytes.fromhex(hex_digits.decode('ascii')).decode('utf-16-be', 'ignore')
+    except ValueError:
+        return ''
+
+
+class _TextState:
+    """Lines of text, assembled from where on the page each string is drawn.
+
+    Producers differ in how they separate words: some draw the space glyph, some move
+    the next word with `Td`/`Tm`, and some draw every word, and even a hyphen, as its own
+    positioned string. So a space is added only where the gap to the end of the previous
+    string is wider than `WORD_GAP` ems, and a line ends where the baseline moves by more
+    than `LINE_GAP` ems.
+    """
+
+    def __init__(self):
+        self.lines = [[]]
+        self.end = None
+        self.size = 0
+
+    def newline(self):
+        if self.lines[-1]:
+            self.lines.append([])
+
+    def space(self):
+        line = self.lines[-1]
+        if line and not line[-1].endswith(' '):
+            line.append(' ')
+
+    def show(self, text, start, end, size):
+        """Add `text` drawn from the device point `start` to `end` at font size `size`."""
+        if self.end is not None:
+            em = max(size, self.size) or 1
+            dx, dy = start[0] - self.end[0], start[1] - self.end[1]
+            if abs(dy) > LINE_GAP * em:
+                self.newline()
+            elif (dx > WORD_GAP * em or dx < -em) and not text.startswith(' '):
+                self.space()
+        self.lines[-1].append(text)
+        self.end, self.size = end, size
+
+    def text(self):
+        return [''.join(line).strip() for line in self.lines if ''.join(line).strip()]
+
+
+class _GraphicsState:
+    """The parts of the graphics and text state that decide where text is drawn."""
+
+    def __init__(self, font):
+        self.ctm = IDENTITY
+        self.font = font
+        self.size = 0
+        self.char_spacing = 0
+        self.word_spacing = 0
+        self.horizontal_scale = 1
+        self.leading = 0
+        self.rise = 0
+
+    def copy(self):
+        clone = _GraphicsState(self.font)
+        clone.__dict__.update(self.__dict__)
+        return clone
+
+
+class _Font:
+    """Decodes the strings shown with a font and measures how far they advance."""
+
+    def __init__(self, doc, font):
+        self.decode = _font_decoder(doc, font)
+        self.code_length = 1
+        self.widths = {}
+        # Without a width table (the standard 14 fonts), assume half an em per glyph.
+        self.default_width = 500
+        self.scale = 0.001
+        if not isinstance(font, dict):
+            return
+        if font.get('Subtype') == 'Type0':
+            self.code_length = 2
+            descendants = doc.resolve(font.get('DescendantFonts')) or []
+            cid_font = doc.resolve(descendants[0]) if descendants else None
+            if isinstance(cid_font, dict):
+                self.default_width = doc.resolve(cid_font.get('DW', 1000))
+                self.widths = _cid_widths(doc.resolve(cid_font.get('W')) or [])
+            return
+        widths = doc.resolve(font.get('Widths'))
+        if isinstance(widths, list):
+            first = doc.resolve(font.get('FirstChar', 0))
+            self.widths = {first + i: doc.resolve(width) for i, width in enumerate(widths)}
+            descriptor = doc.resolve(font.get('FontDescriptor'))
+            self.default_width = doc.resolve(descriptor.get('MissingWidth', 0)) if isinstance(descriptor, dict) else 0
+        matrix = doc.resolve(font.get('FontMatrix'))
+        if font.get('Subtype') == 'Type3' and isinstance(matrix, list) and matrix:
+            self.scale = matrix[0]
+
+    def advance(self, data, gs):
+        """Horizontal displacement, in text space, of showing the string `data`."""
+        n = self.code_length
+        total = 0.0
+        for i in range(0, len(data), n):
+            code = int.from_bytes(data[i:i + n], 'big')
+            width = self.widths.get(code, self.default_width)
+            total += (width if isinstance(width, (int, float)) else 0) * self.scale * gs.size + gs.char_spacing
+            if n == 1 and code == 32:
+                total += gs.word_spacing
+        return total * gs.horizontal_scale
+
+
+def _cid_widths(w):
+    """The /W array of a CID font (`c [w1 w2 ...]` and `c_first c_last w` entries) as a dict."""
+    widths, i = {}, 0
+    while i + 1 < len(w):
+        if isinstance(w[i + 1], list):
+            widths.update((w[i] + k, width) for k, width in enumerate(w[i + 1]))
+            i += 2
+        elif i + 2 < len(w) and all(isinstance(v, (int, float)) for v in w[i:i + 3]):
+            widths.update((code, w[i + 2]) for code in range(int(w[i]), int(w[i + 1]) + 1))
+            i += 3
+        else:
+            break
+    return widths
+
+
+def _multiply(m, n):
+    """The product of two PDF matrices `[a b c d e f]`: `m` applied first, then `n`."""
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (a * a2 + b * c2, a * b2 + b * d2, c * a2 + d * c2, c * b2 + d * d2,
+            e * a2 + f * c2 + e2, e * b2 + f * d2 + f2)
+
+
+def _translate(tx, ty, m):
+    return _multiply((1, 0, 0, 1, tx, ty), m)
+
+
+def _numbers(operands, count):
+    values = operands[-count:]
+    return values if len(values) == count and all(isinstance(v, (int, float)) for v in values) else None
+
+
+def _run_content(doc, content, resources, state, gs, depth=0):
+    fonts = doc.resolve(resources.get('Font')) or {}
+    xobjects = doc.resolve(resources.get('XObject')) or {}
+    loaded = {}
+    saved = []
+    tm = tlm = IDENTITY
+    lexer = Lexer(content)
+    operands = []
+
+    def show(data):
+        nonlocal tm
+        matrix = _multiply(tm, gs.ctm)
+        start = (gs.rise * matrix[2] + matrix[4], gs.rise * matrix[3] + matrix[5])
+        tm = _translate(gs.font.advance(data, gs), 0, tm)
+        end_matrix = _multiply(tm, gs.ctm)
+        end = (gs.rise * end_matrix[2] + end_matrix[4], gs.rise * end_matrix[3] + end_matrix[5])
+        state.show(gs.font.decode(data), start, end, abs(gs.size) * math.hypot(matrix[2], matrix[3]))
+
+    while True:
+        tok = lexer.token()
+        if tok is None:
+            break
+        if not isinstance(tok, Operator):
+            operands.append(tok)
+            continue
+        op = str(tok)
+        if op == 'q':
+            saved.append(gs.copy())
+        elif op == 'Q':
+            if saved:
+                gs = saved.pop()
+        elif op == 'cm':
+            matrix = _numbers(operands, 6)
+            if matrix:
+                gs.ctm = _multiply(tuple(matrix), gs.ctm)
+        elif op == 'BT':
+            tm = tlm = IDENTITY
+        elif op == 'Tf' and len(operands) >= 2 and isinstance(operands[-2], Name):
+            name = operands[-2]
+            if name not in loaded:
+                loaded[name] = _Font(doc, doc.resolve(fonts.get(name)))
+            gs.font = loaded[name]
+            gs.size = operands[-1] if isinstance(operands[-1], (int, float)) else gs.size
+        elif op in ('Tc', 'Tw', 'Tz', 'TL', 'Ts') and _numbers(operands, 1):
+            value = operands[-1]
+            if op == 'Tc':
+                gs.char_spacing = value
+            elif op == 'Tw':
+                gs.word_spacing = value
+            elif op == 'Tz':
+                gs.horizontal_scale = value / 100
+            elif op == 'TL':
+                gs.leading = value
+            else:
+                gs.rise = value
+        elif op in ('Td', 'TD'):
+            move = _numbers(operands, 2)
+            if move:
+                if op == 'TD':
+                    gs.leading = -move[1]
+                tm = tlm = _translate(move[0], move[1], tlm)
+        elif op == 'Tm':
+            matrix = _numbers(operands, 6)
+            if matrix:
+                tm = tlm = tuple(matrix)
+        elif op == 'T*':
+            tm = tlm = _translate(0, -gs.leading, tlm)
+        elif op == 'Tj' and operands and isinstance(operands[-1], bytes):
+            show(operands[-1])
+        elif op == 'TJ' and operands and isinstance(operands[-1], list):
+            for item in operands[-1]:
+                if isinstance(item, bytes):
+                    show(item)
+                elif isinstance(item, (int, float)):
+                    tm = _translate(-item / 1000 * gs.size * gs.horizontal_scale, 0, tm)
+        elif op in ("'", '"') and operands and isinstance(operands[-1], bytes):
+            if op == '"' and _numbers(operands[:-1], 2):
+                gs.word_spacing, gs.char_spacing = operands[-3], operands[-2]
+            tm = tlm = _translate(0, -gs.leading, tlm)
+            show(operands[-1])
+        elif op == 'ID':
+            # Inline image data runs up to `EI`.
+            end = INLINE_IMAGE_END.search(lexer.data, lexer.pos)
+            lexer.pos = end.end() if end else len(lexer.data)
+        elif op == 'Do' and operands and isinstance(operands[-1], Name) and depth < MAX_FORM_DEPTH:
+            ref = xobjects.get(operands[-1])
+            form = doc.resolve(ref)
+            if isinstance(form, dict) and form.get('Subtype') == 'Form' and isinstance(ref, Ref):
+                data = doc.stream(ref)
+                if data is not None:
+                    inner = gs.copy()
+                    matrix = doc.resolve(form.get('Matrix'))
+                    if isinstance(matrix, list) and _numbers(matrix, 6):
+                        inner.ctm = _multiply(tuple(matrix), inner.ctm)
+                    _run_content(doc, data, doc.resolve(form.get('Resources')) or resources, state, inner, depth + 1)
+        operands = []
+
+
+def _font_decoder(doc, font):
+    if isinstance(font, dict):
+        to_unicode = font.get('ToUnicode')
+        if isinstance(to_unicode, Ref):
+            data = doc.stream(to_unicode)
+            if data:
+                return CMap(data).decode
+        if font.get('Subtype') == 'Type0':
+            # Two-byte glyph ids without a Unicode map can't be turned into text.
+            return lambda s: ''
+    return lambda s: s.decode('cp1252', 'replace')
+
+
+def iter_pdf_text(pdf_path):
+    """Yield the text lines of each page of a PDF, with a `--- Page N ---` line before each page."""
+    with open(pdf_path, 'rb') as f:
+        doc = PdfDocument(f.read())
+    for number, (page, resources) in enumerate(doc.pages(), start=1):
+        contents = doc.resolve(page.get('Contents'))
+        refs = contents if isinstance(contents, list) else [page.get('Contents')]
+        chunks = [doc.stream(ref) for ref in refs if isinstance(ref, Ref)]
+        state = _TextState()
+        _run_content(doc, b'\n'.join(c for c in chunks if c), resources, state, _GraphicsState(_Font(doc, None)))
+        yield f"--- Page {number} ---"
+        yield from state.text()
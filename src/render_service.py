@@ -0,0 +1,576 @@
+import argparse
+import base64
+import binascii
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from batch_generate import render_one
+from build_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from generate_ieee_format import BACKENDS, logger, pdf_path_for, setup_logging
+from soffice_pool import SofficePool
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_JOB_TIMEOUT = 120
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_RESULT_TTL = 3600
+DEFAULT_MAX_REQUEST_BYTES = 64 * 1024 * 1024
+MAX_WAIT_SECONDS = 300
+STARTUP_TIMEOUT = 60
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'pdf': 'application/pdf',
+}
+
+
+class WorkerError(RuntimeError):
+    """A render worker timed out or died; it is replaced by a fresh one before its next job."""
+
+
+def _worker_main(conn, template=None):
+    """Worker process loop: render job dicts received over `conn` until told to stop.
+
+    The generator loads python-docx, lxml, yaml and Pillow lazily; the worker imports
+    them and builds the base document for `template` before reporting ready, so every
+    job runs in a warm interpreter.
+    """
+    setup_logging()
+    import docx_render, docx_stream, yaml, PIL.Image  # noqa: F401
+    docx_render.base_document(template)
+    docx_stream.load_template_parts(template)
+    conn.send('ready')
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        conn.send(render_one(**job))
+
+
+class RenderWorker:
+    """One pre-warmed generator process that renders a job at a time over a pipe."""
+
+    def __init__(self, ctx, name, template=None):
+        self.ctx = ctx
+        self.name = name
+        self.template = template
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=_worker_main, args=(child_conn, self.template), name=self.name, daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        try:
+            ready = self.conn.poll(STARTUP_TIMEOUT) and self.conn.recv() == 'ready'
+        except (EOFError, OSError):
+            # The process died while warming up, e.g. on an unreadable template.
+            ready = False
+        if not ready:
+            self.kill()
+            raise RuntimeError(f"render worker {self.name} did not start within {STARTUP_TIMEOUT}s")
+        logger.info(f"Render worker {self.name} ready (pid {self.process.pid})")
+
+    def render(self, job, timeout):
+        """Run one job; kill and restart the process if it exceeds `timeout` or crashes.
+
+        A worker whose restart failed is started again before its next job, so one
+        failed restart costs that job rather than every job after it.
+        """
+        if self.process is None:
+            self.start()
+        try:
+            self.conn.send(job)
+            if self.conn.poll(timeout):
+                return self.conn.recv()
+            reason = f"timed out after {timeout:g}s"
+        except (EOFError, OSError) as e:
+            reason = f"worker crashed: {str(e) or type(e).__name__}"
+        logger.warning(f"Render worker {self.name} {reason}; restarting it")
+        self.kill()
+        try:
+            self.start()
+        except RuntimeError as e:
+            logger.error(f"{str(e)}; retrying before its next job")
+        raise WorkerError(reason)
+
+    def kill(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except OSError:
+            pass
+        self.kill()
+
+
+class Job:
+    """A submitted paper: its working directory, lifecycle state and result files."""
+
+    def __init__(self, job_dir, backend, convert_pdf, timeout):
+        self.id = os.path.basename(job_dir)
+        self.dir = job_dir
+        self.input = os.path.join(job_dir, 'paper.md')
+        self.output = os.path.join(job_dir, 'paper.docx')
+        self.backend = backend
+        self.convert_pdf = convert_pdf
+        self.timeout = timeout
+        self.status = 'queued'
+        self.error = None
+        self.pdf_error = None
+        self.cache = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+        self.done.set()
+
+    def result_path(self, fmt):
+        path = self.output if fmt == 'docx' else pdf_path_for(self.output)
+        return path if self.status == 'done' and os.path.exists(path) else None
+
+    def to_dict(self):
+        record = {
+            'id': self.id,
+            'status': self.status,
+            'backend': self.backend,
+            'pdf': self.convert_pdf,
+            'created': self.created,
+            'queued_seconds': round((self.started or time.time()) - self.created, 3),
+            'error': self.error,
+        }
+        if self.started is not None:
+            record['render_seconds'] = round((self.finished or time.time()) - self.started, 3)
+        if self.cache is not None:
+            record['cache'] = self.cache
+        if self.pdf_error:
+            record['pdf_error'] = self.pdf_error
+        record['results'] = {fmt: f'/jobs/{self.id}/result?format={fmt}'
+                             for fmt in CONTENT_TYPES if self.result_path(fmt)}
+        return record
+
+
+def _safe_relative_path(name):
+    """Validate an attached image path so it stays inside the job directory."""
+    path = os.path.normpath(name.replace('\\', '/'))
+    if not name or os.path.isabs(path) or path == '.' or path.split(os.sep)[0] == '..':
+        raise ValueError(f"invalid image path: {name!r}")
+    return path
+
+
+class RenderService:
+    """Bounded job queue in front of a pool of warm render workers.
+
+    `submit` raises `queue.Full` when the queue is at capacity so callers can push back
+    on clients instead of piling up work. With a `pdf_pool`, workers only build the DOCX
+    and the shared LibreOffice pool converts it, as in batch mode. Every paper is based
+    on `template` (a `.docx`/`.dotx` path), which each worker loads once at startup.
+    """
+
+    def __init__(self, workers=2, queue_size=DEFAULT_QUEUE_SIZE, job_timeout=DEFAULT_JOB_TIMEOUT,
+                 work_dir=None, cache_options=None, pdf_pool=None, result_ttl=DEFAULT_RESULT_TTL, template=None):
+        self.job_timeout = job_timeout
+        self.template = template
+        self.cache_options = cache_options
+        self.pdf_pool = pdf_pool
+        self.result_ttl = result_ttl
+        self._own_work_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='ieee-render-')
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = {}
+        self._lock = threading.Lock()
+        ctx = multiprocessing.get_context('spawn')
+        self.workers = [RenderWorker(ctx, f'render-worker-{i}', template) for i in range(workers)]
+        self._threads = []
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+            thread = threading.Thread(target=self._serve, args=(worker,), name=worker.name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self):
+        """Cancel queued jobs, let running ones finish, then stop the workers."""
+        with self._lock:
+            for job in self.jobs.values():
+                if job.status == 'queued':
+                    job.finish('cancelled', 'service shut down')
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        for worker in self.workers:
+            worker.stop()
+        if self._own_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def submit(self, payload):
+        """Queue a paper from a request payload and return its Job.
+
+        The payload holds `markdown` text, optional `images` mapping the paths used in the
+        Markdown to base64 data, and optional `backend`, `pdf` and `timeout` settings.
+        """
+        markdown = payload.get('markdown')
+        if not isinstance(markdown, str) or not markdown.strip():
+            raise ValueError("'markdown' must be a non-empty string")
+        backend = payload.get('backend', 'python-docx')
+        if backend not in BACKENDS:
+            raise ValueError(f"'backend' must be one of {', '.join(BACKENDS)}")
+        timeout = payload.get('timeout', self.job_timeout)
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise ValueError("'timeout' must be a positive number of seconds")
+        images = payload.get('images') or {}
+        if not isinstance(images, dict):
+            raise ValueError("'images' must map image paths to base64 data")
+        decoded = {}
+        for name, data in images.items():
+            try:
+                decoded[_safe_relative_path(name)] = base64.b64decode(data, validate=True)
+            except (binascii.Error, TypeError):
+                raise ValueError(f"image {name!r} is not valid base64")
+
+        self._reap()
+        job = Job(os.path.join(self.work_dir, uuid.uuid4().hex), backend, bool(payload.get('pdf', False)),
+                  min(timeout, self.job_timeout))
+        os.makedirs(job.dir)
+        with open(job.input, 'w', encoding='utf-8') as f:
+            f.write(markdown)
+        for path, data in decoded.items():
+            target = os.path.join(job.dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            shutil.rmtree(job.dir, ignore_errors=True)
+            raise
+        with self._lock:
+            self.jobs[job.id] = job
+        logger.info(f"Queued render job {job.id} ({len(decoded)} images, queue depth {self.queue.qsize()})")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet; returns False once it is running or finished."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return False
+            job.finish('cancelled')
+        return True
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            'workers': len(self.workers),
+            'queue_depth': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'jobs': counts,
+        }
+
+    def _reap(self):
+        """Forget finished jobs older than `result_ttl` and delete their files."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job for job in self.jobs.values() if job.finished is not None and job.finished < cutoff]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.dir, ignore_errors=True)
+
+    def _serve(self, worker):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            with self._lock:
+                if job.status != 'queued':
+                    continue
+                job.status = 'running'
+                job.started = time.time()
+            try:
+                self._render(worker, job)
+            except Exception as e:
+                logger.error(f"Render job {job.id} failed: {str(e)}")
+                job.finish('failed', str(e))
+
+    def _render(self, worker, job):
+        deadline = job.started + job.timeout
+        result = worker.render({
+            'input_file': job.input,
+            'output_file': job.output,
+            'convert_pdf': job.convert_pdf and self.pdf_pool is None,
+            'cache_options': self.cache_options,
+            'backend': job.backend,
+            'template': self.template,
+            # Figures and `.bib` files named in the Markdown must be among the job's own files.
+            'root': job.dir,
+        }, job.timeout)
+        job.cache = result.get('cache')
+        if result['status'] != 'ok':
+            job.finish('failed', result['error'])
+            return
+        pdf_file = pdf_path_for(job.output)
+        if job.convert_pdf and self.pdf_pool is not None and not os.path.exists(pdf_file):
+            try:
+                self.pdf_pool.submit(job.output, pdf_file).result(timeout=max(deadline - time.time(), 0))
+            except Exception as e:
+                job.pdf_error = str(e) or type(e).__name__
+        if job.convert_pdf and not os.path.exists(pdf_file) and not job.pdf_error:
+            job.pdf_error = 'no PDF converter available'
+        logger.info(f"Render job {job.id} done in {time.time() - job.started:.2f}s")
+        job.finish('done')
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """JSON API over a `RenderService`; see the README for the endpoints."""
+
+    server_version = 'IEEERenderService/1.0'
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {'error': message}, headers)
+
+    def _send_file(self, path, fmt, job_id):
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', CONTENT_TYPES[fmt])
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('Content-Disposition', f'attachment; filename="{job_id}.{fmt}"')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    def _read_payload(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > self.server.max_request_bytes:
+            self.close_connection = True
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                             f"request body exceeds {self.server.max_request_bytes} bytes")
+            return None
+        try:
+            payload = json.loads(self.rfile.read(length) or b'null')
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, f"invalid JSON: {str(e)}")
+            return None
+        if not isinstance(payload, dict):
+            self._send_error(HTTPStatus.BAD_REQUEST, 'request body must be a JSON object')
+            return None
+        return payload
+
+    def _submit(self):
+        payload = self._read_payload()
+        if payload is None:
+            return None
+        try:
+            return self.service.submit(payload)
+        except ValueError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        except queue.Full:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, 'render queue is full, retry later',
+                             {'Retry-After': '5'})
+        return None
+
+    def _job(self, job_id):
+        job = self.service.get(job_id)
+        if job is None:
+            self._send_error(HTTPStatus.NOT_FOUND, f"unknown job {job_id}")
+        return job
+
+    def _wait(self, job, query):
+        """Long-poll: block until the job finishes or `?wait=` seconds pass."""
+        try:
+            seconds = min(float(query.get('wait', ['0'])[0]), MAX_WAIT_SECONDS)
+        except ValueError:
+            seconds = 0
+        if seconds > 0:
+            job.done.wait(seconds)
+
+    def _send_result(self, job, fmt):
+        if fmt not in CONTENT_TYPES:
+            self._send_error(HTTPStatus.BAD_REQUEST, f"format must be one of {', '.join(CONTENT_TYPES)}")
+        elif job.status in ('queued', 'running'):
+            self._send_error(HTTPStatus.CONFLICT, f"job is {job.status}", {'Retry-After': '1'})
+        elif job.status != 'done':
+            self._send_json(HTTPStatus.UNPROCESSABLE_ENTITY, job.to_dict())
+        elif job.result_path(fmt) is None:
+            self._send_error(HTTPStatus.NOT_FOUND, job.pdf_error or f"job has no {fmt} result")
+        else:
+            self._send_file(job.result_path(fmt), fmt, job.id)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['health']:
+            self._send_json(HTTPStatus.OK, {'status': 'ok', **self.service.stats()})
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self._job(parts[1])
+            if job is not None:
+                self._wait(job, query)
+                self._send_json(HTTPStatus.OK, job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+            job = self._job(parts[1])
+            if job is not None:
+                self._wait(job, query)
+                self._send_result(job, query.get('format', ['docx'])[0])
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f"no route for GET {url.path}")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/jobs':
+            job = self._submit()
+            if job is not None:
+                self._send_json(HTTPStatus.ACCEPTED, job.to_dict(), {'Location': f'/jobs/{job.id}'})
+        elif url.path == '/render':
+            # Synchronous convenience endpoint: queue the job and stream the result once ready.
+            job = self._submit()
+            if job is not None:
+                job.done.wait()
+                self._send_result(job, query.get('format', ['docx'])[0])
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f"no route for POST {url.path}")
+
+    def do_DELETE(self):
+        parts = [part for part in urlsplit(self.path).path.split('/') if part]
+        if len(parts) != 2 or parts[0] != 'jobs':
+            self._send_error(HTTPStatus.NOT_FOUND, f"no route for DELETE {self.path}")
+            return
+        job = self._job(parts[1])
+        if job is None:
+            return
+        if self.service.cancel(job.id):
+            self._send_json(HTTPStatus.OK, job.to_dict())
+        else:
+            self._send_error(HTTPStatus.CONFLICT, f"job is {job.status} and can no longer be cancelled")
+
+
+class RenderHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, max_request_bytes=DEFAULT_MAX_REQUEST_BYTES):
+        self.service = service
+        self.max_request_bytes = max_request_bytes
+        super().__init__(address, RenderRequestHandler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve IEEE paper rendering over HTTP on a pool of warm workers.')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='Interface to bind.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on.')
+    parser.add_argument('-j', '--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Number of warm render worker processes.')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='Queued jobs accepted before new submissions get 503.')
+    parser.add_argument('--job-timeout', type=float, default=DEFAULT_JOB_TIMEOUT,
+                        help='Maximum seconds a job may render before its worker is restarted.')
+    parser.add_argument('--result-ttl', type=int, default=DEFAULT_RESULT_TTL,
+                        help='Seconds finished jobs and their files are kept.')
+    parser.add_argument('--max-request-mb', type=int, default=DEFAULT_MAX_REQUEST_BYTES // (1024 * 1024),
+                        help='Largest accepted request body in MiB.')
+    parser.add_argument('--work-dir', type=str, help='Directory for job files (default: a temporary directory).')
+    parser.add_argument('--soffice-pool', type=int, default=0, metavar='N',
+                        help='Convert PDFs on N warm LibreOffice instances instead of one soffice spawn per paper.')
+    parser.add_argument('--template', type=str,
+                        help='Word template (.dotx or .docx) whose styles, theme and headers every DOCX is based on.')
+    parser.add_argument('--no-cache', action='store_true', help='Always rebuild, ignoring the build cache.')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='Directory of the build cache.')
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help='Build cache size limit in MiB.')
+
+    args = parser.parse_args()
+    if args.workers < 1 or args.queue_size < 1:
+        parser.error('--workers and --queue-size must be at least 1')
+    if args.template is not None and not os.path.isfile(args.template):
+        parser.error(f'--template: {args.template} not found')
+
+    setup_logging()
+    pdf_pool = None
+    if args.soffice_pool > 0:
+        pdf_pool = SofficePool(size=args.soffice_pool, job_timeout=args.job_timeout)
+        pdf_pool.start()
+        if not pdf_pool.running:
+            # No LibreOffice: convert with Word (docx2pdf) per paper instead.
+            pdf_pool = None
+    cache_options = None if args.no_cache else {'cache_dir': args.cache_dir, 'max_bytes': args.cache_size_mb * 1024 * 1024}
+    service = RenderService(workers=args.workers, queue_size=args.queue_size, job_timeout=args.job_timeout,
+                            work_dir=args.work_dir, cache_options=cache_options, pdf_pool=pdf_pool,
+                            result_ttl=args.result_ttl, template=args.template)
+    try:
+        with service:
+            server = RenderHTTPServer((args.host, args.port), service, args.max_request_mb * 1024 * 1024)
+            logger.info(f"Render service listening on http://{args.host}:{args.port} with {args.workers} workers")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                logger.info("Shutting down render service")
+            finally:
+                server.server_close()
+    finally:
+        if pdf_pool is not None:
+            pdf_pool.close()
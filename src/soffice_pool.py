@@ -0,0 +1,310 @@
+import logging
+import os
+import pathlib
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+ConversionResult = namedtuple('ConversionResult', ['pdf_path', 'seconds', 'backend'])
+
+DEFAULT_JOB_TIMEOUT = 120
+DEFAULT_STARTUP_TIMEOUT = 30
+
+
+def _import_uno():
+    """Import LibreOffice's Python-UNO bridge, returning None when it is not installed."""
+    try:
+        import uno
+        return uno
+    except ImportError:
+        return None
+
+
+def _pdf_path_for(docx_path):
+    """Default PDF path next to the DOCX file."""
+    return os.path.splitext(docx_path)[0] + '.pdf'
+
+
+def soffice_command(docx_path, out_dir, profile_dir=None):
+    """Command line for a one-shot headless `soffice --convert-to pdf`."""
+    cmd = ['soffice', '--headless']
+    if profile_dir:
+        # A private profile lets several spawned converters run side by side.
+        cmd.append(f'-env:UserInstallation={pathlib.Path(profile_dir).as_uri()}')
+    cmd += ['--convert-to', 'pdf', '--outdir', out_dir, docx_path]
+    return cmd
+
+
+def soffice_output_path(docx_path, out_dir):
+    """Where `soffice --convert-to pdf --outdir out_dir` writes its result."""
+    return os.path.join(out_dir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+
+
+def convert_with_soffice(docx_path, pdf_path=None, profile_dir=None, timeout=None):
+    """Convert one DOCX to PDF by spawning a fresh headless LibreOffice process."""
+    abs_in = os.path.abspath(docx_path)
+    abs_out = os.path.abspath(pdf_path or _pdf_path_for(docx_path))
+    out_dir = os.path.dirname(abs_out)
+    subprocess.run(soffice_command(abs_in, out_dir, profile_dir), check=True, timeout=timeout,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    produced = soffice_output_path(abs_in, out_dir)
+    if produced != abs_out:
+        os.replace(produced, abs_out)
+    return abs_out
+
+
+class SofficeInstance:
+    """One warm headless LibreOffice process reachable over a UNO pipe."""
+
+    def __init__(self, uno, name, startup_timeout=DEFAULT_STARTUP_TIMEOUT):
+        self.uno = uno
+        self.name = name
+        self.startup_timeout = startup_timeout
+        self.profile_dir = tempfile.mkdtemp(prefix=f'{name}-profile-')
+        self.process = None
+        self.desktop = None
+
+    def _property(self, name, value):
+        prop = self.uno.createUnoStruct('com.sun.star.beans.PropertyValue')
+        prop.Name = name
+        prop.Value = value
+        return prop
+
+    def start(self):
+        """Launch soffice with a UNO listener and wait until the desktop service answers."""
+        connection = f'pipe,name={self.name};urp;StarOffice.ComponentContext'
+        self.process = subprocess.Popen(
+            ['soffice', '--headless', '--invisible', '--nologo', '--norestore', '--nodefault', '--nolockcheck',
+             f'-env:UserInstallation={pathlib.Path(self.profile_dir).as_uri()}', f'--accept={connection}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        local_ctx = self.uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local_ctx)
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"soffice instance {self.name} exited during startup with code {self.process.returncode}")
+            try:
+                ctx = resolver.resolve(f'uno:{connection}')
+                break
+            except Exception:
+                # NoConnectException until the listener is up.
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise TimeoutError(f"soffice instance {self.name} did not accept connections within {self.startup_timeout}s")
+                time.sleep(0.25)
+        self.desktop = ctx.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', ctx)
+        logger.info(f"Started warm LibreOffice instance {self.name} (pid {self.process.pid})")
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None and self.desktop is not None
+
+    def convert(self, docx_path, pdf_path):
+        """Load the DOCX into the running instance and export it with the Writer PDF filter."""
+        doc = self.desktop.loadComponentFromURL(
+            self.uno.systemPathToFileUrl(docx_path), '_blank', 0, (self._property('Hidden', True),)
+        )
+        if doc is None:
+            raise RuntimeError(f"LibreOffice could not open {docx_path}")
+        try:
+            doc.storeToURL(self.uno.systemPathToFileUrl(pdf_path), (self._property('FilterName', 'writer_pdf_Export'),))
+        finally:
+            doc.close(True)
+
+    def kill(self):
+        """Hard-kill the process; used by the job timeout to unblock a stuck UNO call."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+
+    def stop(self):
+        self.desktop = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def restart(self):
+        logger.warning(f"Restarting LibreOffice instance {self.name}")
+        self.stop()
+        self.start()
+
+    def cleanup(self):
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class SofficePool:
+    """Queue of DOCX -> PDF jobs served by warm soffice instances.
+
+    If the UNO bridge is unavailable, or no instance starts, the pool keeps the same
+    queue/worker interface but each worker spawns `soffice --convert-to` per job with its
+    own profile directory. Without `soffice` on PATH the pool starts no workers at all
+    (`running` is False) and fails every submitted job at once; submitting to a pool that
+    was not started, or was closed, raises RuntimeError.
+    """
+
+    def __init__(self, size=1, job_timeout=DEFAULT_JOB_TIMEOUT, startup_timeout=DEFAULT_STARTUP_TIMEOUT, max_retries=1):
+        self.size = max(1, size)
+        self.job_timeout = job_timeout
+        self.startup_timeout = startup_timeout
+        self.max_retries = max_retries
+        self.jobs = queue.Queue()
+        self.instances = []
+        self.threads = []
+        self.available = False
+        self.soffice_missing = False
+        self._spawn_profiles = []
+
+    @property
+    def running(self):
+        """True once `start` has started workers that can take jobs."""
+        return bool(self.threads)
+
+    def start(self):
+        """Start the instances and worker threads. Returns True if warm instances are in use."""
+        if not shutil.which('soffice'):
+            # Spawn workers could only fail every job; callers fall back to their other converters.
+            logger.warning("soffice not found on PATH; the LibreOffice pool cannot start.")
+            self.soffice_missing = True
+            return False
+        uno = _import_uno()
+        if uno is None:
+            logger.warning("LibreOffice Python-UNO bridge (uno) not importable; falling back to one soffice spawn per PDF.")
+        else:
+            for index in range(self.size):
+                instance = SofficeInstance(uno, f'ieee_soffice_{os.getpid()}_{index}', self.startup_timeout)
+                try:
+                    instance.start()
+                    self.instances.append(instance)
+                except Exception as e:
+                    logger.warning(f"Could not start LibreOffice instance {instance.name}: {str(e)}")
+                    instance.cleanup()
+        self.available = bool(self.instances)
+
+        if self.available:
+            workers = [(self._serve_warm, instance) for instance in self.instances]
+        else:
+            logger.warning("LibreOffice pool unavailable; using per-call soffice spawn.")
+            self._spawn_profiles = [tempfile.mkdtemp(prefix='ieee-soffice-spawn-') for _ in range(self.size)]
+            workers = [(self._serve_spawn, profile) for profile in self._spawn_profiles]
+        for target, arg in workers:
+            thread = threading.Thread(target=target, args=(arg,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self.available
+
+    def submit(self, docx_path, pdf_path=None):
+        """Queue a conversion and return a Future resolving to a ConversionResult.
+
+        Raises RuntimeError if the pool was never started or is closed, since no worker would take the job.
+        """
+        future = Future()
+        if self.soffice_missing:
+            future.set_exception(RuntimeError("soffice is not installed; the LibreOffice pool has no workers"))
+            return future
+        if not self.running:
+            raise RuntimeError("the LibreOffice pool is not running; call start() before submitting jobs")
+        self.jobs.put((future, os.path.abspath(docx_path), os.path.abspath(pdf_path or _pdf_path_for(docx_path))))
+        return future
+
+    def convert(self, docx_path, pdf_path=None):
+        """Blocking conversion through the pool."""
+        return self.submit(docx_path, pdf_path).result()
+
+    def _next_job(self):
+        """The next job that was not cancelled, or None once the pool is closing."""
+        while True:
+            job = self.jobs.get()
+            if job is None or job[0].set_running_or_notify_cancel():
+                return job
+
+    def _serve_warm(self, instance):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            future, docx_path, pdf_path = job
+            start = time.perf_counter()
+            try:
+                backend = self._convert_warm(instance, docx_path, pdf_path)
+                future.set_result(ConversionResult(pdf_path, round(time.perf_counter() - start, 3), backend))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _convert_warm(self, instance, docx_path, pdf_path):
+        for attempt in range(self.max_retries + 1):
+            if not instance.alive():
+                try:
+                    instance.restart()
+                except Exception as e:
+                    logger.error(f"LibreOffice instance {instance.name} failed to restart: {str(e)}")
+                    convert_with_soffice(docx_path, pdf_path, profile_dir=instance.profile_dir, timeout=self.job_timeout)
+                    return 'spawn'
+
+            timed_out = threading.Event()
+
+            def on_timeout():
+                timed_out.set()
+                instance.kill()
+
+            timer = threading.Timer(self.job_timeout, on_timeout)
+            timer.start()
+            try:
+                instance.convert(docx_path, pdf_path)
+                return 'pool'
+            except Exception as e:
+                instance.stop()
+                if timed_out.is_set():
+                    raise TimeoutError(f"PDF conversion of {docx_path} exceeded {self.job_timeout}s")
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"LibreOffice instance {instance.name} crashed on {docx_path}: {str(e)}; retrying")
+            finally:
+                timer.cancel()
+
+    def _serve_spawn(self, profile_dir):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            future, docx_path, pdf_path = job
+            start = time.perf_counter()
+            try:
+                convert_with_soffice(docx_path, pdf_path, profile_dir=profile_dir, timeout=self.job_timeout)
+                future.set_result(ConversionResult(pdf_path, round(time.perf_counter() - start, 3), 'spawn'))
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self):
+        """Drain the workers and shut down every soffice instance."""
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        for instance in self.instances:
+            instance.cleanup()
+        self.instances = []
+        for profile in self._spawn_profiles:
+            shutil.rmtree(profile, ignore_errors=True)
+        self._spawn_profiles = []
+        self.available = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
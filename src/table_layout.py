@@ -0,0 +1,96 @@
+from ieee_style import COLUMN_WIDTH, TEXT_WIDTH, twips
+
+TABLE_STYLE_ID = 'LightGrid-Accent1'
+TABLE_LOOK = ('<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0"'
+              ' w:noHBand="0" w:noVBand="1" w:val="04A0"/>')
+# Spacer paragraph after every table (6 pt after).
+TABLE_SPACER = '<w:p><w:pPr><w:spacing w:after="120"/></w:pPr></w:p>'
+
+# Rough advance of one 8 pt Times character, and Word's default left + right cell margins.
+CHAR_TWIPS = 80
+CELL_PADDING_TWIPS = 230
+MIN_COLUMN_TWIPS = 576
+# Tables with more columns than this never fit a 3.5" column, whatever their content.
+MAX_NARROW_COLUMNS = 4
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def cell_text(text):
+    return text.replace('**', '')
+
+
+def natural_widths(table):
+    """Twips each column needs to fit its longest cell on one line."""
+    return [max(len(cell_text(cell)) for cell in column) * CHAR_TWIPS + CELL_PADDING_TWIPS
+            for column in zip(*table.rows)]
+
+
+def is_wide(table):
+    """True when the table does not fit one text column and needs the full page width."""
+    if not table.rows:
+        return False
+    return len(table.rows[0]) > MAX_NARROW_COLUMNS or sum(natural_widths(table)) > twips(COLUMN_WIDTH)
+
+
+def table_width_twips(table):
+    return twips(TEXT_WIDTH if is_wide(table) else COLUMN_WIDTH)
+
+
+def column_widths(table, total_twips):
+    """Split `total_twips` across the columns in proportion to their content.
+
+    Narrow columns are kept at `MIN_COLUMN_TWIPS` when there is room; the last column
+    absorbs rounding so the widths always sum to `total_twips`.
+    """
+    natural = natural_widths(table)
+    if not natural:
+        return []
+    floor = min(MIN_COLUMN_TWIPS, total_twips // len(natural))
+    widths = [total_twips * width / sum(natural) for width in natural]
+    pinned = [width < floor for width in widths]
+    flexible = sum(n for n, pin in zip(natural, pinned) if not pin)
+    remaining = total_twips - floor * sum(pinned)
+    widths = [floor if pin else int(remaining * n / flexible) for n, pin in zip(natural, pinned)]
+    widths[-1] += total_twips - sum(widths)
+    return widths
+
+
+def default_alignments(table):
+    """Explicit GFM alignments, else the first column left and the rest centered."""
+    return [align or ('left' if j == 0 else 'center') for j, align in enumerate(table.alignments)]
+
+
+def table_xml(table, total_twips, tbl_attrs=''):
+    """The `w:tbl` element for a parsed table, built as one string.
+
+    The cell properties and paragraph properties of each column are rendered once and
+    reused for every row. The header row repeats on each page and no row is split
+    across pages, so long tables break cleanly between rows. `tbl_attrs` is added to the
+    `w:tbl` start tag (e.g. the namespace declaration for a standalone element).
+    """
+    widths = column_widths(table, total_twips)
+    prefixes = [
+        f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>'
+        f'<w:p><w:pPr><w:pStyle w:val="IEEETableText"/><w:jc w:val="{align}"/></w:pPr>'
+        for width, align in zip(widths, default_alignments(table))
+    ]
+    grid = ''.join(f'<w:gridCol w:w="{width}"/>' for width in widths)
+    parts = [f'<w:tbl{tbl_attrs}><w:tblPr><w:tblStyle w:val="{TABLE_STYLE_ID}"/>'
+             f'<w:tblW w:type="dxa" w:w="{total_twips}"/><w:tblLayout w:type="fixed"/>{TABLE_LOOK}'
+             f'</w:tblPr><w:tblGrid>{grid}</w:tblGrid>']
+    header_run = '<w:r><w:rPr><w:rStyle w:val="IEEETableHeader"/></w:rPr><w:t xml:space="preserve">'
+    body_run = '<w:r><w:t xml:space="preserve">'
+    for i, row in enumerate(table.rows):
+        run_open = header_run if i == 0 else body_run
+        parts.append('<w:tr><w:trPr><w:cantSplit/><w:tblHeader/></w:trPr>' if i == 0
+                     else '<w:tr><w:trPr><w:cantSplit/></w:trPr>')
+        parts.extend(
+            f'{prefix}{run_open}{_escape(text)}</w:t></w:r></w:p></w:tc>' if text else f'{prefix}</w:p></w:tc>'
+            for prefix, text in zip(prefixes, map(cell_text, row))
+        )
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return ''.join(parts)
@@ -0,0 +1,170 @@
+import cProfile
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = 'logs/generate_ieee_format.profile.jsonl'
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every measurement is a no-op."""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def block(self, block_type):
+        return nullcontext()
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def _make_parent_dir(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+class _Measurement:
+    __slots__ = ('wall', 'cpu', 'blocks', 'bytes')
+
+    def __init__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.blocks = sys.getallocatedblocks()
+        self.bytes = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+    def finish(self):
+        end = _Measurement()
+        return {
+            'wall_s': round(end.wall - self.wall, 6),
+            'cpu_s': round(end.cpu - self.cpu, 6),
+            # Net change in live allocations (blocks from the interpreter, bytes from tracemalloc).
+            'alloc_blocks': end.blocks - self.blocks,
+            'alloc_bytes': end.bytes - self.bytes,
+        }
+
+
+class Profiler:
+    """Per-stage and per-block-type wall/CPU/allocation telemetry for one generator run.
+
+    Stage records are appended to a JSON-lines trace as each stage finishes; per-block-type
+    totals and a run summary are written on close. Optionally runs cProfile over the whole
+    run and dumps the pstats file on close. Use as a context manager.
+    """
+
+    def __init__(self, trace_path=DEFAULT_TRACE_FILE, pstats_path=None, trace_memory=True, **context):
+        self.trace_path = trace_path
+        self.pstats_path = pstats_path
+        self.trace_memory = trace_memory
+        self.context = context
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stages = []
+        self.block_types = {}
+        self._depth = 0
+        self._trace = None
+        self._cprofile = None
+        self._started = None
+        self._own_tracemalloc = False
+
+    def __enter__(self):
+        if self.trace_path:
+            _make_parent_dir(self.trace_path)
+            self._trace = open(self.trace_path, 'a', encoding='utf-8')
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+        if self.pstats_path:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._started = _Measurement()
+        self._emit({'event': 'start', **self.context})
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(failed=exc_type is not None)
+        return False
+
+    def _emit(self, record):
+        if self._trace is not None:
+            self._trace.write(json.dumps({'run': self.run_id, 'ts': round(time.time(), 6), **record}) + '\n')
+            self._trace.flush()
+
+    @contextmanager
+    def stage(self, name):
+        """Measure a pipeline stage such as `read`, `parse`, `render`, `save` or `pdf`."""
+        top_level = self._depth == 0
+        if top_level and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._depth += 1
+        measurement = _Measurement()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            record = {'event': 'stage', 'name': name, **measurement.finish()}
+            if top_level and tracemalloc.is_tracing():
+                record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(record)
+            self._emit(record)
+
+    @contextmanager
+    def block(self, block_type):
+        """Accumulate the cost of rendering one Markdown block into its type's totals."""
+        measurement = _Measurement()
+        try:
+            yield
+        finally:
+            result = measurement.finish()
+            totals = self.block_types.setdefault(block_type, {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                                              'alloc_blocks': 0, 'alloc_bytes': 0})
+            totals['count'] += 1
+            for key, value in result.items():
+                totals[key] += value
+
+    def summary(self):
+        return {
+            'stages': self.stages,
+            'block_types': {name: dict(totals, wall_s=round(totals['wall_s'], 6), cpu_s=round(totals['cpu_s'], 6))
+                            for name, totals in self.block_types.items()},
+        }
+
+    def close(self, failed=False):
+        if self._started is None:
+            return
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            _make_parent_dir(self.pstats_path)
+            self._cprofile.dump_stats(self.pstats_path)
+            logger.info(f"cProfile stats written to {self.pstats_path}")
+        total = self._started.finish()
+        if tracemalloc.is_tracing():
+            total['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+        for name, totals in self.summary()['block_types'].items():
+            self._emit({'event': 'block_type', 'name': name, **totals})
+        self._emit({'event': 'summary', 'failed': failed, **total})
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+        self._started = None
+        self.log_summary(total)
+
+    def log_summary(self, total):
+        logger.info(f"Profile {self.run_id}: {total['wall_s']:.3f}s wall, {total['cpu_s']:.3f}s CPU")
+        for record in self.stages:
+            logger.info(f"  stage {record['name']:<14} {record['wall_s'] * 1000:>9.1f} ms wall "
+                        f"{record['cpu_s'] * 1000:>9.1f} ms cpu {record['alloc_blocks']:>+9} blocks")
+        for name, totals in sorted(self.block_types.items(), key=lambda item: -item[1]['wall_s']):
+            logger.info(f"  block {name:<14} {totals['wall_s'] * 1000:>9.1f} ms wall "
+                        f"{totals['cpu_s'] * 1000:>9.1f} ms cpu  x{totals['count']}")
+        if self.trace_path:
+            logger.info(f"Profile trace appended to {self.trace_path}")
@@ -0,0 +1,137 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from soffice_pool import soffice_command, soffice_output_path
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher:
+    """Detect changes to a set of files by polling their (mtime, size)."""
+
+    def __init__(self, paths=()):
+        self.paths = list(paths)
+        self._state = self._snapshot()
+
+    def _snapshot(self):
+        state = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                state.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                # Editors that save via rename briefly remove the file.
+                state.append((path, None, None))
+        return state
+
+    def set_paths(self, paths):
+        """Replace the watched set, treating the files' current state as seen."""
+        self.paths = list(paths)
+        self._state = self._snapshot()
+
+    def changed(self):
+        snapshot = self._snapshot()
+        if snapshot == self._state:
+            return False
+        self._state = snapshot
+        return True
+
+
+class PdfScheduler:
+    """Debounced background DOCX -> PDF conversion.
+
+    Each `schedule()` snapshots the DOCX and (re)starts a `delay`-second timer, so bursts
+    of saves coalesce into one conversion. A newer `schedule()` cancels the pending timer
+    and terminates a running soffice, and a stale result is never moved into place.
+    Without soffice, `fallback(docx_path, pdf_path)` converts in the timer thread and only
+    the "never move a stale result" guarantee applies.
+    """
+
+    def __init__(self, pdf_path, delay=1.0, fallback=None):
+        self.pdf_path = os.path.abspath(pdf_path)
+        self.delay = delay
+        self.fallback = fallback
+        self.use_soffice = shutil.which('soffice') is not None
+        self.work_dir = tempfile.mkdtemp(prefix='ieee-watch-')
+        self.profile_dir = os.path.join(self.work_dir, 'profile')
+        self.generation = 0
+        self.timer = None
+        self.snapshot = None
+        self.process = None
+        self.lock = threading.Lock()
+
+    def schedule(self, docx_path):
+        with self.lock:
+            self._cancel_locked()
+            self.generation += 1
+            generation = self.generation
+            # Convert a private copy so the next DOCX rebuild can't change it mid-conversion.
+            snapshot = os.path.join(self.work_dir, f'paper-{generation}.docx')
+            shutil.copyfile(docx_path, snapshot)
+            self.snapshot = snapshot
+            self.timer = threading.Timer(self.delay, self._convert, args=(generation, snapshot))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _cancel_locked(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.snapshot is not None:
+            # A cancelled timer never runs `_convert`, which otherwise removes its snapshot.
+            if os.path.exists(self.snapshot):
+                os.remove(self.snapshot)
+            self.snapshot = None
+        if self.process is not None and self.process.poll() is None:
+            logger.info("Cancelling stale PDF conversion")
+            self.process.terminate()
+        self.process = None
+
+    def _convert(self, generation, snapshot):
+        tmp_pdf = os.path.splitext(snapshot)[0] + '.pdf'
+        try:
+            with self.lock:
+                if generation != self.generation:
+                    return
+                # The snapshot is now this conversion's to remove.
+                self.snapshot = None
+            if self.use_soffice:
+                with self.lock:
+                    if generation != self.generation:
+                        return
+                    process = subprocess.Popen(soffice_command(snapshot, self.work_dir, self.profile_dir),
+                                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    self.process = process
+                process.wait()
+                ok = process.returncode == 0 and os.path.exists(soffice_output_path(snapshot, self.work_dir))
+            elif self.fallback is not None:
+                self.fallback(snapshot, tmp_pdf)
+                ok = os.path.exists(tmp_pdf)
+            else:
+                return
+
+            with self.lock:
+                if generation != self.generation:
+                    logger.info("Discarding PDF for an outdated revision")
+                    return
+                if not ok:
+                    logger.error("Background PDF conversion failed")
+                    return
+                os.replace(tmp_pdf, self.pdf_path)
+            logger.info(f"PDF refreshed: {self.pdf_path}")
+        except Exception as e:
+            logger.error(f"Background PDF conversion failed: {str(e)}")
+        finally:
+            for path in (snapshot, tmp_pdf):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def shutdown(self):
+        with self.lock:
+            self.generation += 1
+            self._cancel_locked()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+SAMPLE_INPUT = os.path.join(ROOT, 'data', 'input', 'input.md')
+
+# The modules in src/ are flat scripts that import each other by name.
+sys.path.insert(0, SRC)
@@ -0,0 +1,14 @@
+import shutil
+
+import pytest
+
+from conftest import SAMPLE_INPUT
+from batch_generate import render_one, summarize
+
+
+@pytest.mark.skipif(shutil.which('soffice') or shutil.which('libreoffice'), reason='needs a machine without LibreOffice')
+def test_missing_pdf_is_counted(tmp_path):
+    result = render_one(SAMPLE_INPUT, str(tmp_path / 'paper.docx'), convert_pdf=True)
+    assert result['status'] == 'ok' and result['pdf_error']
+    summary = summarize([result, render_one(SAMPLE_INPUT, str(tmp_path / 'docx-only.docx'), convert_pdf=False)], 1.0)
+    assert summary['failed'] == 0 and summary['pdf_failed'] == 1
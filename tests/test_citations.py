@@ -0,0 +1,40 @@
+import pytest
+
+import conftest  # noqa: F401  (puts src/ on the path)
+from citations import CitationIndex, citation_numbers, parse_bibtex
+from latex_export import text_with_citations
+from markdown_ast import Paragraph, Reference
+
+BIB = parse_bibtex('@article{smith, author = {Smith, John}, title = {A Title}, journal = {J}, year = {2020}}')
+
+
+def resolve(blocks, bibliography=None):
+    return list(CitationIndex(bibliography).resolve(blocks, report=False))
+
+
+def test_reversed_range_is_swapped():
+    assert citation_numbers('7', '3') == [3, 4, 5, 6, 7]
+    assert citation_numbers('1, 7', '3') == [1, 3, 4, 5, 6, 7]
+    index = CitationIndex()
+    list(index.resolve([Paragraph('See [7]–[3].')], report=False))
+    assert index.cited == {3, 4, 5, 6, 7}
+
+
+def test_latex_reversed_range():
+    assert text_with_citations('See [7]–[3].') == r'See \cite{ref3,ref4,ref5,ref6,ref7}.'
+
+
+def test_bibtex_keys_are_numbered_in_order_of_use():
+    blocks = resolve([Paragraph('As shown [@smith].')], BIB)
+    assert blocks[0].text == 'As shown [1].'
+    assert blocks[-1].number == 1
+
+
+@pytest.mark.parametrize('blocks', [
+    [Paragraph('Old [1] and new [@smith].')],
+    [Paragraph('New [@smith].'), Paragraph('Old [1].')],
+    [Paragraph('New [@smith].'), Reference('[1] A. Author, "Paper," 2019.', 1)],
+])
+def test_mixed_numbers_and_keys_are_rejected(blocks):
+    with pytest.raises(ValueError, match='mixes numbered references and BibTeX keys'):
+        resolve(blocks, BIB)
@@ -0,0 +1,94 @@
+import io
+import re
+import zipfile
+
+import pytest
+
+import conftest  # noqa: F401  (puts src/ on the path)
+from generate_ieee_format import render_to_bytes
+
+WIDE_TABLE = '''| Model | Dataset | Precision | Recall | F1 | Latency |
+|---|---|---|---|---|---|
+| A | X | 0.91 | 0.88 | 0.89 | 12 ms |
+'''
+
+PAPER = '''---
+title: Sections
+authors:
+  - name: A. Author
+---
+
+## I. INTRODUCTION
+
+Some text.
+
+{body}
+
+## II. MORE
+
+More text.
+'''
+
+
+def section_columns(docx_bytes):
+    """Column count of every section in a DOCX, in document order."""
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as z:
+        xml = z.read('word/document.xml').decode('utf-8')
+    columns = []
+    for sect_pr in re.findall(r'<w:sectPr\b.*?</w:sectPr>', xml):
+        num = re.search(r'<w:cols\b[^>]*?w:num="(\d+)"', sect_pr)
+        columns.append(int(num.group(1)) if num else 1)
+    return columns
+
+
+@pytest.mark.parametrize('body', [
+    WIDE_TABLE,
+    # Between a figure and its caption the section is already single-column.
+    '![Fig. 1](missing.png)\n\n' + WIDE_TABLE + '\n*Fig. 1. A caption.*',
+])
+def test_backends_agree_on_sections_around_wide_tables(body):
+    markdown = PAPER.format(body=body)
+    tree = section_columns(render_to_bytes(markdown).docx)
+    stream = section_columns(render_to_bytes(markdown, backend='stream').docx)
+    assert tree == stream
+    assert 1 in tree[2:]
+
+
+def test_failed_stream_keeps_previous_output(tmp_path):
+    from citations import CitationError, CitationIndex, parse_bibtex
+    from docx_stream import write_docx
+    from image_prep import CallbackImageSource
+    from markdown_ast import Paper, Paragraph
+
+    output = tmp_path / 'paper.docx'
+    output.write_bytes(b'previous build')
+    bibliography = parse_bibtex('@misc{smith, title = {T}, year = {2020}}')
+    blocks = CitationIndex(bibliography).resolve([Paragraph('Old [1].'), Paragraph('New [@smith].')], report=False)
+    with pytest.raises(CitationError):
+        write_docx(Paper({'title': 'Broken'}, blocks), str(output), CallbackImageSource(None))
+    assert output.read_bytes() == b'previous build'
+    assert [path.name for path in tmp_path.iterdir()] == ['paper.docx']
+
+
+@pytest.mark.parametrize('backend', ['python-docx', 'stream'])
+def test_warm_rebuild_matches_cold_build(tmp_path, backend):
+    from build_cache import BlockCache
+    from generate_ieee_format import generate_paper
+
+    def parts(path):
+        with zipfile.ZipFile(path) as z:
+            return {name: z.read(name) for name in z.namelist()}
+
+    first = PAPER.format(body=WIDE_TABLE + '\nA paragraph.\n\n- **Item:** listed.')
+    edited = first.replace('More text.', 'More text, edited.')
+    cache = BlockCache()
+    paper = tmp_path / 'paper.md'
+    paper.write_text(first, encoding='utf-8')
+    generate_paper(str(paper), str(tmp_path / 'warm.docx'), convert_pdf=False, backend=backend, block_cache=cache)
+    assert cache.finish() == (0, 7)
+
+    paper.write_text(edited, encoding='utf-8')
+    generate_paper(str(paper), str(tmp_path / 'warm.docx'), convert_pdf=False, backend=backend, block_cache=cache)
+    assert cache.finish() == (6, 1)
+    generate_paper(str(paper), str(tmp_path / 'cold.docx'), convert_pdf=False, backend=backend)
+    assert parts(tmp_path / 'warm.docx') == parts(tmp_path / 'cold.docx')
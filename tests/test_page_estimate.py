@@ -0,0 +1,26 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT, SAMPLE_INPUT, SRC
+
+
+def run_cli(*args):
+    return subprocess.run([sys.executable, os.path.join(SRC, 'page_estimate.py'), '-i', SAMPLE_INPUT, *args],
+                          cwd=ROOT, capture_output=True, text=True)
+
+
+def test_json_stdout_is_only_the_estimate():
+    result = run_cli('--json')
+    assert result.returncode == 0, result.stderr
+    estimate = json.loads(result.stdout)
+    assert estimate['page_count'] >= 1
+    assert 'INFO' in result.stderr
+
+
+def test_max_pages_counts_started_pages():
+    estimate = json.loads(run_cli('--json').stdout)
+    # A partly filled last page still counts as a page against the budget.
+    assert run_cli('--json', '--max-pages', str(estimate['page_count'] - 1)).returncode == 1
+    assert run_cli('--json', '--max-pages', str(estimate['page_count'])).returncode == 0
@@ -0,0 +1,18 @@
+import os
+
+from conftest import ROOT
+from pdf_text import iter_pdf_text
+
+SAMPLE_PDF = os.path.join(ROOT, 'data', 'output', 'output.pdf')
+
+
+def test_words_are_joined_by_position_not_by_run():
+    # The sample draws every word, hyphen and dash as its own positioned string.
+    lines = list(iter_pdf_text(SAMPLE_PDF))
+    text = '\n'.join(lines)
+    assert lines[:3] == ['--- Page 1 ---', 'Hybrid Multi-Agent Decision Support System for',
+                         'Momentum-Based Financial Trading']
+    assert 'Abstract—The abstract is a concise summary of the research' in lines
+    assert 'zero-commission platforms' in text
+    assert ' - ' not in text.replace('(x - \\mu)', '')
+    assert 'Financial markets have undergone a profound transformation driven' in lines
@@ -0,0 +1,115 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import conftest  # noqa: F401  (puts src/ on the path)
+from render_service import RenderHTTPServer, RenderService
+
+PAPER = '''---
+title: Tiny Paper
+authors:
+  - name: A. Author
+---
+
+## I. INTRODUCTION
+
+A short body.
+'''
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """Start a service with a localhost HTTP server; yields a `request(method, path, body)` helper."""
+    servers = []
+
+    def start(service, run_workers=True):
+        if run_workers:
+            service.start()
+        server = RenderHTTPServer(('127.0.0.1', 0), service)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service, run_workers))
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+
+        def request(method, path, body=None):
+            data = json.dumps(body).encode('utf-8') if body is not None else None
+            req = urllib.request.Request(base + path, data=data, method=method)
+            try:
+                with urllib.request.urlopen(req, timeout=60) as response:
+                    return response.status, json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                return e.code, json.loads(e.read())
+        return request
+
+    yield start
+    for server, service, run_workers in servers:
+        server.shutdown()
+        server.server_close()
+        if run_workers:
+            service.close()
+
+
+def test_full_queue_answers_503(serve, tmp_path):
+    # Without workers nothing is taken off the queue.
+    request = serve(RenderService(workers=1, queue_size=1, work_dir=str(tmp_path)), run_workers=False)
+    assert request('POST', '/jobs', {'markdown': PAPER})[0] == 202
+    status, body = request('POST', '/jobs', {'markdown': PAPER})
+    assert status == 503 and 'queue is full' in body['error']
+    assert request('POST', '/jobs', {'markdown': ''})[0] == 400
+
+
+def test_timeout_restarts_the_worker(serve, tmp_path):
+    service = RenderService(workers=1, work_dir=str(tmp_path), job_timeout=60)
+    request = serve(service)
+    status, job = request('POST', '/jobs', {'markdown': PAPER, 'timeout': 0.001})
+    assert status == 202
+    status, job = request('GET', f"/jobs/{job['id']}?wait=60")
+    assert job['status'] == 'failed' and 'timed out' in job['error']
+
+    # The restarted worker takes the next job.
+    status, job = request('POST', '/jobs', {'markdown': PAPER})
+    status, job = request('GET', f"/jobs/{job['id']}?wait=60")
+    assert job['status'] == 'done', job
+    assert 'docx' in job['results']
+
+
+def test_failed_restart_is_retried_on_the_next_job(serve, tmp_path):
+    service = RenderService(workers=1, work_dir=str(tmp_path), job_timeout=60)
+    request = serve(service)
+    worker = service.workers[0]
+    # An unreadable template makes the worker die while warming up.
+    bad_template = tmp_path / 'broken.dotx'
+    bad_template.write_bytes(b'not a zip file')
+    worker.template = str(bad_template)
+
+    def run(payload):
+        _, job = request('POST', '/jobs', payload)
+        return request('GET', f"/jobs/{job['id']}?wait=60")[1]
+
+    job = run({'markdown': PAPER, 'timeout': 0.001})
+    assert job['status'] == 'failed' and 'timed out' in job['error']
+    assert worker.process is None
+    job = run({'markdown': PAPER})
+    assert job['status'] == 'failed' and 'did not start' in job['error']
+
+    worker.template = None
+    job = run({'markdown': PAPER})
+    assert job['status'] == 'done', job
+
+
+def test_references_outside_the_job_fail(serve, tmp_path):
+    secret = tmp_path / 'secret.bib'
+    secret.write_text('@misc{key, title={Secret}}\n')
+    request = serve(RenderService(workers=1, work_dir=str(tmp_path / 'jobs'), job_timeout=60))
+
+    def run(markdown):
+        _, job = request('POST', '/jobs', {'markdown': markdown})
+        return request('GET', f"/jobs/{job['id']}?wait=60")[1]
+
+    for markdown in (PAPER + '\n![Leak](/etc/hostname)\n',
+                     PAPER + '\n![Leak](../../secret.bib)\n',
+                     PAPER.replace('---\n\n', f'bibliography: {secret}\n---\n\n', 1)):
+        job = run(markdown)
+        assert job['status'] == 'failed' and 'outside' in job['error'], job
@@ -0,0 +1,22 @@
+from concurrent.futures import Future
+
+import pytest
+
+import conftest  # noqa: F401  (puts src/ on the path)
+from soffice_pool import SofficePool
+
+
+def test_submit_before_start_raises():
+    with pytest.raises(RuntimeError, match='not running'):
+        SofficePool().submit('paper.docx')
+
+
+def test_long_runs_of_cancelled_jobs_are_skipped():
+    pool = SofficePool()
+    for _ in range(5000):
+        future = Future()
+        future.cancel()
+        pool.jobs.put((future, 'paper.docx', 'paper.pdf'))
+    live = Future()
+    pool.jobs.put((live, 'paper.docx', 'paper.pdf'))
+    assert pool._next_job()[0] is live